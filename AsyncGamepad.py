@@ -0,0 +1,165 @@
+# coding: utf-8
+"""
+Runs a Gamepad from an asyncio event loop instead of a background thread.
+
+The joystick device is watched with loop.add_reader, so the events are read
+and any registered callbacks are run on the event loop itself.
+Any of the gamepad types from Controllers.py can be used, for example:
+
+    gamepad = AsyncGamepad.AsyncGamepad(Gamepad.PS4())
+    await gamepad.waitReady()
+    async for eventType, control, value in gamepad.events():
+        ...
+
+This module needs Python 3.6 or newer.
+"""
+
+import asyncio
+import Gamepad
+
+class AsyncGamepad:
+    """Wraps a Gamepad object so that it is updated by an asyncio event loop.
+
+    All of the normal Gamepad calls, such as axis, isPressed and addButtonPressedHandler,
+    can be made on this object directly."""
+
+    def __init__(self, gamepad, loop = None):
+        if isinstance(gamepad, Gamepad.Gamepad):
+            self.gamepad = gamepad
+        else:
+            raise ValueError('AsyncGamepad was not created with a valid Gamepad object')
+        self.loop = loop
+        self.reading = False
+        self.eventQueues = []
+        self.readyWaiters = []
+        self.waiters = []
+        self.releaseTimer = None
+
+    def __getattr__(self, name):
+        # Anything not handled here is passed on to the wrapped gamepad
+        return getattr(self.__dict__['gamepad'], name)
+
+    def start(self):
+        """Starts reading the gamepad from the event loop.
+        This is called automatically by events and the wait calls."""
+        if not self.reading:
+            if self.loop is None:
+                self.loop = asyncio.get_event_loop()
+            self.loop.add_reader(self.gamepad.joystickFile.fileno(), self._readGamepad)
+            self.reading = True
+            self.gamepad.externalReader = self
+
+    def stop(self):
+        """Stops reading the gamepad from the event loop.
+        Any events iterators are ended and pending waits are cancelled."""
+        self._finish(None)
+
+    def disconnect(self):
+        """Stops reading and cleanly disconnects the gamepad."""
+        self._finish(None)
+        self.gamepad.disconnect()
+
+    def _finish(self, error):
+        if self.reading:
+            self.loop.remove_reader(self.gamepad.joystickFile.fileno())
+            self.reading = False
+            if self.gamepad.externalReader is self:
+                self.gamepad.externalReader = None
+                self.gamepad._notifyWaiters()
+        if self.releaseTimer is not None:
+            self.releaseTimer.cancel()
+            self.releaseTimer = None
+        for queue in self.eventQueues:
+            queue.put_nowait(error)
+        for future in self.readyWaiters + self.waiters:
+            if not future.done():
+                if error is None:
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+        self.readyWaiters = []
+
+    def _readGamepad(self):
+        gamepad = self.gamepad
+        try:
+            events = gamepad._readReadyEvents(gamepad.batchSize)
+        except IOError as e:
+            self._finish(e)
+            return
+        self._processEvents(events)
+
+    def _releaseHeldEvents(self):
+        # Axis positions held back by coalescing are now due
+        self.releaseTimer = None
+        if self.reading:
+            self._processEvents(self.gamepad._coalesceEvents([]))
+
+    def _processEvents(self, events):
+        gamepad = self.gamepad
+        if self.eventQueues:
+            decoded = gamepad._decodeEvents(events)
+            for queue in self.eventQueues:
+                for event in decoded:
+                    queue.put_nowait(event)
+        else:
+            gamepad._updateStateFromEvents(events)
+        if self.readyWaiters and gamepad.isReady():
+            for future in self.readyWaiters:
+                if not future.done():
+                    future.set_result(True)
+            self.readyWaiters = []
+        if gamepad.heldAxisEvents and self.releaseTimer is None:
+            self.releaseTimer = self.loop.call_later(gamepad._heldEventsDelay(), self._releaseHeldEvents)
+
+    async def events(self):
+        """Asynchronously yields each event from the gamepad.
+
+        The format is the same as Gamepad.getNextEvent:
+            event name, entity name, value
+
+        Throws an IOError if the gamepad is disconnected"""
+        self.start()
+        queue = asyncio.Queue()
+        self.eventQueues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                elif isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            self.eventQueues.remove(queue)
+
+    async def waitReady(self):
+        """Waits until the isReady call is True."""
+        self.start()
+        if not self.gamepad.isReady():
+            future = self.loop.create_future()
+            self.readyWaiters.append(future)
+            await future
+
+    async def _waitForButton(self, addHandler, removeHandler, buttonName):
+        self.start()
+        future = self.loop.create_future()
+        def buttonChanged():
+            if not future.done():
+                future.set_result(True)
+        addHandler(buttonName, buttonChanged)
+        self.waiters.append(future)
+        try:
+            await future
+        finally:
+            removeHandler(buttonName, buttonChanged)
+            self.waiters.remove(future)
+
+    async def waitForButtonPress(self, buttonName):
+        """Waits until the button specified by name or index is pressed."""
+        await self._waitForButton(self.gamepad.addButtonPressedHandler,
+                                  self.gamepad.removeButtonPressedHandler, buttonName)
+
+    async def waitForButtonRelease(self, buttonName):
+        """Waits until the button specified by name or index is released."""
+        await self._waitForButton(self.gamepad.addButtonReleasedHandler,
+                                  self.gamepad.removeButtonReleasedHandler, buttonName)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Load the gamepad, asyncio and time libraries
+import Gamepad
+import AsyncGamepad
+import asyncio
+import time
+
+# Gamepad settings
+gamepadType = Gamepad.PS4
+buttonHappy = 'CROSS'
+buttonBeep = 'CIRCLE'
+buttonExit = 'PS'
+joystickSpeed = 'LEFT-Y'
+joystickSteering = 'RIGHT-X'
+
+# Wait for a connection
+if not Gamepad.available():
+    print('Please connect your gamepad...')
+    while not Gamepad.available():
+        time.sleep(1.0)
+print('Gamepad connected')
+
+# Create some callback functions
+def happyButtonPressed():
+    print(':)')
+
+def happyButtonReleased():
+    print(':(')
+
+async def showJoysticks(gamepad):
+    # Print the joystick positions whenever they change
+    async for eventType, control, value in gamepad.events():
+        if eventType == 'AXIS':
+            speed = -gamepad.axis(joystickSpeed)
+            steering = gamepad.axis(joystickSteering)
+            print('%+.1f %% speed, %+.1f %% steering' % (speed * 100, steering * 100))
+
+async def main():
+    # Start reading the gamepad from the event loop
+    gamepad = AsyncGamepad.AsyncGamepad(gamepadType())
+    await gamepad.waitReady()
+
+    # Register the callback functions, they are run by the event loop
+    gamepad.addButtonPressedHandler(buttonHappy, happyButtonPressed)
+    gamepad.addButtonReleasedHandler(buttonHappy, happyButtonReleased)
+    gamepad.addButtonPressedHandler(buttonBeep, lambda: print('BEEP'))
+
+    # Show the joysticks until the exit button is pressed
+    joysticks = asyncio.ensure_future(showJoysticks(gamepad))
+    try:
+        await gamepad.waitForButtonPress(buttonExit)
+        print('EXIT')
+    finally:
+        # Ensure the gamepad is always disconnected when we are done
+        joysticks.cancel()
+        gamepad.disconnect()
+
+asyncio.run(main())
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Benchmarks for the Gamepad event decoding, reading and state queries.
+
+A FIFO or pseudo terminal stands in for the joystick device so that no controller is needed.
+There are two sets of benchmarks:
+
+    decode  - synthetic events are queued directly into the gamepad so the timings
+              show the decode cost per event without any device reads
+    streams - synthetic event streams (random walks, full sweeps, button mashing
+              and init bursts) are written into the FIFO / pseudo terminal and read
+              back by the gamepad, measuring events per second, latency percentiles
+              and memory allocated per event for each way of reading the gamepad
+
+The streams are generated from fixed seeds so every run sees the same events.
+Use --json to save the results for comparing between versions, see --help.
+
+This script needs Python 3.
+"""
+
+import os
+import sys
+import gc
+import json
+import platform
+import pty
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import tty
+import Gamepad
+
+try:
+    import GamepadShared
+except ImportError:
+    # Shared memory needs Python 3.8 or newer
+    GamepadShared = None
+
+def makeEvents(count, axisCount = 8, buttonCount = 13, seed = 1):
+    """Makes a repeatable list of raw events, mostly axis movements with some button changes."""
+    generator = random.Random(seed)
+    events = []
+    timestamp = 0
+    pressed = [False] * buttonCount
+    for i in range(count):
+        timestamp += 1
+        if generator.random() < 0.8:
+            index = generator.randrange(axisCount)
+            value = generator.randint(-32767, 32767)
+            events.append((timestamp, value, Gamepad.Gamepad.EVENT_CODE_AXIS, index))
+        else:
+            index = generator.randrange(buttonCount)
+            pressed[index] = not pressed[index]
+            events.append((timestamp, int(pressed[index]), Gamepad.Gamepad.EVENT_CODE_BUTTON, index))
+    return events
+
+def makeJitterEvents(count, axisCount = 8, noise = 200, seed = 1):
+    """Makes a repeatable list of raw events for sticks left at the centre which jitter by up to noise."""
+    generator = random.Random(seed)
+    return [(timestamp, generator.randint(-noise, noise), Gamepad.Gamepad.EVENT_CODE_AXIS, generator.randrange(axisCount))
+            for timestamp in range(count)]
+
+def makeInitEvents(axisCount = 8, buttonCount = 13):
+    """Makes the burst of initial state events sent when a device is opened."""
+    events = []
+    for index in range(buttonCount):
+        events.append((0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, index))
+    for index in range(axisCount):
+        events.append((0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, index))
+    return events
+
+def openFakeGamepad(gamepadType, devicePath, axisCount = 8, buttonCount = 13):
+    """Opens a gamepad on a FIFO and feeds it the initial state events.
+    Returns the gamepad and the open writing end of the FIFO."""
+    writer = []
+    opener = threading.Thread(target = lambda: writer.append(open(devicePath, 'wb', 0)))
+    opener.start()
+    gamepad = gamepadType(devicePath)
+    opener.join()
+    for event in makeInitEvents(axisCount, buttonCount):
+        gamepad.pendingEvents.append(event)
+        gamepad.updateState()
+    return gamepad, writer[0]
+
+def timeUpdateState(gamepad, events):
+    """Returns the time in nanoseconds per event for updateState."""
+    gamepad.pendingEvents.extend(events)
+    start = time.perf_counter()
+    for i in range(len(events)):
+        gamepad.updateState()
+    return (time.perf_counter() - start) * 1e9 / len(events)
+
+def timeGetNextEvent(gamepad, events):
+    """Returns the time in nanoseconds per event for getNextEvent."""
+    gamepad.pendingEvents.extend(events)
+    start = time.perf_counter()
+    for i in range(len(events)):
+        gamepad.getNextEvent()
+    return (time.perf_counter() - start) * 1e9 / len(events)
+
+def timeEventStream(gamepad, events):
+    """Returns the time in nanoseconds per event for an events stream with some stages chained on."""
+    gamepad.pendingEvents.extend(events)
+    stream = gamepad.events(timeout = 0).invert(1).scale(0.5).clamp(-0.25, +0.25)
+    start = time.perf_counter()
+    for event in stream:
+        pass
+    return (time.perf_counter() - start) * 1e9 / len(events)
+
+def timeBatchUpdate(gamepad, events):
+    """Returns the time in nanoseconds per event for batches applied by the background thread."""
+    batchSize = gamepad.batchSize
+    start = time.perf_counter()
+    for i in range(0, len(events), batchSize):
+        gamepad._updateStateFromEvents(events[i:i + batchSize])
+    return (time.perf_counter() - start) * 1e9 / len(events)
+
+def timeFilteredBatchUpdate(gamepad, events, filterEvents):
+    """Returns the time in nanoseconds per event for batches passed through filterEvents as they are read, then applied."""
+    batchSize = gamepad.batchSize
+    start = time.perf_counter()
+    for i in range(0, len(events), batchSize):
+        gamepad._updateStateFromEvents(filterEvents(events[i:i + batchSize]))
+    return (time.perf_counter() - start) * 1e9 / len(events)
+
+def timeCalls(function, argument, count = 20000):
+    """Returns the time in nanoseconds per call for a state query such as isPressed or axis."""
+    start = time.perf_counter()
+    for i in range(count):
+        function(argument)
+    return (time.perf_counter() - start) * 1e9 / count
+
+def timeHandleReads(handle, count = 20000):
+    """Returns the time in nanoseconds per read of the value from a button or axis handle."""
+    start = time.perf_counter()
+    for i in range(count):
+        handle.value
+    return (time.perf_counter() - start) * 1e9 / count
+
+def runDecodeBenchmark(gamepadType = Gamepad.PS4, count = 20000, repeats = 25):
+    """Runs the decode benchmarks and returns the best times per event."""
+    events = makeEvents(count)
+    jitterEvents = makeJitterEvents(count)
+    tempDir = tempfile.mkdtemp()
+    devicePath = os.path.join(tempDir, 'js0')
+    os.mkfifo(devicePath)
+    gc.disable()
+    try:
+        gamepad, writer = openFakeGamepad(gamepadType, devicePath)
+        results = {
+            'updateState': min(timeUpdateState(gamepad, events) for i in range(repeats)),
+            'getNextEvent': min(timeGetNextEvent(gamepad, events) for i in range(repeats)),
+            'background batch': min(timeBatchUpdate(gamepad, events) for i in range(repeats)),
+            'events (stages)': min(timeEventStream(gamepad, events) for i in range(repeats)),
+            'isPressed call': min(timeCalls(gamepad.isPressed, 0) for i in range(repeats)),
+            'axis call': min(timeCalls(gamepad.axis, 0) for i in range(repeats)),
+            'snapshot call': min(timeCalls(lambda unused: gamepad.snapshot(), None) for i in range(repeats)),
+            'button handle read': min(timeHandleReads(gamepad.button(0)) for i in range(repeats)),
+            'axis handle read': min(timeHandleReads(gamepad.axisHandle(0)) for i in range(repeats)),
+        }
+        for axisIndex in range(8):
+            gamepad.calibrateAxis(axisIndex, deadzone = 0.05, expo = 0.3)
+        results['updateState (calibrated)'] = min(timeUpdateState(gamepad, events) for i in range(repeats))
+        gamepad.clearAxisCalibration()
+        gamepad.addAxisMovedHandler(0, lambda position: None)
+        gamepad.addButtonChangedHandler(0, lambda pressed: None)
+        results['updateState (callbacks)'] = min(timeUpdateState(gamepad, events) for i in range(repeats))
+        results['background batch (callbacks)'] = min(timeBatchUpdate(gamepad, events) for i in range(repeats))
+        gamepad.enableAxisCoalescing()
+        results['background batch (coalescing)'] = min(timeFilteredBatchUpdate(gamepad, events, gamepad._coalesceEvents)
+                                                        for i in range(repeats))
+        gamepad.disableAxisCoalescing()
+        gamepad.enableAxisFiltering(0.01)
+        results['background batch (filtering)'] = min(timeFilteredBatchUpdate(gamepad, jitterEvents, gamepad._filterAxisEvents)
+                                                       for i in range(repeats))
+        results['background batch (jitter)'] = min(timeBatchUpdate(gamepad, jitterEvents) for i in range(repeats))
+        gamepad.disableAxisFiltering()
+        gamepad.enableStats()
+        results['background batch (stats)'] = min(timeBatchUpdate(gamepad, events) for i in range(repeats))
+        gamepad.disableStats()
+        frameHandler = lambda controls: None
+        gamepad.addFrameHandler(frameHandler)
+        results['background frames (batch)'] = min(timeBatchUpdate(gamepad, events) for i in range(repeats))
+        gamepad.enableFrameMode(Gamepad.Gamepad.FRAME_TIMESTAMP)
+        results['background frames (timestamp)'] = min(timeBatchUpdate(gamepad, events) for i in range(repeats))
+        gamepad.removeFrameHandler(frameHandler)
+        gamepad.disableFrameMode()
+        if GamepadShared is not None:
+            publisher = GamepadShared.Publisher(gamepad, 'gamepad-benchmark-%d' % os.getpid())
+            results['background batch (shared)'] = min(timeBatchUpdate(gamepad, events) for i in range(repeats))
+            results['updateState (shared)'] = min(timeUpdateState(gamepad, events) for i in range(repeats))
+            publisher.close()
+        writer.close()
+        gamepad.disconnect()
+    finally:
+        gc.enable()
+        os.unlink(devicePath)
+        os.rmdir(tempDir)
+    return results
+
+def randomWalkEvents(count, axisCount = 8, seed = 1):
+    """Makes a repeatable stream of sticks wandering around, each event nudges one axis a little."""
+    generator = random.Random(seed)
+    positions = [0] * axisCount
+    events = []
+    for i in range(count):
+        index = generator.randrange(axisCount)
+        positions[index] = max(-32767, min(32767, positions[index] + generator.randint(-1500, 1500)))
+        events.append((0, positions[index], Gamepad.Gamepad.EVENT_CODE_AXIS, index))
+    return events
+
+def sweepEvents(count, axisCount = 8, step = 256):
+    """Makes a stream of each axis in turn being swept from one end to the other and back."""
+    sweep = list(range(-32767, 32767, step)) + list(range(32767, -32767, -step))
+    events = []
+    index = 0
+    while len(events) < count:
+        for value in sweep:
+            events.append((0, value, Gamepad.Gamepad.EVENT_CODE_AXIS, index))
+        index = (index + 1) % axisCount
+    return events[:count]
+
+def buttonMashEvents(count, buttonCount = 13, seed = 1):
+    """Makes a repeatable stream of buttons being pressed and released as fast as possible."""
+    generator = random.Random(seed)
+    pressed = [0] * buttonCount
+    events = []
+    for i in range(count):
+        index = generator.randrange(buttonCount)
+        pressed[index] = 1 - pressed[index]
+        events.append((0, pressed[index], Gamepad.Gamepad.EVENT_CODE_BUTTON, index))
+    return events
+
+def initBurstEvents(count, axisCount = 8, buttonCount = 13):
+    """Makes a stream of repeated initial state bursts, as sent each time a device is opened."""
+    burst = makeInitEvents(axisCount, buttonCount)
+    return (burst * (count // len(burst) + 1))[:count]
+
+STREAMS = {
+    'random walk': lambda count, axisCount, buttonCount: randomWalkEvents(count, axisCount),
+    'sweeps': lambda count, axisCount, buttonCount: sweepEvents(count, axisCount),
+    'button mashing': lambda count, axisCount, buttonCount: buttonMashEvents(count, buttonCount),
+    'init bursts': lambda count, axisCount, buttonCount: initBurstEvents(count, axisCount, buttonCount)
+}
+READ_MODES = ['getNextEvent', 'updateState', 'updateState (callbacks)', 'background thread']
+
+def controlCounts(gamepad):
+    """Returns the number of axes and buttons to generate events for with a gamepad.
+    Gamepads without names get 8 axes and 13 buttons."""
+    if gamepad.axisNames and gamepad.buttonNames:
+        return max(gamepad.axisNames) + 1, max(gamepad.buttonNames) + 1
+    return 8, 13
+
+def packEvents(events, firstSequence = 1):
+    """Packs events into raw device data, numbering them in the timestamp field.
+    The numbers let the reader work out when each event was sent."""
+    pack = Gamepad.Gamepad.EVENT_STRUCT.pack
+    return b''.join(pack(firstSequence + i, value, eventType, index)
+                    for i, (timestamp, value, eventType, index) in enumerate(events))
+
+class FakeDevice:
+    """A FIFO or pseudo terminal standing in for a joystick device, with a gamepad reading from it."""
+    def __init__(self, gamepadType, transport = 'fifo'):
+        self.tempDir = None
+        self.slaveFd = None
+        if transport == 'fifo':
+            self.tempDir = tempfile.mkdtemp()
+            self.devicePath = os.path.join(self.tempDir, 'js0')
+            os.mkfifo(self.devicePath)
+            writer = []
+            opener = threading.Thread(target = lambda: writer.append(os.open(self.devicePath, os.O_WRONLY)))
+            opener.start()
+            self.gamepad = gamepadType(self.devicePath)
+            opener.join()
+            self.writeFd = writer[0]
+        elif transport == 'pty':
+            self.writeFd, self.slaveFd = pty.openpty()
+            # Raw mode passes the event data through untouched
+            tty.setraw(self.slaveFd)
+            self.devicePath = os.ttyname(self.slaveFd)
+            self.gamepad = gamepadType(self.devicePath)
+        else:
+            raise ValueError('Transport %s was not found' % transport)
+        self.sequence = 0
+        self.axisCount, self.buttonCount = controlCounts(self.gamepad)
+        self.write(makeInitEvents(self.axisCount, self.buttonCount))
+        while not self.gamepad.isReady() or self.gamepad.lastTimestamp != self.sequence:
+            self.gamepad.updateState()
+
+    def write(self, events):
+        """Writes events to the device, numbered after the previous ones.
+        Returns the number of the last event written."""
+        return self.writePacked(packEvents(events, self.sequence + 1), len(events))
+
+    def writePacked(self, data, count):
+        """Writes count events already packed by packEvents, numbered after the previous ones.
+        Returns the number of the last event written."""
+        data = memoryview(data)
+        self.sequence += count
+        while len(data):
+            written = os.write(self.writeFd, data[:4096])
+            data = data[written:]
+        return self.sequence
+
+    def close(self):
+        self.gamepad.disconnect()
+        os.close(self.writeFd)
+        if self.slaveFd is not None:
+            os.close(self.slaveFd)
+        if self.tempDir is not None:
+            os.unlink(self.devicePath)
+            os.rmdir(self.tempDir)
+
+def addAllCallbacks(gamepad, callback):
+    """Registers callback for every button and axis change, returns a function to remove them again."""
+    buttons = list(gamepad.changedEventMap.keys())
+    axes = list(gamepad.movedEventMap.keys())
+    for index in buttons:
+        gamepad.addButtonChangedHandler(index, callback)
+    for index in axes:
+        gamepad.addAxisMovedHandler(index, callback)
+    def removeAll():
+        for index in buttons:
+            gamepad.removeButtonChangedHandler(index, callback)
+        for index in axes:
+            gamepad.removeAxisMovedHandler(index, callback)
+    return removeAll
+
+def readStream(device, mode, count, lastSequence, onEvent = None):
+    """Reads count events from the device using one of the READ_MODES.
+    onEvent is called after each event is processed (or from the callbacks for the background thread)."""
+    gamepad = device.gamepad
+    if mode == 'getNextEvent':
+        for i in range(count):
+            gamepad.getNextEvent(skipInit = False)
+            if onEvent:
+                onEvent()
+    elif mode == 'updateState':
+        for i in range(count):
+            gamepad.updateState()
+            if onEvent:
+                onEvent()
+    elif mode == 'updateState (callbacks)':
+        if onEvent:
+            removeAll = addAllCallbacks(gamepad, lambda *value: onEvent())
+        else:
+            removeAll = addAllCallbacks(gamepad, lambda *value: None)
+        for i in range(count):
+            gamepad.updateState()
+        removeAll()
+    elif mode == 'background thread':
+        if onEvent:
+            removeAll = addAllCallbacks(gamepad, lambda *value: onEvent())
+        gamepad.startBackgroundUpdates(waitForReady = False)
+        while gamepad.lastTimestamp != lastSequence:
+            time.sleep(0.0005)
+        gamepad.stopBackgroundUpdates()
+        if onEvent:
+            removeAll()
+
+def measureThroughput(device, mode, events):
+    """Writes all of the events as fast as possible while the gamepad reads them.
+    Returns the events per second processed."""
+    lastSequence = device.sequence + len(events)
+    writer = threading.Thread(target = device.write, args = (events,))
+    start = time.perf_counter()
+    writer.start()
+    readStream(device, mode, len(events), lastSequence)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    return len(events) / elapsed
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+def measureLatency(device, mode, events, interval = 0.0002):
+    """Writes the events one at a time with a short gap between them.
+    Returns percentiles of the time in microseconds from each write until the gamepad has processed it.
+
+    The callback based modes are timed from the callbacks, the values are None if no callbacks ran,
+    e.g. init events replace the registered callbacks."""
+    gamepad = device.gamepad
+    firstSequence = device.sequence + 1
+    sendTimes = [0.0] * len(events)
+    latencies = []
+    def sendAll():
+        for i in range(len(events)):
+            sendTimes[i] = time.perf_counter()
+            device.write(events[i:i + 1])
+            time.sleep(interval)
+    def onEvent():
+        latencies.append(time.perf_counter() - sendTimes[gamepad.lastTimestamp - firstSequence])
+    writer = threading.Thread(target = sendAll)
+    writer.start()
+    readStream(device, mode, len(events), firstSequence + len(events) - 1, onEvent)
+    writer.join()
+    if not latencies:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    latencies.sort()
+    return {
+        'p50': percentile(latencies, 0.50) * 1e6,
+        'p90': percentile(latencies, 0.90) * 1e6,
+        'p99': percentile(latencies, 0.99) * 1e6,
+        'max': latencies[-1] * 1e6
+    }
+
+def measureAllocations(device, mode, events):
+    """Traces the memory allocated while the gamepad reads the events.
+    Returns the bytes / blocks still held per event afterwards and the peak bytes while reading."""
+    lastSequence = device.sequence + len(events)
+    data = packEvents(events, device.sequence + 1)
+    gc.collect()
+    tracemalloc.start()
+    startSnapshot = tracemalloc.take_snapshot()
+    startBytes = tracemalloc.get_traced_memory()[0]
+    writer = threading.Thread(target = device.writePacked, args = (data, len(events)))
+    writer.start()
+    readStream(device, mode, len(events), lastSequence)
+    writer.join()
+    del data
+    currentBytes, peakBytes = tracemalloc.get_traced_memory()
+    endSnapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in endSnapshot.compare_to(startSnapshot, 'filename')
+                 if stat.traceback[0].filename == Gamepad.__file__)
+    return {
+        'retainedBytesPerEvent': float(currentBytes - startBytes) / len(events),
+        'retainedGamepadBlocksPerEvent': float(blocks) / len(events),
+        'peakBytes': peakBytes - startBytes
+    }
+
+def runStreamBenchmark(gamepadType = Gamepad.PS4, transport = 'fifo', count = 20000, latencyCount = 1000):
+    """Runs every stream through every read mode for a gamepad type.
+    Returns a dictionary of stream name to read mode to measurements."""
+    results = {}
+    for streamName in sorted(STREAMS.keys()):
+        results[streamName] = {}
+        for mode in READ_MODES:
+            device = FakeDevice(gamepadType, transport)
+            events = STREAMS[streamName](count, device.axisCount, device.buttonCount)
+            try:
+                gc.disable()
+                eventsPerSecond = measureThroughput(device, mode, events)
+                gc.enable()
+                latency = measureLatency(device, mode, events[:latencyCount])
+                allocations = measureAllocations(device, mode, events[:latencyCount])
+            finally:
+                gc.enable()
+                device.close()
+            results[streamName][mode] = {'eventsPerSecond': eventsPerSecond, 'latencyUs': latency}
+            results[streamName][mode].update(allocations)
+    return results
+
+def versionInfo():
+    """Returns details of what was benchmarked, so saved results can be compared."""
+    info = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': None
+    }
+    try:
+        scriptDir = os.path.dirname(os.path.realpath(__file__))
+        info['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = scriptDir,
+                                                 stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Benchmarks the Gamepad library without a controller.')
+    parser.add_argument('--types', default = 'Gamepad,PS4,Xbox360,MMP1251',
+                        help = 'comma separated gamepad types to test (default: %(default)s)')
+    parser.add_argument('--transport', choices = ['fifo', 'pty'], default = 'fifo',
+                        help = 'what stands in for the joystick device (default: %(default)s)')
+    parser.add_argument('--count', type = int, default = 20000,
+                        help = 'events per stream for throughput (default: %(default)s)')
+    parser.add_argument('--latency-count', type = int, default = 1000,
+                        help = 'events per stream for latency and allocations (default: %(default)s)')
+    parser.add_argument('--decode-only', action = 'store_true', help = 'only run the decode benchmarks')
+    parser.add_argument('--json', metavar = 'PATH', help = 'also save the results to a JSON file')
+    args = parser.parse_args()
+
+    gamepadTypes = []
+    for name in args.types.split(','):
+        if name.strip().upper() == 'GAMEPAD':
+            gamepadTypes.append(Gamepad.Gamepad)
+        else:
+            gamepadTypes.append(Gamepad.controllerDict[name.strip().upper()])
+    output = {'version': versionInfo(), 'settings': vars(args), 'decode': {}, 'streams': {}}
+
+    for gamepadType in gamepadTypes:
+        print('Decode cost per event for %s...' % gamepadType.__name__)
+        results = runDecodeBenchmark(gamepadType)
+        output['decode'][gamepadType.__name__] = results
+        for name in sorted(results.keys()):
+            print('    %-30s %8.1f ns' % (name, results[name]))
+    if not args.decode_only:
+        for gamepadType in gamepadTypes:
+            print('Event streams through a %s for %s...' % (args.transport, gamepadType.__name__))
+            print('    %-16s %-24s %10s %8s %8s %8s %8s %10s' %
+                  ('stream', 'read mode', 'events/s', 'p50 us', 'p90 us', 'p99 us', 'max us', 'bytes/ev'))
+            results = runStreamBenchmark(gamepadType, args.transport, args.count, args.latency_count)
+            output['streams'][gamepadType.__name__] = results
+            for streamName in sorted(results.keys()):
+                for mode in READ_MODES:
+                    result = results[streamName][mode]
+                    latency = result['latencyUs']
+                    if latency['p50'] is None:
+                        latencyText = '%8s %8s %8s %8s' % ('-', '-', '-', '-')
+                    else:
+                        latencyText = '%8.1f %8.1f %8.1f %8.1f' % (latency['p50'], latency['p90'], latency['p99'], latency['max'])
+                    print('    %-16s %-24s %10.0f %s %10.2f' %
+                          (streamName, mode, result['eventsPerSecond'], latencyText, result['retainedBytesPerEvent']))
+    if args.json:
+        with open(args.json, 'w') as jsonFile:
+            json.dump(output, jsonFile, indent = 2, sort_keys = True)
+        print('Results saved to %s' % args.json)
@@ -11,31 +11,28 @@ import time
 # Press ENTER without typing a name to get raw numbers for each
 # button press or axis movement, press CTRL+C when done
 class CustomGamepad(Gamepad.Gamepad):
-    def __init__(self, joystickNumber = 0):
-        Gamepad.Gamepad.__init__(self, joystickNumber)
-        self.axisNames = {
-            0: 'LEFT-X',
-            1: 'LEFT-Y',
-            2: 'RIGHT-Y',
-            3: 'RIGHT-X',
-            4: 'DPAD-X',
-            5: 'DPAD-Y'
-        }
-        self.buttonNames = {
-            0:  '1',
-            1:  '2',
-            2:  '3',
-            3:  '4',
-            4:  'L1',
-            5:  'L2',
-            6:  'R1',
-            7:  'R2',
-            8:  'SELECT',
-            9:  'START',
-            10: 'L3',
-            11: 'R3'
-        }
-        self._setupReverseMaps()
+    axisNames = {
+        0: 'LEFT-X',
+        1: 'LEFT-Y',
+        2: 'RIGHT-Y',
+        3: 'RIGHT-X',
+        4: 'DPAD-X',
+        5: 'DPAD-Y'
+    }
+    buttonNames = {
+        0:  '1',
+        1:  '2',
+        2:  '3',
+        3:  '4',
+        4:  'L1',
+        5:  'L2',
+        6:  'R1',
+        7:  'R2',
+        8:  'SELECT',
+        9:  'START',
+        10: 'L3',
+        11: 'R3'
+    }
 
 # Gamepad settings
 gamepadType = CustomGamepad
@@ -2,7 +2,10 @@
 # coding: utf-8
 """
 This module is designed to read inputs from a gamepad or joystick.
-See Controllers.py the names which can be used with specific gamepad types.
+See Controllers.py the names which can be used with specific gamepad types,
+they are loaded the first time one is used, e.g. Gamepad.PS4().
+
+Gamepad.openGamepad() picks the right type automatically from the name the device reports.
 
 For basic use see the following examples:
     AsyncExample.py         - Updates read in the background.
@@ -12,16 +15,138 @@ For basic use see the following examples:
 """
 
 import os
+import io
 import sys
 import struct
+import select
+import fcntl
 import time
 import threading
 import inspect
+import collections
+import array
+import traceback
+import json
+
+try:
+    import builtins
+except ImportError:
+    # Python 2 name for the module
+    import __builtin__ as builtins
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2 does not have a monotonic clock
+    monotonic = time.time
+
+try:
+    from types import MappingProxyType
+except ImportError:
+    # Python 2 does not have read only dictionaries
+    MappingProxyType = dict
+
+if hasattr(struct.Struct, 'iter_unpack'):
+    def unpackRecords(recordStruct, data):
+        """Returns the list of records packed one after another in data."""
+        return list(recordStruct.iter_unpack(data))
+else:
+    def unpackRecords(recordStruct, data):
+        """Returns the list of records packed one after another in data."""
+        # Python 2 does not have iter_unpack
+        size = recordStruct.size
+        return [recordStruct.unpack_from(data, offset) for offset in range(0, len(data) - size + 1, size)]
+
+# All joystick ioctl calls go through here, tests may replace it to stand in for a real device
+ioctl = fcntl.ioctl
+
+def ioctlBuffer(size):
+    """Returns a zeroed buffer of size bytes for ioctl to fill in.
+    Python 2 ioctl does not take a bytearray, an array works on both."""
+    return array.array('B', [0]) * size
+
+def joystickPath(joystickNumber = 0):
+    """Returns the device path for a joystick number.
+    A full path may be given instead of a number, e.g. a FIFO standing in for the device."""
+    joystickNumber = str(joystickNumber)
+    if os.sep in joystickNumber:
+        return joystickNumber
+    else:
+        return '/dev/input/js' + joystickNumber
 
 def available(joystickNumber = 0):
     """Check if a joystick is connected and ready to use."""
-    joystickPath = '/dev/input/js' + str(joystickNumber)
-    return os.path.exists(joystickPath)
+    return os.path.exists(joystickPath(joystickNumber))
+
+def queryDevice(fd):
+    """Asks an open joystick device for its name and how many axes and buttons it has.
+    Returns name, axis count, button count.
+
+    The name is None and the counts 0 if the device cannot tell us,
+    e.g. a FIFO standing in for the device."""
+    nameBuffer = ioctlBuffer(Gamepad.MAX_NAME_LENGTH)
+    try:
+        ioctl(fd, Gamepad.JSIOCGNAME | (len(nameBuffer) << 16), nameBuffer)
+        name = bytes(bytearray(nameBuffer)).split(b'\0', 1)[0].decode('utf-8', 'replace')
+    except (IOError, OSError):
+        name = None
+    counts = []
+    for request in (Gamepad.JSIOCGAXES, Gamepad.JSIOCGBUTTONS):
+        countBuffer = ioctlBuffer(1)
+        try:
+            ioctl(fd, request, countBuffer)
+            counts.append(countBuffer[0])
+        except (IOError, OSError):
+            counts.append(0)
+    return name, counts[0], counts[1]
+
+deviceCache = {}
+
+def deviceInfo(joystickNumber = 0):
+    """Returns a dictionary describing a connected joystick:
+        'name'    - the name reported by the device, None if it does not have one
+        'axes'    - number of axes, 0 if unknown
+        'buttons' - number of buttons, 0 if unknown
+        'type'    - gamepad type from Controllers.py matching the name, None if not known
+
+    Results are kept for each device path until the device there is replaced,
+    e.g. by unplugging the controller and plugging in another.
+
+    Throws an IOError if the device cannot be opened."""
+    path = joystickPath(joystickNumber)
+    try:
+        details = os.stat(path)
+        identity = (details.st_rdev, details.st_ino, details.st_ctime)
+        cached = deviceCache.get(path)
+        if cached is not None and cached[0] == identity:
+            return dict(cached[1])
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except (IOError, OSError) as e:
+        raise IOError('Could not open gamepad %s: %s' % (joystickNumber, str(e)))
+    try:
+        name, axisCount, buttonCount = backendForPath(path).queryDevice(fd)
+    finally:
+        os.close(fd)
+    info = {
+        'name': name,
+        'axes': axisCount,
+        'buttons': buttonCount,
+        'type': findControllerByName(name)
+    }
+    deviceCache[path] = (identity, info)
+    return dict(info)
+
+def openGamepad(joystickNumber = 0, default = None):
+    """Opens a joystick using the gamepad type which matches the name the device reports,
+    see deviceInfo.  When the name is not known the default type is used instead,
+    which is Gamepad (numbers only) if not given.
+    Evdev devices, e.g. '/dev/input/event5', work as well.
+
+    Throws an IOError if the device cannot be opened."""
+    gamepadType = deviceInfo(joystickNumber)['type']
+    if gamepadType is None:
+        gamepadType = default or Gamepad
+    return gamepadType(joystickNumber)
 
 class Gamepad:
     EVENT_CODE_BUTTON = 0x01
@@ -30,9 +155,28 @@ class Gamepad:
     EVENT_CODE_INIT_AXIS = 0x80 | EVENT_CODE_AXIS
     MIN_AXIS = -32767.0
     MAX_AXIS = +32767.0
+    EVENT_STRUCT = struct.Struct('IhBB')
+    JSIOCGAXES = 0x80016a11
+    JSIOCGBUTTONS = 0x80016a12
+    JSIOCGNAME = 0x80006a13
+    MAX_NAME_LENGTH = 128
+    DEFAULT_BATCH_SIZE = 64
+    STOP_TIMEOUT = 1.0
     EVENT_BUTTON = 'BUTTON'
     EVENT_AXIS = 'AXIS'
+    OVERFLOW_CONFLATE = 'CONFLATE'
+    OVERFLOW_DROP = 'DROP'
+    OVERFLOW_BLOCK = 'BLOCK'
+    DEFAULT_DISPATCH_QUEUE = 256
+    FRAME_BATCH = 'BATCH'
+    FRAME_TIMESTAMP = 'TIMESTAMP'
+    CALIBRATION_DIR = os.path.join(os.path.expanduser('~'), '.gamepad')
+    calibrationTables = {}
+    nameTables = {}
     fullName = 'Generic (numbers only)'
+    knownNames = ()
+    axisNames = {}
+    buttonNames = {}
 
     class UpdateThread(threading.Thread):
         """Thread used to continually run the updateState function on a Gamepad in the background
@@ -45,79 +189,870 @@ class Gamepad:
             else:
                 raise ValueError('Gamepad update thread was not created with a valid Gamepad object')
             self.running = True
+            self.lostDevice = False
 
         def run(self):
             try:
+                gamepad = self.gamepad
                 while self.running:
-                    self.gamepad.updateState()
+                    gamepad._updateStateFromEvents(gamepad.readEvents(gamepad.batchSize))
                 self.gamepad = None
+            except IOError:
+                self.running = False
+                self.lostDevice = True
+                gamepad._notifyWaiters()
+                self.gamepad = None
+                if gamepad.hotplug is None:
+                    raise
             except:
                 self.running = False
+                self.gamepad._notifyWaiters()
                 self.gamepad = None
                 raise
 
-    def __init__(self, joystickNumber = 0):
-        self.joystickNumber = str(joystickNumber)
-        self.joystickPath = '/dev/input/js' + self.joystickNumber
-        retryCount = 5
-        while True:
-            try:
-                self.joystickFile = open(self.joystickPath, 'rb')
-                break
-            except IOError as e:
-                retryCount -= 1
-                if retryCount > 0:
-                    time.sleep(0.5)
+    class EventStream:
+        """Lazy stream of decoded events from a Gamepad, created by Gamepad.events.
+
+        Processing stages can be chained on to the stream, for example:
+            gamepad.events().only('LEFT-Y', 'RIGHT-X').invert('LEFT-Y').scale(100)
+
+        Each stage call returns a new stream, nothing is read until it is iterated.
+        The stages are combined into a single step per control when iterated,
+        so events only pass through one function however many stages are used.
+
+        Controls can be given by name or index, stages with no controls given apply to every axis."""
+        def __init__(self, gamepad, skipInit = True, timeout = None, stages = ()):
+            self.gamepad = gamepad
+            self.skipInit = skipInit
+            self.timeout = timeout
+            self.stages = tuple(stages)
+
+        def _addStage(self, *stage):
+            return Gamepad.EventStream(self.gamepad, self.skipInit, self.timeout, self.stages + (stage,))
+
+        def only(self, *controls):
+            """Only passes events for the listed buttons and axes."""
+            return self._addStage('only', frozenset(controls))
+
+        def invert(self, *controls):
+            """Inverts the position of axes."""
+            return self._addStage('scale', frozenset(controls), -1.0)
+
+        def scale(self, factor, *controls):
+            """Multiplies the position of axes by factor."""
+            return self._addStage('scale', frozenset(controls), float(factor))
+
+        def clamp(self, minimum = -1.0, maximum = +1.0, *controls):
+            """Limits the position of axes to between minimum and maximum."""
+            return self._addStage('clamp', frozenset(controls), float(minimum), float(maximum))
+
+        def rename(self, names):
+            """Changes the names given for controls using a dictionary of old name to new name.
+            Later stages see the new names."""
+            return self._addStage('rename', dict(names))
+
+        def _buildPlan(self, eventName, entityName):
+            """Works out what the chained stages do to events for one control.
+
+            Returns None if the events are filtered out, otherwise
+                final name, value function (None when the value is unchanged)"""
+            if eventName == Gamepad.EVENT_AXIS:
+                index = self.gamepad.axisIndex.get(entityName, entityName)
+            else:
+                index = self.gamepad.buttonIndex.get(entityName, entityName)
+            name = entityName
+            operations = []
+            for stage in self.stages:
+                kind = stage[0]
+                if kind == 'rename':
+                    name = stage[1].get(name, name)
+                    continue
+                controls = stage[1]
+                matched = (name in controls) or (index in controls)
+                if kind == 'only':
+                    if not matched:
+                        return None
+                elif eventName != Gamepad.EVENT_AXIS or (controls and not matched):
+                    pass
+                elif kind == 'scale':
+                    # Neighbouring scaling stages are merged into one multiply
+                    if operations and operations[-1][0] == 'scale':
+                        operations[-1] = ('scale', operations[-1][1] * stage[2])
+                    else:
+                        operations.append(('scale', stage[2]))
+                elif kind == 'clamp':
+                    operations.append(('clamp', stage[2], stage[3]))
+            function = None
+            for operation in operations:
+                function = Gamepad.EventStream._chain(function, operation)
+            return name, function
+
+        @staticmethod
+        def _chain(function, operation):
+            if operation[0] == 'scale':
+                factor = operation[1]
+                if function is None:
+                    return lambda value: value * factor
                 else:
-                    raise IOError('Could not open gamepad %s: %s' % (self.joystickNumber, str(e)))
-        self.eventSize = struct.calcsize('IhBB')
-        self.pressedMap = {}
-        self.wasPressedMap = {}
-        self.wasReleasedMap = {}
-        self.axisMap = {}
-        self.buttonNames = {}
-        self.buttonIndex = {}
-        self.axisNames = {}
-        self.axisIndex = {}
+                    return lambda value: function(value) * factor
+            else:
+                minimum, maximum = operation[1], operation[2]
+                if function is None:
+                    return lambda value: min(max(value, minimum), maximum)
+                else:
+                    return lambda value: min(max(function(value), minimum), maximum)
+
+        def __iter__(self):
+            gamepad = self.gamepad
+            plans = {Gamepad.EVENT_BUTTON: {}, Gamepad.EVENT_AXIS: {}}
+            while True:
+                event = gamepad.getNextEvent(self.skipInit, self.timeout)
+                if event is None:
+                    # Timed out
+                    return
+                eventName, entityName, value = event
+                try:
+                    plan = plans[eventName][entityName]
+                except KeyError:
+                    plan = self._buildPlan(eventName, entityName)
+                    plans[eventName][entityName] = plan
+                if plan is None:
+                    continue
+                name, function = plan
+                if function is not None:
+                    yield eventName, name, function(value)
+                elif name is not entityName:
+                    yield eventName, name, value
+                else:
+                    yield event
+
+    class CallbackDispatcher:
+        """Runs gamepad callbacks on worker threads instead of the thread reading the gamepad.
+        Created by Gamepad.startCallbackDispatcher.
+
+        Callbacks are queued in the order the events arrive and run by the workers,
+        so a slow callback no longer holds up reading the gamepad.
+        With a single worker the callbacks run in the same order as without the dispatcher.
+
+        When more than maxQueue callbacks are waiting the overflow policy is used:
+            OVERFLOW_CONFLATE - an axis move replaces one still waiting for the same axis
+            OVERFLOW_DROP     - axis moves are dropped until there is room again
+            OVERFLOW_BLOCK    - the reading thread waits until there is room again
+        Button callbacks are never dropped or conflated."""
+        def __init__(self, workers = 1, maxQueue = 256, overflow = 'CONFLATE'):
+            if overflow not in (Gamepad.OVERFLOW_CONFLATE, Gamepad.OVERFLOW_DROP, Gamepad.OVERFLOW_BLOCK):
+                raise ValueError('Overflow policy %s was not found' % overflow)
+            self.maxQueue = maxQueue
+            self.overflow = overflow
+            self.queue = collections.deque()
+            self.pendingMoves = {}
+            self.condition = threading.Condition()
+            self.running = True
+            self.resetStats()
+            self.workers = []
+            for i in range(workers):
+                worker = threading.Thread(target = self._run)
+                worker.daemon = True
+                self.workers.append(worker)
+            for worker in self.workers:
+                worker.start()
+
+        def wrap(self, callbacks, axisIndex = None):
+            """Returns a callback tuple which queues the callbacks instead of running them.
+            Moves for the same axisIndex may be conflated, None is used for buttons."""
+            if not callbacks:
+                return ()
+            submit = self.submit
+            return (lambda *args: submit(callbacks, args, axisIndex),)
+
+        def submit(self, callbacks, args, axisIndex = None):
+            """Queues the callbacks to be run by a worker with args."""
+            with self.condition:
+                self.submitted += 1
+                queue = self.queue
+                if len(queue) >= self.maxQueue:
+                    if self.overflow == Gamepad.OVERFLOW_BLOCK:
+                        # Workers queueing more callbacks must not wait on themselves
+                        if threading.current_thread() not in self.workers:
+                            while len(queue) >= self.maxQueue and self.running:
+                                self.condition.wait()
+                    elif axisIndex is not None:
+                        if self.overflow == Gamepad.OVERFLOW_DROP:
+                            self.dropped += 1
+                            return
+                        pending = self.pendingMoves.get(axisIndex)
+                        if pending is not None:
+                            pending[1] = args
+                            pending[2] = monotonic()
+                            self.conflated += 1
+                            return
+                item = [callbacks, args, monotonic(), axisIndex]
+                queue.append(item)
+                if axisIndex is not None:
+                    self.pendingMoves[axisIndex] = item
+                if len(queue) > self.maxQueueDepth:
+                    self.maxQueueDepth = len(queue)
+                self.condition.notify()
+
+        def _run(self):
+            condition = self.condition
+            queue = self.queue
+            while True:
+                with condition:
+                    while not queue and self.running:
+                        condition.wait()
+                    if not queue:
+                        return
+                    item = queue.popleft()
+                    callbacks, args, queuedTime, axisIndex = item
+                    if axisIndex is not None and self.pendingMoves.get(axisIndex) is item:
+                        del self.pendingMoves[axisIndex]
+                    lag = monotonic() - queuedTime
+                    self.dispatched += 1
+                    self.totalLag += lag
+                    self.lastLag = lag
+                    if lag > self.maxLag:
+                        self.maxLag = lag
+                    # Let any blocked reader know there is room again
+                    condition.notify_all()
+                for callback in callbacks:
+                    try:
+                        callback(*args)
+                    except Exception:
+                        with condition:
+                            self.errors += 1
+                        traceback.print_exc()
+
+        def stop(self, drain = True):
+            """Stops the workers once the queued callbacks have run.
+            If drain is False any callbacks still queued are thrown away."""
+            with self.condition:
+                self.running = False
+                if not drain:
+                    self.queue.clear()
+                    self.pendingMoves.clear()
+                self.condition.notify_all()
+            for worker in self.workers:
+                if worker is not threading.current_thread():
+                    worker.join(Gamepad.STOP_TIMEOUT)
+
+        def resetStats(self):
+            """Resets the counters reported by stats."""
+            self.submitted = 0
+            self.dispatched = 0
+            self.conflated = 0
+            self.dropped = 0
+            self.errors = 0
+            self.maxQueueDepth = len(self.queue)
+            self.totalLag = 0.0
+            self.maxLag = 0.0
+            self.lastLag = 0.0
+
+        def stats(self):
+            """Returns a dictionary of counters for the dispatcher:
+                'queueDepth'    - callbacks waiting to run now
+                'maxQueueDepth' - most callbacks waiting at once
+                'submitted'     - callbacks given to the dispatcher
+                'dispatched'    - callbacks handed to a worker
+                'conflated'     - axis moves replaced by a newer position
+                'dropped'       - axis moves thrown away because the queue was full
+                'errors'        - callbacks which raised an exception
+                'averageLag'    - mean seconds from an event to its callbacks starting
+                'maxLag'        - longest seconds from an event to its callbacks starting
+                'lastLag'       - seconds from an event to its callbacks starting, for the latest one"""
+            with self.condition:
+                if self.dispatched:
+                    averageLag = self.totalLag / self.dispatched
+                else:
+                    averageLag = 0.0
+                return {
+                    'queueDepth': len(self.queue),
+                    'maxQueueDepth': self.maxQueueDepth,
+                    'submitted': self.submitted,
+                    'dispatched': self.dispatched,
+                    'conflated': self.conflated,
+                    'dropped': self.dropped,
+                    'errors': self.errors,
+                    'averageLag': averageLag,
+                    'maxLag': self.maxLag,
+                    'lastLag': self.lastLag
+                }
+
+    class ButtonHandle(object):
+        """Fast access to a single button, created by Gamepad.button.
+
+        The name is looked up once when the handle is made and the gamepad
+        keeps these values up to date, so each read is a plain attribute read:
+            pressed - True if the button is held
+            value   - the same as pressed
+            edges   - count of presses and releases since the handle was made,
+                      it changes whenever the button has, even if the button is
+                      back in the same state by the time it is read"""
+        __slots__ = ('index', 'name', 'pressed', 'value', 'edges')
+
+        def __init__(self, index, name, pressed):
+            self.index = index
+            self.name = name
+            self.pressed = pressed
+            self.value = pressed
+            self.edges = 0
+
+        def _changed(self, pressed):
+            self.pressed = pressed
+            self.value = pressed
+            self.edges += 1
+
+    class AxisHandle(object):
+        """Fast access to a single axis, created by Gamepad.axisHandle.
+
+        The name is looked up once when the handle is made and the gamepad
+        keeps value up to date, so each read is a plain attribute read."""
+        __slots__ = ('index', 'name', 'value')
+
+        def __init__(self, index, name, value):
+            self.index = index
+            self.name = name
+            self.value = value
+
+        def _moved(self, value):
+            self.value = value
+
+    class EventStats(object):
+        """Timing measurements for a Gamepad, created by Gamepad.enableStats.
+
+        While enabled the decode functions and callbacks are swapped for timed
+        versions, so there is no extra work per event once stats are disabled.
+        Durations are kept as histograms with power of two buckets in microseconds."""
+        HISTOGRAM_BUCKETS = 24
+
+        def __init__(self, timestampWrap = 0x100000000):
+            self.timestampWrap = timestampWrap
+            self.kernelTimestamp = None
+            self.lastKernelTimestamp = 0
+            self.receiveTime = None
+            self.reset()
+
+        def reset(self):
+            self.startTime = monotonic()
+            self.reads = 0
+            self.receivedEvents = 0
+            self.events = 0
+            self.callbackTime = 0.0
+            self.lag = self._newHistogram()
+            self.decodeTimes = {Gamepad.EVENT_BUTTON: {}, Gamepad.EVENT_AXIS: {}}
+            self.callbackTimes = {Gamepad.EVENT_BUTTON: {}, Gamepad.EVENT_AXIS: {}}
+
+        def _newHistogram(self):
+            # count, total seconds, max seconds, bucket counts
+            return [0, 0.0, 0.0, [0] * Gamepad.EventStats.HISTOGRAM_BUCKETS]
+
+        @staticmethod
+        def _add(histogram, duration):
+            histogram[0] += 1
+            histogram[1] += duration
+            if duration > histogram[2]:
+                histogram[2] = duration
+            # Bucket 0 is under 1 us, bucket n is from 2 ** (n - 1) us up to 2 ** n us
+            bucket = int(duration * 1000000).bit_length()
+            buckets = histogram[3]
+            if bucket >= len(buckets):
+                bucket = len(buckets) - 1
+            buckets[bucket] += 1
+
+        def received(self, count):
+            """Called by the gamepad each time events are read from the device."""
+            self.receiveTime = monotonic()
+            self.reads += 1
+            self.receivedEvents += count
+
+        def wrapDecoder(self, decode, eventName, entityNames):
+            """Returns a decode function which times decode and keeps the kernel timestamp."""
+            decodeTimes = self.decodeTimes[eventName]
+            add = Gamepad.EventStats._add
+            wrap = self.timestampWrap
+            def timedDecode(timestamp, value, index):
+                # The joystick interface counts in 32 bit milliseconds, which wraps after about 49 days
+                if self.kernelTimestamp is None or wrap is None:
+                    self.kernelTimestamp = timestamp
+                else:
+                    half = wrap >> 1
+                    self.kernelTimestamp += ((timestamp - self.lastKernelTimestamp + half) % wrap) - half
+                self.lastKernelTimestamp = timestamp
+                self.callbackTime = 0.0
+                start = monotonic()
+                finalValue = decode(timestamp, value, index)
+                duration = monotonic() - start - self.callbackTime
+                self.events += 1
+                if self.receiveTime is not None:
+                    add(self.lag, start - self.receiveTime)
+                try:
+                    histogram = decodeTimes[index]
+                except KeyError:
+                    histogram = self._newHistogram()
+                    decodeTimes[index] = histogram
+                add(histogram, duration)
+                return finalValue
+            return timedDecode
+
+        def wrapCallbacks(self, callbacks, eventName, index):
+            """Returns a callback tuple which runs the callbacks and times them."""
+            if not callbacks:
+                return ()
+            callbackTimes = self.callbackTimes[eventName]
+            add = Gamepad.EventStats._add
+            def timedCallbacks(*args):
+                start = monotonic()
+                for callback in callbacks:
+                    callback(*args)
+                duration = monotonic() - start
+                self.callbackTime += duration
+                try:
+                    histogram = callbackTimes[index]
+                except KeyError:
+                    histogram = self._newHistogram()
+                    callbackTimes[index] = histogram
+                add(histogram, duration)
+            return (timedCallbacks,)
+
+        @staticmethod
+        def _summary(histogram):
+            count, total, maximum, buckets = histogram
+            if count:
+                mean = total / count
+            else:
+                mean = 0.0
+            return {
+                'count': count,
+                'mean': mean,
+                'max': maximum,
+                'histogram': dict((1 << bucket, bucketCount) for bucket, bucketCount in enumerate(buckets) if bucketCount)
+            }
+
+        def _summaries(self, histograms, names):
+            return dict((names.get(index, index), Gamepad.EventStats._summary(histogram))
+                        for index, histogram in list(histograms.items()))
+
+        def stats(self, gamepad):
+            elapsed = monotonic() - self.startTime
+            if elapsed > 0:
+                eventsPerSecond = self.events / elapsed
+            else:
+                eventsPerSecond = 0.0
+            return {
+                'elapsed': elapsed,
+                'reads': self.reads,
+                'receivedEvents': self.receivedEvents,
+                'events': self.events,
+                'eventsPerSecond': eventsPerSecond,
+                'kernelTimestamp': self.kernelTimestamp,
+                'receiveTime': self.receiveTime,
+                'lag': Gamepad.EventStats._summary(self.lag),
+                'decode': {
+                    'buttons': self._summaries(self.decodeTimes[Gamepad.EVENT_BUTTON], gamepad.buttonNames),
+                    'axes': self._summaries(self.decodeTimes[Gamepad.EVENT_AXIS], gamepad.axisNames)
+                },
+                'callbacks': {
+                    'buttons': self._summaries(self.callbackTimes[Gamepad.EVENT_BUTTON], gamepad.buttonNames),
+                    'axes': self._summaries(self.callbackTimes[Gamepad.EVENT_AXIS], gamepad.axisNames)
+                }
+            }
+
+    def __init__(self, joystickNumber = 0, backend = None):
+        # The controller class, wrappers such as GamepadBroker.RemoteGamepad replace it with the one they wrap
+        self.controllerType = self.__class__
+        self.joystickNumber = str(joystickNumber)
+        self.joystickPath = joystickPath(joystickNumber)
+        if backend is None:
+            backend = backendForPath(self.joystickPath)
+        self.backend = backend(self)
+        self.unpackEvents = self.backend.unpack
+        self.joystickFile = self._openDevice()
+        self.eventSize = self.backend.eventSize
+        self.batchSize = Gamepad.DEFAULT_BATCH_SIZE
+        self.readBuffer = bytearray(self.eventSize * self.batchSize)
+        self.readView = memoryview(self.readBuffer)
+        self.pendingEvents = collections.deque()
+        self.decodedEvents = collections.deque()
+        self.wakePipe = WakePipe()
+        self.poller = select.poll()
+        self.poller.register(self.joystickFile.fileno(), select.POLLIN)
+        self.poller.register(self.wakePipe.fileno(), select.POLLIN)
+        self.deviceName, axisCount, buttonCount = self.backend.query(self.joystickFile.fileno())
+        self.pressedMap = bytearray(buttonCount)
+        self.wasPressedMap = bytearray(buttonCount)
+        self.wasReleasedMap = bytearray(buttonCount)
+        self.axisMap = array.array('d', [0.0]) * axisCount
+        self.initCount = 0
+        self.buttonNames, self.buttonIndex, self.axisNames, self.axisIndex = self._nameTables()
         self.lastTimestamp = 0
+        self.stateSequence = 0
+        # The state sequence and the snapshot taken at it, replaced together so threads can share it
+        self.lastSnapshot = (-1, None)
         self.updateThread = None
         self.connected = True
         self.pressedEventMap = {}
         self.releasedEventMap = {}
         self.changedEventMap = {}
         self.movedEventMap = {}
+        self.buttonEntityNames = {}
+        self.buttonCallbacks = {}
+        self.axisEntityNames = {}
+        self.axisCallbacks = {}
+        self.axisCallbacksUsed = False
+        self.buttonHandles = {}
+        self.axisHandles = {}
+        self.callbackDispatcher = None
+        self.axisCalibrations = {}
+        self.axisTables = {}
+        self.axisFiltering = False
+        self.axisThreshold = None
+        self.axisThresholds = {}
+        self.axisFilterPositions = {}
+        self.resetFilterStats()
+        self.coalescing = False
+        self.axisMinInterval = 0.0
+        self.axisMinIntervals = {}
+        self.axisNextDelivery = {}
+        self.heldAxisEvents = {}
+        self.resetCoalescingStats()
+        self.frameMode = None
+        self.frameEventMap = []
+        self.frameCallbacks = ()
+        self.frameButtons = []
+        self.frameAxes = {}
+        self.recorder = None
+        self.publishers = ()
+        self.eventStats = None
+        self.eventCondition = threading.Condition()
+        self.eventWaiters = 0
+        self.externalReader = None
+        self.hotplug = None
+        self._setupDecoders()
+        # Devices which do not send their own initial state get it from the backend
+        self._updateStateFromEvents(self.backend.initialEvents(self.joystickFile.fileno()))
 
     def __del__(self):
         try:
             self.joystickFile.close()
         except AttributeError:
             pass
+        try:
+            self.wakePipe.close()
+        except AttributeError:
+            pass
+
+    def _openDevice(self, retryCount = 5):
+        """Opens the joystick device for reading without blocking, trying up to retryCount times.
+        Returns the unbuffered file object for the device."""
+        while True:
+            try:
+                return io.open(os.open(self.joystickPath, os.O_RDONLY | os.O_NONBLOCK), 'rb', 0)
+            except (IOError, OSError) as e:
+                retryCount -= 1
+                if retryCount > 0:
+                    time.sleep(0.5)
+                else:
+                    raise IOError('Could not open gamepad %s: %s' % (self.joystickNumber, str(e)))
+
+    def _resizeButtons(self, count):
+        """Grows the button state storage to hold count buttons."""
+        extra = bytearray(count - len(self.pressedMap))
+        try:
+            self.pressedMap.extend(extra)
+            self.wasPressedMap.extend(extra)
+            self.wasReleasedMap.extend(extra)
+        except BufferError:
+            # Memory views are still held by rawState users, replace the storage instead
+            self.pressedMap = self.pressedMap[:] + extra
+            self.wasPressedMap = self.wasPressedMap[:] + extra
+            self.wasReleasedMap = self.wasReleasedMap[:] + extra
+
+    def _resizeAxes(self, count):
+        """Grows the axis state storage to hold count axes."""
+        extra = array.array('d', [0.0]) * (count - len(self.axisMap))
+        try:
+            self.axisMap.extend(extra)
+        except BufferError:
+            # Memory views are still held by rawState users, replace the storage instead
+            self.axisMap = self.axisMap[:] + extra
+
+    def rawState(self):
+        """Returns memory views of the state storage, no copies are made.
+
+        The dictionary has these views, all indexed by the raw button / axis index:
+            'axes'        - axis positions as doubles, between -1.0 and +1.0
+            'pressed'     - 1 if a button is held, 0 if not
+            'wasPressed'  - 1 if a button was pressed since the last beenPressed call
+            'wasReleased' - 1 if a button was released since the last beenReleased call
+
+        The views follow the gamepad state as it changes.
+        They are only valid while the number of buttons and axes stays the same,
+        which is normally the case once isReady returns True."""
+        return {
+            'axes': memoryview(self.axisMap),
+            'pressed': memoryview(self.pressedMap),
+            'wasPressed': memoryview(self.wasPressedMap),
+            'wasReleased': memoryview(self.wasReleasedMap)
+        }
+
+    @classmethod
+    def _nameTables(cls):
+        """Returns the name tables for this gamepad type, built from the buttonNames and axisNames
+        class attributes the first time and then shared by every gamepad of the type:
+            buttonNames, buttonIndex, axisNames, axisIndex
+        The tables are read only so they cannot be changed for all gamepads by mistake."""
+        tables = Gamepad.nameTables.get(cls)
+        if tables is None:
+            buttonNames = dict(cls.buttonNames)
+            axisNames = dict(cls.axisNames)
+            tables = (MappingProxyType(buttonNames),
+                      MappingProxyType(dict((name, index) for index, name in buttonNames.items())),
+                      MappingProxyType(axisNames),
+                      MappingProxyType(dict((name, index) for index, name in axisNames.items())))
+            Gamepad.nameTables[cls] = tables
+        return tables
 
     def _setupReverseMaps(self):
-        for index in self.buttonNames:
-            self.buttonIndex[self.buttonNames[index]] = index
-        for index in self.axisNames:
-            self.axisIndex[self.axisNames[index]] = index
+        """Rebuilds the name lookups after buttonNames or axisNames are replaced on this gamepad.
+        Only needed by classes which set the names in __init__ rather than as class attributes."""
+        self.buttonIndex = dict((name, index) for index, name in self.buttonNames.items())
+        self.axisIndex = dict((name, index) for index, name in self.axisNames.items())
+        self._rebuildSlots()
+
+    def _wake(self):
+        """Wakes up any call which is waiting for events from the gamepad."""
+        self.wakePipe.wake()
+
+    def _waitForEvents(self, timeout = None):
+        """Waits until the gamepad has events ready to read.
+        The timeout is in seconds, None waits forever.
+
+        Returns False if the timeout passed or the wait was woken up by _wake to stop,
+        e.g. by stopBackgroundUpdates or disconnect.  Other wake ups carry on waiting."""
+        if timeout is not None:
+            endTime = monotonic() + timeout
+        while True:
+            if timeout is None:
+                ready = self.poller.poll()
+            else:
+                ready = self.poller.poll(max(0, int((endTime - monotonic()) * 1000 + 0.999)))
+            joystickReady = False
+            woken = False
+            for fd, pollEvents in ready:
+                if fd == self.wakePipe.readFd:
+                    woken = True
+                else:
+                    joystickReady = True
+            if woken:
+                self.wakePipe.drain()
+                if self._wakeEndsWait():
+                    return False
+            if joystickReady:
+                return True
+            elif not woken:
+                # The timeout passed
+                return False
+
+    def _wakeEndsWait(self):
+        """Returns True if a wake up means the current wait should stop.
+        A wake up left over from before, e.g. an earlier stopBackgroundUpdates, does not."""
+        if not self.connected or self.pendingEvents:
+            return True
+        updateThread = self.updateThread
+        return updateThread is not None and not updateThread.running and updateThread is threading.current_thread()
+
+    def _readEventsRaw(self, maxEvents, timeout = None):
+        """Reads up to maxEvents raw events from the gamepad with a single read call.
+        Waits for at least one event if none are available yet.
+        An empty list is returned if timeout seconds pass without an event.
+
+        Throws an IOError if the gamepad is disconnected"""
+        if not self.connected:
+            raise IOError('Gamepad has been disconnected')
+        if self.heldAxisEvents:
+            # Wake up in time to pass on axis positions held back by coalescing
+            delay = self._heldEventsDelay()
+            if timeout is not None:
+                delay = min(delay, timeout)
+            if not self._waitForEvents(delay):
+                return self._coalesceEvents([])
+        elif not self._waitForEvents(timeout):
+            return []
+        return self._readReadyEvents(maxEvents)
+
+    def _readReadyEvents(self, maxEvents):
+        """Reads up to maxEvents raw events from the gamepad without waiting.
+        Used when the device is already known to be ready, e.g. by poll or select.
+
+        Throws an IOError if the gamepad is disconnected"""
+        if not self.connected:
+            raise IOError('Gamepad has been disconnected')
+        readSize = self.eventSize * maxEvents
+        if readSize > len(self.readBuffer):
+            self.readBuffer = bytearray(readSize)
+            self.readView = memoryview(self.readBuffer)
+        try:
+            count = self.joystickFile.readinto(self.readView[:readSize])
+            if count is None:
+                # Nothing to read after all
+                return []
+            # Complete any partially read event, pipes may split them
+            while count and (count % self.eventSize):
+                remaining = self.eventSize - (count % self.eventSize)
+                extra = self.joystickFile.readinto(self.readView[count:count + remaining])
+                if extra is None:
+                    self._waitForEvents(Gamepad.STOP_TIMEOUT)
+                elif extra:
+                    count += extra
+                else:
+                    count = 0
+        except (IOError, ValueError) as e:
+            self.connected = False
+            for publisher in self.publishers:
+                publisher.publish()
+            self._notifyWaiters()
+            raise IOError('Gamepad %s disconnected: %s' % (self.joystickNumber, str(e)))
+        if not count:
+            self.connected = False
+            for publisher in self.publishers:
+                publisher.publish()
+            self._notifyWaiters()
+            raise IOError('Gamepad %s disconnected' % self.joystickNumber)
+        if self.recorder is not None:
+            self.recorder.record(self.readView[:count])
+        if self.eventStats is not None:
+            self.eventStats.received(count // self.eventSize)
+        events = self.unpackEvents(self.readView[:count])
+        if self.axisFiltering:
+            events = self._filterAxisEvents(events)
+        if self.coalescing:
+            return self._coalesceEvents(events)
+        return events
+
+    def _filterAxisEvents(self, events):
+        """Removes axis events which do not move the axis by more than its threshold, used when filtering is enabled.
+
+        Positions are compared after calibration with the last position passed on,
+        so slow drift is still passed on once it adds up to more than the threshold.
+        Moves to exactly 0.0, -1.0 or +1.0 are always passed on.
+        Button events are never removed or reordered."""
+        axisCode = Gamepad.EVENT_CODE_AXIS
+        axisThresholds = self.axisThresholds
+        defaultThreshold = self.axisThreshold
+        lastPositions = self.axisFilterPositions
+        axisTables = self.axisTables
+        filteredCounts = self.filteredAxisCounts
+        kept = []
+        axisEvents = 0
+        for event in events:
+            timestamp, value, eventType, index = event
+            if eventType & 0x7F == axisCode:
+                if axisTables and index in axisTables:
+                    position = axisTables[index][value]
+                else:
+                    position = value / Gamepad.MAX_AXIS
+                if eventType == axisCode:
+                    axisEvents += 1
+                    threshold = axisThresholds.get(index, defaultThreshold)
+                    if threshold is not None and index in lastPositions:
+                        lastPosition = lastPositions[index]
+                        if position == lastPosition or (abs(position - lastPosition) <= threshold and
+                                                        not (position == 0.0 or position == 1.0 or position == -1.0)):
+                            filteredCounts[index] = filteredCounts.get(index, 0) + 1
+                            continue
+                lastPositions[index] = position
+            kept.append(event)
+        self.filterAxisEventCount += axisEvents
+        return kept
+
+    def _coalesceEvents(self, events):
+        """Removes axis events which are replaced by a newer position, used when coalescing is enabled.
 
-    def _getNextEventRaw(self):
+        Only the last position for each axis in the list is kept.
+        Axes with a minimum interval have their newest position held back until
+        the interval has passed, held positions which are now due are returned first.
+        Button events are never removed or reordered.
+        Pass an empty list to just collect the held positions which are now due."""
+        now = monotonic()
+        axisCode = Gamepad.EVENT_CODE_AXIS
+        coalescedCounts = self.coalescedAxisCounts
+        axisMinIntervals = self.axisMinIntervals
+        nextDelivery = self.axisNextDelivery
+        held = self.heldAxisEvents
+        # Work backwards so the first position seen for each axis is the newest
+        latest = set()
+        kept = []
+        axisEvents = 0
+        for event in reversed(events):
+            if event[2] == axisCode:
+                axisEvents += 1
+                index = event[3]
+                if index in latest:
+                    # A newer position for this axis follows in the same batch
+                    coalescedCounts[index] = coalescedCounts.get(index, 0) + 1
+                    continue
+                latest.add(index)
+                if index in held:
+                    # Still holding an older position, replace it
+                    coalescedCounts[index] = coalescedCounts.get(index, 0) + 1
+                    del held[index]
+                if now < nextDelivery.get(index, 0.0):
+                    held[index] = event
+                    continue
+                nextDelivery[index] = now + axisMinIntervals.get(index, self.axisMinInterval)
+            kept.append(event)
+        self.axisEventCount += axisEvents
+        # Held positions which are now due come before the newer events
+        for index in list(held.keys()):
+            if index not in latest and nextDelivery[index] <= now:
+                kept.append(held.pop(index))
+                nextDelivery[index] = now + axisMinIntervals.get(index, self.axisMinInterval)
+        kept.reverse()
+        return kept
+
+    def _heldEventsDelay(self):
+        """Returns the time in seconds until the next held axis position is due."""
+        nextDelivery = self.axisNextDelivery
+        due = min(nextDelivery[index] for index in list(self.heldAxisEvents.keys()))
+        return max(0.0, due - monotonic())
+
+    def _getNextEventRaw(self, timeout = None):
         """Returns the next raw event from the gamepad.
+        Returns None if timeout seconds pass without an event, None waits forever.
 
         The return format is:
             timestamp (ms), value, event type code, axis / button number
         Throws an IOError if the gamepad is disconnected"""
-        if self.connected:
-            try:
-                rawEvent = self.joystickFile.read(self.eventSize)
-            except IOError as e:
-                self.connected = False
-                raise IOError('Gamepad %s disconnected: %s' % (self.joystickNumber, str(e)))
-            if rawEvent is None:
-                self.connected = False
-                raise IOError('Gamepad %s disconnected' % self.joystickNumber)
-            else:
-                return struct.unpack('IhBB', rawEvent)
-        else:
-            raise IOError('Gamepad has been disconnected')
+        if timeout is None:
+            while not self.pendingEvents:
+                self.pendingEvents.extend(self._readEventsRaw(self.batchSize))
+        elif not self.pendingEvents:
+            endTime = monotonic() + timeout
+            while not self.pendingEvents:
+                self.pendingEvents.extend(self._readEventsRaw(self.batchSize, timeout))
+                timeout = endTime - monotonic()
+                if timeout <= 0:
+                    break
+            if not self.pendingEvents:
+                return None
+        return self.pendingEvents.popleft()
+
+    def readEvents(self, maxEvents = DEFAULT_BATCH_SIZE, timeout = None):
+        """Returns a list of the raw events waiting to be read from the gamepad, up to maxEvents long.
+        All of the pending events are read with a single call to the device.
+
+        This call waits for a new event if there are not any waiting to be processed.
+        If timeout is given the wait is limited to that many seconds and an empty list is returned.
+
+        The format of each event is the same as returned by _getNextEventRaw.
+        Throws an IOError if the gamepad is disconnected"""
+        if not self.pendingEvents:
+            events = self._readEventsRaw(maxEvents, timeout)
+            if events or not self.pendingEvents:
+                return events
+        # Pending events may also have been added while waiting, e.g. by disableAxisCoalescing
+        count = min(maxEvents, len(self.pendingEvents))
+        return [self.pendingEvents.popleft() for i in range(count)]
 
     def _rawEventToDescription(self, event):
         """Decodes the raw event from getNextEventRaw into a formatted string."""
@@ -161,7 +1096,335 @@ class Gamepad:
         else:
             return '%010u: Unknown event %u, Index %u, Value %i' % (timestamp, eventType, index, value)
 
-    def getNextEvent(self, skipInit = True):
+    def _setupDecoders(self):
+        """Builds the table used to decode raw events, indexed by the event type code.
+        Each entry holds the decode function, the event name, and the entity names by index."""
+        self.decoders = {}
+        self._refreshDecoders()
+
+    def _refreshDecoders(self):
+        """Fills in the decode table, used when the decode functions need changing."""
+        self._setDecoder(Gamepad.EVENT_CODE_BUTTON, self._decodeButton, Gamepad.EVENT_BUTTON, self.buttonEntityNames)
+        self._setDecoder(Gamepad.EVENT_CODE_INIT_BUTTON, self._decodeInitButton, Gamepad.EVENT_BUTTON, self.buttonEntityNames)
+        self._setDecoder(Gamepad.EVENT_CODE_INIT_AXIS, self._decodeInitAxis, Gamepad.EVENT_AXIS, self.axisEntityNames)
+        self._updateAxisDecoder()
+        self.frameDecoders = {}
+        for eventType, decode in ((Gamepad.EVENT_CODE_BUTTON, self._decodeFrameButton),
+                                  (Gamepad.EVENT_CODE_AXIS, self._decodeFrameAxis)):
+            eventName, entityNames = self.decoders[eventType][1:]
+            if self.eventStats is not None:
+                decode = self.eventStats.wrapDecoder(decode, eventName, entityNames)
+            self.frameDecoders[eventType] = decode
+
+    def _setDecoder(self, eventType, decode, eventName, entityNames):
+        """Sets the decode table entry for an event type code, timed when stats are enabled."""
+        if self.eventStats is not None:
+            decode = self.eventStats.wrapDecoder(decode, eventName, entityNames)
+        self.decoders[eventType] = (decode, eventName, entityNames)
+
+    def _buildButtonSlot(self, index):
+        """Precomputes the entity name and callbacks used to decode events for a button index."""
+        self.buttonEntityNames[index] = self.buttonNames.get(index, index)
+        pressedCallbacks = tuple(self.pressedEventMap.get(index, ()))
+        releasedCallbacks = tuple(self.releasedEventMap.get(index, ()))
+        changedCallbacks = tuple(self.changedEventMap.get(index, ()))
+        dispatcher = self.callbackDispatcher
+        if dispatcher is not None:
+            pressedCallbacks = dispatcher.wrap(pressedCallbacks)
+            releasedCallbacks = dispatcher.wrap(releasedCallbacks)
+            changedCallbacks = dispatcher.wrap(changedCallbacks)
+        eventStats = self.eventStats
+        if eventStats is not None:
+            pressedCallbacks = eventStats.wrapCallbacks(pressedCallbacks, Gamepad.EVENT_BUTTON, index)
+            releasedCallbacks = eventStats.wrapCallbacks(releasedCallbacks, Gamepad.EVENT_BUTTON, index)
+            changedCallbacks = eventStats.wrapCallbacks(changedCallbacks, Gamepad.EVENT_BUTTON, index)
+        if index in self.buttonHandles:
+            # Handles are updated before any handlers run so they see the new state
+            changedCallbacks = (self.buttonHandles[index]._changed,) + changedCallbacks
+        self.buttonCallbacks[index] = (pressedCallbacks, releasedCallbacks, changedCallbacks)
+
+    def _buildAxisSlot(self, index):
+        """Precomputes the entity name and callbacks used to decode events for an axis index."""
+        self.axisEntityNames[index] = self.axisNames.get(index, index)
+        movedCallbacks = tuple(self.movedEventMap.get(index, ()))
+        if self.callbackDispatcher is not None:
+            movedCallbacks = self.callbackDispatcher.wrap(movedCallbacks, index)
+        if self.eventStats is not None:
+            movedCallbacks = self.eventStats.wrapCallbacks(movedCallbacks, Gamepad.EVENT_AXIS, index)
+        if index in self.axisHandles:
+            # Handles are updated before any handlers run so they see the new state
+            movedCallbacks = (self.axisHandles[index]._moved,) + movedCallbacks
+        self.axisCallbacks[index] = movedCallbacks
+        # Lets frame mode skip passing on the axis positions when nothing wants them
+        self.axisCallbacksUsed = any(self.axisCallbacks.values())
+
+    def _buildFrameSlot(self):
+        """Precomputes the callbacks used at the end of each frame in frame mode."""
+        frameCallbacks = tuple(self.frameEventMap)
+        if self.callbackDispatcher is not None:
+            frameCallbacks = self.callbackDispatcher.wrap(frameCallbacks)
+        self.frameCallbacks = frameCallbacks
+
+    def _rebuildSlots(self):
+        """Rebuilds all of the precomputed decode data, used when the name mappings change."""
+        for index in list(self.buttonCallbacks.keys()):
+            self._buildButtonSlot(index)
+        for index in list(self.axisCallbacks.keys()):
+            self._buildAxisSlot(index)
+        self._buildFrameSlot()
+
+    def _decodeButton(self, timestamp, value, index):
+        pressedCallbacks, releasedCallbacks, changedCallbacks = self.buttonCallbacks[index]
+        if value:
+            self.stateSequence += 1
+            self.lastTimestamp = timestamp
+            self.pressedMap[index] = 1
+            self.wasPressedMap[index] = 1
+            self.stateSequence += 1
+            for callback in pressedCallbacks:
+                callback()
+            for callback in changedCallbacks:
+                callback(True)
+            return True
+        else:
+            self.stateSequence += 1
+            self.lastTimestamp = timestamp
+            self.pressedMap[index] = 0
+            self.wasReleasedMap[index] = 1
+            self.stateSequence += 1
+            for callback in releasedCallbacks:
+                callback()
+            for callback in changedCallbacks:
+                callback(False)
+            return False
+
+    def _decodeAxis(self, timestamp, value, index):
+        finalValue = value / Gamepad.MAX_AXIS
+        self.stateSequence += 1
+        self.lastTimestamp = timestamp
+        self.axisMap[index] = finalValue
+        self.stateSequence += 1
+        for callback in self.axisCallbacks[index]:
+            callback(finalValue)
+        return finalValue
+
+    def _decodeFrameButton(self, timestamp, value, index):
+        # State only, the callbacks are made once the whole frame is applied
+        finalValue = (value != 0)
+        self.lastTimestamp = timestamp
+        self.pressedMap[index] = finalValue
+        if finalValue:
+            self.wasPressedMap[index] = 1
+        else:
+            self.wasReleasedMap[index] = 1
+        self.frameButtons.append((index, finalValue))
+        return finalValue
+
+    def _decodeFrameAxis(self, timestamp, value, index):
+        # State only, the callbacks are made once the whole frame is applied
+        axisTables = self.axisTables
+        if axisTables and index in axisTables:
+            finalValue = axisTables[index][value]
+        else:
+            finalValue = value / Gamepad.MAX_AXIS
+        self.lastTimestamp = timestamp
+        self.axisMap[index] = finalValue
+        self.frameAxes[index] = finalValue
+        return finalValue
+
+    def _decodeInitButton(self, timestamp, value, index):
+        finalValue = (value != 0)
+        self.stateSequence += 1
+        if index >= len(self.pressedMap):
+            self._resizeButtons(index + 1)
+        self.lastTimestamp = timestamp
+        self.pressedMap[index] = finalValue
+        self.wasPressedMap[index] = 0
+        self.wasReleasedMap[index] = 0
+        self.stateSequence += 1
+        self.initCount += 1
+        if index in self.buttonHandles:
+            self.buttonHandles[index].pressed = finalValue
+            self.buttonHandles[index].value = finalValue
+        # Handlers added before a reconnect are kept
+        self.pressedEventMap.setdefault(index, [])
+        self.releasedEventMap.setdefault(index, [])
+        self.changedEventMap.setdefault(index, [])
+        self._buildButtonSlot(index)
+        return finalValue
+
+    def _decodeCalibratedAxis(self, timestamp, value, index):
+        try:
+            # Negative values index from the end of the table
+            finalValue = self.axisTables[index][value]
+        except KeyError:
+            finalValue = value / Gamepad.MAX_AXIS
+        self.stateSequence += 1
+        self.lastTimestamp = timestamp
+        self.axisMap[index] = finalValue
+        self.stateSequence += 1
+        for callback in self.axisCallbacks[index]:
+            callback(finalValue)
+        return finalValue
+
+    def _decodeInitAxis(self, timestamp, value, index):
+        if index in self.axisTables:
+            finalValue = self.axisTables[index][value]
+        else:
+            finalValue = value / Gamepad.MAX_AXIS
+        self.stateSequence += 1
+        if index >= len(self.axisMap):
+            self._resizeAxes(index + 1)
+        self.lastTimestamp = timestamp
+        self.axisMap[index] = finalValue
+        self.stateSequence += 1
+        self.movedEventMap.setdefault(index, [])
+        self.initCount += 1
+        if index in self.axisHandles:
+            self.axisHandles[index].value = finalValue
+        self._buildAxisSlot(index)
+        return finalValue
+
+    @staticmethod
+    def _buildCalibrationTable(centre, deadzone, outerDeadzone, invert, expo):
+        """Builds the lookup table from raw axis values to calibrated positions.
+        Raw values 0 to 32767 are at the start, -32768 to -1 at the end,
+        so the table can be indexed directly with the signed raw value."""
+        key = (centre, deadzone, outerDeadzone, invert, expo)
+        table = Gamepad.calibrationTables.get(key)
+        if table is not None:
+            return table
+        span = 1.0 - deadzone - outerDeadzone
+        sign = -1.0 if invert else 1.0
+        def calibrate(raw):
+            position = max(raw / Gamepad.MAX_AXIS, -1.0)
+            # Move the centre back to zero, keeping the ends at -1 and +1
+            if position >= centre:
+                position = (position - centre) / (1.0 - centre)
+            else:
+                position = (position - centre) / (1.0 + centre)
+            magnitude = abs(position)
+            if magnitude <= deadzone:
+                return 0.0
+            magnitude = min((magnitude - deadzone) / span, 1.0)
+            magnitude = (1.0 - expo) * magnitude + expo * magnitude ** 3
+            if position < 0:
+                return -sign * magnitude
+            else:
+                return sign * magnitude
+        table = array.array('d', [calibrate(raw) for raw in range(0, 32768)] +
+                                 [calibrate(raw) for raw in range(-32768, 0)])
+        Gamepad.calibrationTables[key] = table
+        return table
+
+    def calibrateAxis(self, axisName, centre = 0.0, deadzone = 0.0, outerDeadzone = 0.0, invert = False, expo = 0.0):
+        """Sets the calibration for the axis specified by name or index.
+
+        centre        - the position the axis rests at, this becomes 0.0
+        deadzone      - positions this close to the centre become 0.0
+        outerDeadzone - positions this close to the ends become -1.0 / +1.0
+        invert        - True to swap the direction of the axis
+        expo          - 0.0 for a straight line up to 1.0 for a cubic curve,
+                        higher values give finer control near the centre
+
+        The remaining movement is stretched to cover -1.0 to +1.0 again.
+        A lookup table is built for the settings, so the decoding cost is the same
+        whatever is set.  Axes with the same settings share a table.
+
+        Throws ValueError if the axis name or index cannot be found or the settings are out of range."""
+        try:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
+                axisIndex = int(axisName)
+                if axisIndex < 0:
+                    raise IndexError
+        except (IndexError, ValueError):
+            raise ValueError('Axis name %s was not found' % axisName)
+        centre = float(centre)
+        deadzone = float(deadzone)
+        outerDeadzone = float(outerDeadzone)
+        expo = float(expo)
+        invert = bool(invert)
+        if not (-1.0 < centre < 1.0):
+            raise ValueError('Axis centre %s is not between -1.0 and +1.0' % centre)
+        if deadzone < 0 or outerDeadzone < 0 or deadzone + outerDeadzone >= 1.0:
+            raise ValueError('Axis deadzones %s and %s do not leave any movement' % (deadzone, outerDeadzone))
+        if not (0.0 <= expo <= 1.0):
+            raise ValueError('Axis expo %s is not between 0.0 and 1.0' % expo)
+        self.axisTables[axisIndex] = Gamepad._buildCalibrationTable(centre, deadzone, outerDeadzone, invert, expo)
+        self.axisCalibrations[axisIndex] = {
+            'centre': centre,
+            'deadzone': deadzone,
+            'outerDeadzone': outerDeadzone,
+            'invert': invert,
+            'expo': expo
+        }
+        self._updateAxisDecoder()
+
+    def clearAxisCalibration(self, axisName = None):
+        """Removes the calibration for the axis specified by name or index.
+        If no axis is given the calibration is removed from all axes."""
+        if axisName is None:
+            self.axisTables.clear()
+            self.axisCalibrations.clear()
+        else:
+            axisIndex = self.axisIndex.get(axisName, axisName)
+            self.axisTables.pop(axisIndex, None)
+            self.axisCalibrations.pop(axisIndex, None)
+        self._updateAxisDecoder()
+
+    def axisCalibration(self, axisName):
+        """Returns a dictionary of the calibration settings for the axis specified by name or index.
+        Returns None if the axis is not calibrated."""
+        settings = self.axisCalibrations.get(self.axisIndex.get(axisName, axisName))
+        if settings is None:
+            return None
+        return dict(settings)
+
+    def _updateAxisDecoder(self):
+        """Only uses the calibrated axis decoder when some axes are calibrated."""
+        if self.axisTables:
+            decode = self._decodeCalibratedAxis
+        else:
+            decode = self._decodeAxis
+        self._setDecoder(Gamepad.EVENT_CODE_AXIS, decode, Gamepad.EVENT_AXIS, self.axisEntityNames)
+
+    def calibrationPath(self):
+        """Returns the default file used by saveCalibration and loadCalibration for this controller type."""
+        return os.path.join(Gamepad.CALIBRATION_DIR, self.controllerType.__name__ + '.json')
+
+    def saveCalibration(self, path = None):
+        """Saves the axis calibration settings to a file.
+        The default file is shared by all controllers of the same type, see calibrationPath."""
+        if path is None:
+            path = self.calibrationPath()
+            if not os.path.isdir(Gamepad.CALIBRATION_DIR):
+                os.makedirs(Gamepad.CALIBRATION_DIR)
+        axes = {}
+        for index, settings in self.axisCalibrations.items():
+            axes[str(self.axisNames.get(index, index))] = settings
+        with builtins.open(path, 'w') as calibrationFile:
+            json.dump({'controller': self.controllerType.__name__, 'axes': axes}, calibrationFile, indent = 4, sort_keys = True)
+
+    def loadCalibration(self, path = None):
+        """Loads axis calibration settings saved by saveCalibration, replacing any current calibration.
+        Returns False if there is no saved calibration, otherwise True.
+
+        Throws ValueError if the file is for a different controller type."""
+        if path is None:
+            path = self.calibrationPath()
+        if not os.path.exists(path):
+            return False
+        with builtins.open(path, 'r') as calibrationFile:
+            saved = json.load(calibrationFile)
+        if saved.get('controller') != self.controllerType.__name__:
+            raise ValueError('Calibration %s is for %s, not %s' % (path, saved.get('controller'), self.controllerType.__name__))
+        self.clearAxisCalibration()
+        for axisName, settings in saved['axes'].items():
+            self.calibrateAxis(self.axisIndex.get(axisName, axisName), **settings)
+        return True
+
+    def getNextEvent(self, skipInit = True, timeout = None):
         """Returns the next event from the gamepad.
 
         The return format is:
@@ -175,115 +1438,304 @@ class Gamepad:
 
         After each call the internal state used by getPressed and getAxis is updated.
 
+        If timeout is given this waits at most that many seconds for an event,
+        None is returned instead if no event arrived in time.
+
+        With backends which give whole frames, e.g. evdev, each frame is applied to
+        the state as a whole and its events are then returned one at a time.
+
         Throws an IOError if the gamepad is disconnected"""
-        self.lastTimestamp, value, eventType, index = self._getNextEventRaw()
-        skip = False
-        eventName = None
-        entityName = None
-        finalValue = None
-        if eventType == Gamepad.EVENT_CODE_BUTTON:
-            eventName = Gamepad.EVENT_BUTTON
-            if index in self.buttonNames:
-                entityName = self.buttonNames[index]
-            else:
-                entityName = index
-            if value == 0:
-                finalValue = False
-                self.wasReleasedMap[index] = True
-                for callback in self.releasedEventMap[index]:
-                    callback()
-            else:
-                finalValue = True
-                self.wasPressedMap[index] = True
-                for callback in self.pressedEventMap[index]:
+        if self.backend.framed:
+            return self._getNextFramedEvent(skipInit, timeout)
+        decoders = self.decoders
+        pendingEvents = self.pendingEvents
+        if timeout is not None:
+            endTime = monotonic() + timeout
+        while True:
+            try:
+                timestamp, value, eventType, index = pendingEvents.popleft()
+            except IndexError:
+                if timeout is None:
+                    timestamp, value, eventType, index = self._getNextEventRaw()
+                else:
+                    event = self._getNextEventRaw(max(0, endTime - monotonic()))
+                    if event is None:
+                        return None
+                    timestamp, value, eventType, index = event
+            try:
+                decode, eventName, entityNames = decoders[eventType]
+            except KeyError:
+                self.lastTimestamp = timestamp
+                continue
+            finalValue = decode(timestamp, value, index)
+            for publisher in self.publishers:
+                publisher.publishEvent(value, eventType, index)
+            if not (skipInit and (eventType & 0x80)):
+                return eventName, entityNames[index], finalValue
+
+    def _getNextFramedEvent(self, skipInit = True, timeout = None):
+        """Used by getNextEvent for backends which give whole frames."""
+        decodedEvents = self.decodedEvents
+        if timeout is not None:
+            endTime = monotonic() + timeout
+        while not decodedEvents:
+            # Frame boundaries are not kept in the pending events, so they are all applied together
+            events = list(self.pendingEvents)
+            self.pendingEvents.clear()
+            if not events:
+                if timeout is None:
+                    events = self._readEventsRaw(self.batchSize)
+                else:
+                    events = self._readEventsRaw(self.batchSize, max(0, endTime - monotonic()))
+                    if not events and monotonic() >= endTime:
+                        return None
+            decodedEvents.extend(self._decodeEvents(events, skipInit))
+        return decodedEvents.popleft()
+
+    def events(self, skipInit = True, timeout = None):
+        """Returns an iterable stream of the events from the gamepad.
+        Each event is in the same format as getNextEvent returns.
+
+        Processing stages such as only, invert, scale, clamp and rename can be
+        chained on to the returned stream, see Gamepad.EventStream for details.
+
+        If timeout is given the stream ends when no event arrives within that many seconds.
+        Throws an IOError if the gamepad is disconnected"""
+        return Gamepad.EventStream(self, skipInit, timeout)
+
+    def updateState(self, timeout = None):
+        """Updates the internal button and axis states with the next pending event.
+
+        This call waits for a new event if there are not any waiting to be processed.
+        If timeout is given this waits at most that many seconds for an event.
+        Returns False if no event arrived in time, otherwise True.
+
+        In frame mode, or with backends which give whole frames such as evdev,
+        all of the pending events or the next read from the device are handled
+        as a whole instead, so a frame is never left half applied."""
+        if self.frameMode is not None or self.backend.framed:
+            return self._updateFrames(timeout)
+        try:
+            timestamp, value, eventType, index = self.pendingEvents.popleft()
+        except IndexError:
+            event = self._getNextEventRaw(timeout)
+            if event is None:
+                return False
+            timestamp, value, eventType, index = event
+        try:
+            decode = self.decoders[eventType][0]
+        except KeyError:
+            self.lastTimestamp = timestamp
+            return True
+        decode(timestamp, value, index)
+        for publisher in self.publishers:
+            publisher.publishEvent(value, eventType, index)
+        return True
+
+    def _updateFrames(self, timeout = None):
+        """Updates the state with the pending events, or the next read from the device if there are none.
+        Used by updateState in frame mode and for backends which give whole frames."""
+        events = list(self.pendingEvents)
+        self.pendingEvents.clear()
+        if timeout is None:
+            while not events:
+                events = self._readEventsRaw(self.batchSize)
+        elif not events:
+            events = self._readEventsRaw(self.batchSize, timeout)
+            if not events:
+                return False
+        self._updateStateFromEvents(events)
+        return True
+
+    def _applyFrames(self, events, decoded = None, skipInit = True, grouping = None):
+        """Applies a list of raw events a frame at a time, used in frame mode and for backends which give whole frames.
+        When decoded is given the events are added to it in the same format as getNextEvent.
+        The grouping defaults to the frame mode."""
+        if (grouping or self.frameMode) == Gamepad.FRAME_TIMESTAMP:
+            start = 0
+            frameTimestamp = events[0][0] if events else None
+            for position in range(1, len(events)):
+                timestamp = events[position][0]
+                if timestamp != frameTimestamp:
+                    if position - start == 1:
+                        self._applySingle(events[start], decoded, skipInit)
+                    else:
+                        self._applyFrame(events[start:position], decoded, skipInit)
+                    start = position
+                    frameTimestamp = timestamp
+            events = events[start:]
+        if len(events) == 1:
+            self._applySingle(events[0], decoded, skipInit)
+        elif events:
+            self._applyFrame(events, decoded, skipInit)
+
+    def _applySingle(self, event, decoded = None, skipInit = True):
+        """Applies a frame of just one event, the normal decoders already
+        change the state before making the callbacks so no second pass is needed."""
+        timestamp, value, eventType, index = event
+        try:
+            decode, eventName, entityNames = self.decoders[eventType]
+        except KeyError:
+            self.lastTimestamp = timestamp
+            return
+        finalValue = decode(timestamp, value, index)
+        if decoded is not None and not (skipInit and (eventType & 0x80)):
+            decoded.append((eventName, entityNames[index], finalValue))
+        if self.frameCallbacks and self.frameMode is not None and not (eventType & 0x80):
+            controls = [(eventName, entityNames[index], finalValue)]
+            for callback in self.frameCallbacks:
+                callback(controls)
+
+    def _applyFrame(self, frame, decoded = None, skipInit = True):
+        """Applies one frame of raw events to the state in one step,
+        then makes the callbacks for each change followed by the frame handlers."""
+        decoders = self.decoders
+        frameDecoders = self.frameDecoders
+        # Filled in by the frame decoders, every button change and the last position of each axis
+        buttons = self.frameButtons
+        axes = self.frameAxes
+        del buttons[:]
+        axes.clear()
+        # The sequence stays odd for the whole frame, so snapshot waits for all of it
+        self.stateSequence += 1
+        try:
+            for timestamp, value, eventType, index in frame:
+                try:
+                    decode = frameDecoders[eventType]
+                except KeyError:
+                    try:
+                        decode = decoders[eventType][0]
+                    except KeyError:
+                        self.lastTimestamp = timestamp
+                        continue
+                finalValue = decode(timestamp, value, index)
+                if decoded is not None and not (skipInit and (eventType & 0x80)):
+                    eventName, entityNames = decoders[eventType][1:]
+                    decoded.append((eventName, entityNames[index], finalValue))
+        finally:
+            self.stateSequence += 1
+        if buttons:
+            # Every press and release is passed on
+            buttonCallbacks = self.buttonCallbacks
+            for index, pressed in buttons:
+                pressedCallbacks, releasedCallbacks, changedCallbacks = buttonCallbacks[index]
+                for callback in (pressedCallbacks if pressed else releasedCallbacks):
                     callback()
-            self.pressedMap[index] = finalValue
-            for callback in self.changedEventMap[index]:
-                callback(finalValue)
-        elif eventType == Gamepad.EVENT_CODE_AXIS:
-            eventName = Gamepad.EVENT_AXIS
-            if index in self.axisNames:
-                entityName = self.axisNames[index]
-            else:
-                entityName = index
-            finalValue = value / Gamepad.MAX_AXIS
-            self.axisMap[index] = finalValue
-            for callback in self.movedEventMap[index]:
-                callback(finalValue)
-        elif eventType == Gamepad.EVENT_CODE_INIT_BUTTON:
-            eventName = Gamepad.EVENT_BUTTON
-            if index in self.buttonNames:
-                entityName = self.buttonNames[index]
-            else:
-                entityName = index
-            if value == 0:
-                finalValue = False
-            else:
-                finalValue = True
-            self.pressedMap[index] = finalValue
-            self.wasPressedMap[index] = False
-            self.wasReleasedMap[index] = False
-            self.pressedEventMap[index] = []
-            self.releasedEventMap[index] = []
-            self.changedEventMap[index] = []
-            skip = skipInit
-        elif eventType == Gamepad.EVENT_CODE_INIT_AXIS:
-            eventName = Gamepad.EVENT_AXIS
-            if index in self.axisNames:
-                entityName = self.axisNames[index]
-            else:
-                entityName = index
-            finalValue = value / Gamepad.MAX_AXIS
-            self.axisMap[index] = finalValue
-            self.movedEventMap[index] = []
-            skip = skipInit
+                for callback in changedCallbacks:
+                    callback(pressed)
+        if axes and self.axisCallbacksUsed:
+            # Axes only get the position they finished the frame at
+            axisCallbacks = self.axisCallbacks
+            for index, finalValue in axes.items():
+                for callback in axisCallbacks[index]:
+                    callback(finalValue)
+        frameCallbacks = self.frameCallbacks
+        if frameCallbacks and (buttons or axes) and self.frameMode is not None:
+            buttonEntityNames = self.buttonEntityNames
+            axisEntityNames = self.axisEntityNames
+            controls = [(Gamepad.EVENT_BUTTON, buttonEntityNames[index], pressed)
+                        for index, pressed in collections.OrderedDict(buttons).items()]
+            controls += [(Gamepad.EVENT_AXIS, axisEntityNames[index], finalValue)
+                         for index, finalValue in axes.items()]
+            for callback in frameCallbacks:
+                callback(controls)
+
+    def _updateStateFromEvents(self, events):
+        """Updates the internal button and axis states with a list of raw events."""
+        if self.frameMode is not None:
+            self._applyFrames(events)
+            for publisher in self.publishers:
+                publisher.publish(events)
+            if self.eventWaiters:
+                self._notifyWaiters()
+            return
+        if self.backend.framed:
+            # Each frame shares one timestamp, snapshot sees it whole and the callbacks come after it is written
+            self._applyFrames(events, grouping = Gamepad.FRAME_TIMESTAMP)
         else:
-            skip = True
+            decoders = self.decoders
+            for timestamp, value, eventType, index in events:
+                try:
+                    decode = decoders[eventType][0]
+                except KeyError:
+                    self.lastTimestamp = timestamp
+                    continue
+                decode(timestamp, value, index)
+        for publisher in self.publishers:
+            publisher.publish(events)
+        if self.eventWaiters:
+            self._notifyWaiters()
 
-        if skip:
-            return self.getNextEvent()
+    def _decodeEvents(self, events, skipInit = True):
+        """Updates the internal button and axis states with a list of raw events.
+        Returns the decoded events in the same format as getNextEvent."""
+        decoders = self.decoders
+        decoded = []
+        if self.frameMode is not None:
+            self._applyFrames(events, decoded, skipInit)
+            for publisher in self.publishers:
+                publisher.publish(events)
+            if self.eventWaiters:
+                self._notifyWaiters()
+            return decoded
+        if self.backend.framed:
+            self._applyFrames(events, decoded, skipInit, Gamepad.FRAME_TIMESTAMP)
         else:
-            return eventName, entityName, finalValue
+            for timestamp, value, eventType, index in events:
+                try:
+                    decode, eventName, entityNames = decoders[eventType]
+                except KeyError:
+                    self.lastTimestamp = timestamp
+                    continue
+                finalValue = decode(timestamp, value, index)
+                if not (skipInit and (eventType & 0x80)):
+                    decoded.append((eventName, entityNames[index], finalValue))
+        for publisher in self.publishers:
+            publisher.publish(events)
+        if self.eventWaiters:
+            self._notifyWaiters()
+        return decoded
 
-    def updateState(self):
-        """Updates the internal button and axis states with the next pending event.
+    def _notifyWaiters(self):
+        """Wakes up any threads in waitReady, waitForButton or waitForAnyEvent to check the state again."""
+        with self.eventCondition:
+            self.eventCondition.notify_all()
 
-        This call waits for a new event if there are not any waiting to be processed."""
-        self.lastTimestamp, value, eventType, index = self._getNextEventRaw()
-        if eventType == Gamepad.EVENT_CODE_BUTTON:
-            if value == 0:
-                finalValue = False
-                self.wasReleasedMap[index] = True
-                for callback in self.releasedEventMap[index]:
-                    callback()
-            else:
-                finalValue = True
-                self.wasPressedMap[index] = True
-                for callback in self.pressedEventMap[index]:
-                    callback()
-            self.pressedMap[index] = finalValue
-            for callback in self.changedEventMap[index]:
-                callback(finalValue)
-        elif eventType == Gamepad.EVENT_CODE_AXIS:
-            finalValue = value / Gamepad.MAX_AXIS
-            self.axisMap[index] = finalValue
-            for callback in self.movedEventMap[index]:
-                callback(finalValue)
-        elif eventType == Gamepad.EVENT_CODE_INIT_BUTTON:
-            if value == 0:
-                finalValue = False
+    def _hasReader(self):
+        """Returns True if something else is reading the gamepad, e.g. the background thread or a GamepadHub."""
+        return (self.updateThread is not None and self.updateThread.running) or (self.externalReader is not None)
+
+    def _waitFor(self, check, timeout = None):
+        """Waits until check returns True, which is tried each time the state changes.
+        If nothing else is reading the gamepad the events are read here while waiting.
+
+        Returns False if timeout seconds pass first or the gamepad is disconnected, otherwise True."""
+        if timeout is not None:
+            endTime = monotonic() + timeout
+        remaining = timeout
+        while True:
+            if check():
+                return True
+            if not self.connected:
+                return False
+            if timeout is not None:
+                remaining = endTime - monotonic()
+                if remaining <= 0:
+                    return False
+            if self._hasReader():
+                with self.eventCondition:
+                    self.eventWaiters += 1
+                    try:
+                        # Checked again with the lock held so a change cannot be missed
+                        if not check() and self.connected and self._hasReader():
+                            self.eventCondition.wait(remaining)
+                    finally:
+                        self.eventWaiters -= 1
             else:
-                finalValue = True
-            self.pressedMap[index] = finalValue
-            self.wasPressedMap[index] = False
-            self.wasReleasedMap[index] = False
-            self.pressedEventMap[index] = []
-            self.releasedEventMap[index] = []
-            self.changedEventMap[index] = []
-        elif eventType == Gamepad.EVENT_CODE_INIT_AXIS:
-            finalValue = value / Gamepad.MAX_AXIS
-            self.axisMap[index] = finalValue
-            self.movedEventMap[index] = []
+                try:
+                    self._updateStateFromEvents(self.readEvents(self.batchSize, remaining))
+                except IOError:
+                    return check()
 
     def startBackgroundUpdates(self, waitForReady = True):
         """Starts a background thread which keeps the gamepad state updated automatically.
@@ -293,32 +1745,417 @@ class Gamepad:
         if self.updateThread is not None:
             if self.updateThread.running:
                 raise RuntimeError('Called startBackgroundUpdates when the update thread is already running')
+        # A wake up left over from an earlier stop must not stop the new thread
+        self.wakePipe.drain()
         self.updateThread = Gamepad.UpdateThread(self)
         self.updateThread.start()
         if waitForReady:
-            while not self.isReady() and self.connected:
-                time.sleep(1.0)
+            self.waitReady()
 
     def stopBackgroundUpdates(self):
         """Stops the background thread which keeps the gamepad state updated automatically.
         This may be called even if the background thread was never started.
 
-        The thread will stop on the next event after this call was made."""
+        The thread is woken up and stopped straight away, this call waits for it to finish."""
         if self.updateThread is not None:
             self.updateThread.running = False
+            self._wake()
+            if self.updateThread is not threading.current_thread():
+                self.updateThread.join(Gamepad.STOP_TIMEOUT)
+            # Anything waiting will need to read the gamepad itself now
+            self._notifyWaiters()
+
+    def enableAxisCoalescing(self, minInterval = 0.0):
+        """Reduces the number of axis events when sticks are moving quickly.
+
+        Each time events are read from the device only the latest position
+        for each axis is kept, the older positions are dropped without being
+        decoded, so callbacks and getNextEvent only see the newest value.
+
+        If minInterval is given (in seconds) each axis is passed on at most once per interval,
+        newer positions are held back until then and the last position is always passed on.
+        The interval can be changed for individual axes using setAxisMinInterval.
+
+        Button events are never dropped or reordered.
+        The number of dropped events can be seen using coalescingStats."""
+        self.axisMinInterval = float(minInterval)
+        self.coalescing = True
+
+    def setAxisMinInterval(self, axisName, minInterval):
+        """Sets the minimum interval in seconds between events for the axis specified by name or index.
+        None goes back to the interval given to enableAxisCoalescing.
+        Coalescing is enabled if it is not already.
+
+        Throws ValueError if the axis name or index cannot be found."""
+        try:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
+                axisIndex = int(axisName)
+                if axisIndex < 0:
+                    raise IndexError
+        except (IndexError, ValueError):
+            raise ValueError('Axis name %s was not found' % axisName)
+        if minInterval is None:
+            self.axisMinIntervals.pop(axisIndex, None)
+        else:
+            self.axisMinIntervals[axisIndex] = float(minInterval)
+        self.coalescing = True
+
+    def disableAxisCoalescing(self):
+        """Turns off axis coalescing, any held back axis positions are passed on straight away."""
+        self.coalescing = False
+        held = self.heldAxisEvents
+        self.heldAxisEvents = {}
+        if held:
+            self.pendingEvents.extend(held.values())
+            self._wake()
+
+    def coalescingStats(self):
+        """Returns a dictionary of counters for axis coalescing:
+            'axisEvents' - number of axis events read while coalescing was enabled
+            'coalesced'  - number of those which were dropped
+            'perAxis'    - number dropped for each axis, by name or index"""
+        perAxis = dict((self.axisNames.get(index, index), count)
+                       for index, count in list(self.coalescedAxisCounts.items()))
+        return {
+            'axisEvents': self.axisEventCount,
+            'coalesced': sum(perAxis.values()),
+            'perAxis': perAxis
+        }
+
+    def resetCoalescingStats(self):
+        """Resets the counters reported by coalescingStats."""
+        self.axisEventCount = 0
+        self.coalescedAxisCounts = {}
+
+    def enableAxisFiltering(self, threshold = 0.0):
+        """Ignores axis events which do not really move the axis, e.g. a cheap joystick jittering around the centre.
+
+        Events which change the position by threshold or less are dropped before they are decoded,
+        so the axis state, callbacks and getNextEvent are not touched by them.
+        The default threshold of 0.0 only drops repeats of the same position.
+        Positions are compared after any calibration from calibrateAxis,
+        moves to exactly 0.0, -1.0 or +1.0 are always passed on.
+
+        The threshold can be changed for individual axes using setAxisThreshold.
+        Button events are never dropped or reordered.
+        The number of dropped events can be seen using filterStats."""
+        if threshold is None:
+            self.axisThreshold = None
+        else:
+            self.axisThreshold = float(threshold)
+        self._startAxisFiltering()
+
+    def setAxisThreshold(self, axisName, threshold):
+        """Sets the change threshold for the axis specified by name or index, see enableAxisFiltering.
+        None goes back to the threshold given to enableAxisFiltering.
+        Filtering is enabled if it is not already, other axes are not filtered unless enableAxisFiltering was called.
+
+        Throws ValueError if the axis name or index cannot be found."""
+        try:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
+                axisIndex = int(axisName)
+                if axisIndex < 0:
+                    raise IndexError
+        except (IndexError, ValueError):
+            raise ValueError('Axis name %s was not found' % axisName)
+        if threshold is None:
+            self.axisThresholds.pop(axisIndex, None)
+        else:
+            self.axisThresholds[axisIndex] = float(threshold)
+        self._startAxisFiltering()
+
+    def _startAxisFiltering(self):
+        if not self.axisFiltering:
+            # Compare the first events with the current state
+            self.axisFilterPositions = dict(enumerate(self.axisMap))
+            self.axisFiltering = True
+
+    def disableAxisFiltering(self):
+        """Turns off axis filtering, every axis event is passed on again."""
+        self.axisFiltering = False
+        self.axisThreshold = None
+        self.axisThresholds = {}
+
+    def filterStats(self):
+        """Returns a dictionary of counters for axis filtering:
+            'axisEvents' - number of axis events read while filtering was enabled
+            'filtered'   - number of those which were dropped
+            'perAxis'    - number dropped for each axis, by name or index"""
+        perAxis = dict((self.axisNames.get(index, index), count)
+                       for index, count in list(self.filteredAxisCounts.items()))
+        return {
+            'axisEvents': self.filterAxisEventCount,
+            'filtered': sum(perAxis.values()),
+            'perAxis': perAxis
+        }
+
+    def resetFilterStats(self):
+        """Resets the counters reported by filterStats."""
+        self.filterAxisEventCount = 0
+        self.filteredAxisCounts = {}
+
+    def enableFrameMode(self, grouping = FRAME_BATCH):
+        """Applies events to the state a frame at a time instead of one by one.
+
+        With FRAME_BATCH each read from the device is one frame,
+        with FRAME_TIMESTAMP events with the same timestamp are one frame,
+        e.g. both axes of a diagonal stick move.  Evdev devices send whole frames
+        with a single timestamp, so FRAME_TIMESTAMP matches their frames exactly.
+
+        The whole frame is applied before any callbacks are made, so handlers
+        always see the finished state.  Button handlers still get every press and release,
+        axis handlers get each moved axis once with its final position,
+        then each frame handler is called once, see addFrameHandler.  Frames are used by updateState, background updates,
+        GamepadHub and AsyncGamepad, getNextEvent still goes one event at a time
+        unless the backend gives whole frames.
+
+        Frames of more than one event cost more per event than the normal decoding,
+        the changes are gathered first and the callbacks made in a second pass.
+        Only use frame mode when handlers need to see whole frames.  The joystick
+        interface gives most events their own timestamp, so FRAME_TIMESTAMP with a
+        /dev/input/jsN device mostly makes frames of one event, which are decoded
+        the normal way and gain nothing from frame mode."""
+        if grouping not in (Gamepad.FRAME_BATCH, Gamepad.FRAME_TIMESTAMP):
+            raise ValueError('Frame grouping %s was not found' % grouping)
+        self.frameMode = grouping
+
+    def disableFrameMode(self):
+        """Goes back to applying events one at a time, frame handlers are no longer called."""
+        self.frameMode = None
+
+    def addFrameHandler(self, callback):
+        """Adds a callback for the end of each frame with changes.
+        This callback gets a list of the controls which changed in the frame,
+        buttons first then axes, each in the same format as getNextEvent with the latest value:
+            event name, entity name, value
+        Frame mode is enabled with FRAME_BATCH if it is not already."""
+        if callback not in self.frameEventMap:
+            self.frameEventMap.append(callback)
+            self._buildFrameSlot()
+        if self.frameMode is None:
+            self.enableFrameMode()
+
+    def removeFrameHandler(self, callback):
+        """Removes a callback added by addFrameHandler, frame mode is left enabled."""
+        if callback in self.frameEventMap:
+            self.frameEventMap.remove(callback)
+            self._buildFrameSlot()
+
+    def addPublisher(self, publisher):
+        """Adds an object which is passed every change to the state, e.g. a GamepadShared.Publisher or GamepadBroker.Broker.
+        Its publish method is called with the raw events after each batch is applied,
+        and with no events on connect and disconnect.  Its publishEvent method is called
+        with the value, type and index of each single event applied on its own."""
+        if publisher not in self.publishers:
+            self.publishers += (publisher,)
+
+    def removePublisher(self, publisher):
+        """Removes an object added by addPublisher."""
+        self.publishers = tuple(other for other in self.publishers if other is not publisher)
+
+    def startCallbackDispatcher(self, workers = 1, maxQueue = DEFAULT_DISPATCH_QUEUE, overflow = OVERFLOW_CONFLATE):
+        """Runs the event callbacks on separate worker threads instead of the thread reading the gamepad.
+        Slow callbacks then no longer delay reading the gamepad or the state updates.
+
+        Up to maxQueue callbacks can be waiting to run before the overflow policy is used,
+        see Gamepad.CallbackDispatcher for the choices.  Button callbacks are never dropped.
+        With more than one worker callbacks may run at the same time and out of order.
+
+        Use dispatcherStats to see the queue depth and delays."""
+        if self.callbackDispatcher is not None:
+            raise RuntimeError('Called startCallbackDispatcher when the dispatcher is already running')
+        self.callbackDispatcher = Gamepad.CallbackDispatcher(workers, maxQueue, overflow)
+        self._rebuildSlots()
+
+    def stopCallbackDispatcher(self, drain = True):
+        """Goes back to running callbacks on the thread reading the gamepad.
+        Waits for the queued callbacks to run first unless drain is False.
+        This may be called even if the dispatcher was never started."""
+        dispatcher = self.callbackDispatcher
+        if dispatcher is not None:
+            self.callbackDispatcher = None
+            self._rebuildSlots()
+            dispatcher.stop(drain)
+
+    def dispatcherStats(self):
+        """Returns the counters from the callback dispatcher, see Gamepad.CallbackDispatcher.stats.
+        Returns None if the dispatcher is not running."""
+        if self.callbackDispatcher is None:
+            return None
+        return self.callbackDispatcher.stats()
+
+    def enableStats(self):
+        """Starts measuring how quickly events are handled, see stats for the results.
+
+        Timing each event adds a little work to decoding and callbacks,
+        once disableStats is called the normal untimed code is used again."""
+        if self.eventStats is None:
+            self.eventStats = Gamepad.EventStats(self.backend.timestampWrap)
+            self._refreshDecoders()
+            self._rebuildSlots()
+
+    def disableStats(self):
+        """Stops measuring how quickly events are handled, this may be called even if stats were never enabled."""
+        if self.eventStats is not None:
+            self.eventStats = None
+            self._refreshDecoders()
+            self._rebuildSlots()
+
+    def stats(self):
+        """Returns a dictionary of measurements since enableStats or resetStats was called:
+            'elapsed'         - seconds the measurements cover
+            'reads'           - number of reads from the device
+            'receivedEvents'  - number of events read from the device
+            'events'          - number of events decoded
+            'eventsPerSecond' - events decoded per second over the elapsed time
+            'kernelTimestamp' - latest event timestamp, in milliseconds for joystick devices,
+                                unlike lastTimestamp this carries on counting when the 32 bit kernel value wraps
+            'receiveTime'     - monotonic clock time of the latest read from the device
+            'lag'             - seconds from an event being read to it being decoded,
+                                this shows how far behind the reading code is running
+            'decode'          - seconds spent decoding for each button and axis, not including callbacks
+            'callbacks'       - seconds spent in the callbacks for each button and axis
+
+        The lag, decode and callback timings each give the count, mean and max,
+        plus a histogram of counts by the upper limit of each bucket in microseconds.
+        Returns None if stats are not enabled."""
+        if self.eventStats is None:
+            return None
+        return self.eventStats.stats(self)
+
+    def resetStats(self):
+        """Resets the measurements reported by stats, the kernel timestamp keeps counting."""
+        if self.eventStats is not None:
+            self.eventStats.reset()
 
     def isReady(self):
         """Used with updateState to indicate that the gamepad is now ready for use.
 
         This is usually after the first button press or stick movement."""
-        return len(self.axisMap) + len(self.pressedMap) > 1
+        return self.initCount > 1
 
-    def waitReady(self):
-        """Convenience function which waits until the isReady call is True."""
-        self.updateState()
-        while not self.isReady() and self.connected:
-            time.sleep(1.0)
-            self.updateState()
+    def waitReady(self, timeout = None):
+        """Convenience function which waits until the isReady call is True.
+        If timeout is given this waits at most that many seconds.
+
+        Returns False if the timeout passed or the gamepad was disconnected first, otherwise True."""
+        return self._waitFor(self.isReady, timeout)
+
+    def waitForButton(self, buttonName, timeout = None):
+        """Waits until the button specified by name or index is next pressed.
+        A button already held when this is called has to be released and pressed again.
+        If timeout is given this waits at most that many seconds.
+
+        Works with background updates, a GamepadHub or AsyncGamepad reading the gamepad,
+        otherwise the events are read while waiting.
+        Returns False if the timeout passed or the gamepad was disconnected first, otherwise True.
+
+        Throws ValueError if the button name or index cannot be found."""
+        handle = self.button(buttonName)
+        startEdges = handle.edges
+        if handle.pressed:
+            # Released then pressed again
+            edgesNeeded = 2
+        else:
+            edgesNeeded = 1
+        return self._waitFor(lambda: handle.edges - startEdges >= edgesNeeded, timeout)
+
+    def waitForAnyEvent(self, timeout = None):
+        """Waits until any button or axis changes.
+        If timeout is given this waits at most that many seconds.
+
+        Returns False if the timeout passed or the gamepad was disconnected first, otherwise True."""
+        startSequence = self.stateSequence
+        return self._waitFor(lambda: self.stateSequence != startSequence, timeout)
+
+    def snapshot(self):
+        """Returns a copy of the whole gamepad state taken at one moment.
+
+        The return format is:
+            timestamp, axis positions, button states
+
+        The timestamp is the lastTimestamp value for the copied state.
+        Axis positions and button states (1 if held) are tuples,
+        both indexed by the raw axis / button index, see axisIndex and buttonIndex.
+
+        The values are all from the same moment, even with background updates running,
+        with backends which group events into frames (e.g. evdev) whole frames are always seen,
+        and one call is cheaper than several separate isPressed / axis calls per loop.
+        The update thread is never held up by this call, if it is part way through
+        changing the state the copy is simply taken again.
+
+        When nothing has changed since the last call the same copy is returned again,
+        to any thread, which is why it cannot be modified."""
+        while True:
+            sequence = self.stateSequence
+            lastSequence, snapshot = self.lastSnapshot
+            if sequence == lastSequence:
+                return snapshot
+            elif not (sequence & 1):
+                snapshot = (self.lastTimestamp, tuple(self.axisMap), tuple(self.pressedMap))
+                if sequence == self.stateSequence:
+                    self.lastSnapshot = (sequence, snapshot)
+                    return snapshot
+            # Let the update thread finish the change
+            time.sleep(0)
+
+    def button(self, buttonName):
+        """Returns a handle for reading the button specified by name or index quickly.
+        See Gamepad.ButtonHandle for the values it provides.
+
+        Useful for tight polling loops, the name is only looked up once here
+        rather than on every isPressed call.
+        Asking for the same button again returns the same handle.
+
+        Throws ValueError if the button name or index cannot be found."""
+        try:
+            buttonIndex = self.buttonIndex.get(buttonName)
+            if buttonIndex is None:
+                buttonIndex = int(buttonName)
+                if buttonIndex < 0:
+                    raise IndexError
+        except (IndexError, ValueError):
+            raise ValueError('Button name %s was not found' % buttonName)
+        if buttonIndex not in self.buttonHandles:
+            if buttonIndex < len(self.pressedMap):
+                pressed = self.pressedMap[buttonIndex] != 0
+            else:
+                pressed = False
+            self.buttonHandles[buttonIndex] = Gamepad.ButtonHandle(
+                buttonIndex, self.buttonNames.get(buttonIndex, buttonIndex), pressed)
+            if buttonIndex in self.buttonCallbacks:
+                self._buildButtonSlot(buttonIndex)
+        return self.buttonHandles[buttonIndex]
+
+    def axisHandle(self, axisName):
+        """Returns a handle for reading the axis specified by name or index quickly.
+        See Gamepad.AxisHandle for the values it provides.
+
+        Useful for tight polling loops, the name is only looked up once here
+        rather than on every axis call.
+        Asking for the same axis again returns the same handle.
+
+        Throws ValueError if the axis name or index cannot be found."""
+        try:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
+                axisIndex = int(axisName)
+                if axisIndex < 0:
+                    raise IndexError
+        except (IndexError, ValueError):
+            raise ValueError('Axis name %s was not found' % axisName)
+        if axisIndex not in self.axisHandles:
+            if axisIndex < len(self.axisMap):
+                value = self.axisMap[axisIndex]
+            else:
+                value = 0.0
+            self.axisHandles[axisIndex] = Gamepad.AxisHandle(
+                axisIndex, self.axisNames.get(axisIndex, axisIndex), value)
+            if axisIndex in self.axisCallbacks:
+                self._buildAxisSlot(axisIndex)
+        return self.axisHandles[axisIndex]
 
     def isPressed(self, buttonName):
         """Returns the last observed state of a gamepad button specified by name or index.
@@ -328,12 +2165,13 @@ class Gamepad:
 
         Throws ValueError if the button name or index cannot be found."""
         try:
-            if buttonName in self.buttonIndex:
-                buttonIndex = self.buttonIndex[buttonName]
-            else:
+            buttonIndex = self.buttonIndex.get(buttonName)
+            if buttonIndex is None:
                 buttonIndex = int(buttonName)
-            return self.pressedMap[buttonIndex]
-        except KeyError:
+                if buttonIndex < 0:
+                    raise IndexError
+            return self.pressedMap[buttonIndex] != 0
+        except IndexError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
             raise ValueError('Button name %s was not found' % buttonName)
@@ -344,16 +2182,17 @@ class Gamepad:
 
         Throws ValueError if the button name or index cannot be found."""
         try:
-            if buttonName in self.buttonIndex:
-                buttonIndex = self.buttonIndex[buttonName]
-            else:
+            buttonIndex = self.buttonIndex.get(buttonName)
+            if buttonIndex is None:
                 buttonIndex = int(buttonName)
+                if buttonIndex < 0:
+                    raise IndexError
             if self.wasPressedMap[buttonIndex]:
-                self.wasPressedMap[buttonIndex] = False
+                self.wasPressedMap[buttonIndex] = 0
                 return True
             else:
                 return False
-        except KeyError:
+        except IndexError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
             raise ValueError('Button name %s was not found' % buttonName)
@@ -364,16 +2203,17 @@ class Gamepad:
 
         Throws ValueError if the button name or index cannot be found."""
         try:
-            if buttonName in self.buttonIndex:
-                buttonIndex = self.buttonIndex[buttonName]
-            else:
+            buttonIndex = self.buttonIndex.get(buttonName)
+            if buttonIndex is None:
                 buttonIndex = int(buttonName)
+                if buttonIndex < 0:
+                    raise IndexError
             if self.wasReleasedMap[buttonIndex]:
-                self.wasReleasedMap[buttonIndex] = False
+                self.wasReleasedMap[buttonIndex] = 0
                 return True
             else:
                 return False
-        except KeyError:
+        except IndexError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
             raise ValueError('Button name %s was not found' % buttonName)
@@ -386,12 +2226,13 @@ class Gamepad:
 
         Throws ValueError if the button name or index cannot be found."""
         try:
-            if axisName in self.axisIndex:
-                axisIndex = self.axisIndex[axisName]
-            else:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
                 axisIndex = int(axisName)
+                if axisIndex < 0:
+                    raise IndexError
             return self.axisMap[axisIndex]
-        except KeyError:
+        except IndexError:
             raise ValueError('Axis %i was not found' % axisIndex)
         except ValueError:
             raise ValueError('Axis name %s was not found' % axisName)
@@ -420,6 +2261,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback not in self.pressedEventMap[buttonIndex]:
                 self.pressedEventMap[buttonIndex].append(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -434,6 +2276,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback in self.pressedEventMap[buttonIndex]:
                 self.pressedEventMap[buttonIndex].remove(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -449,6 +2292,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback not in self.releasedEventMap[buttonIndex]:
                 self.releasedEventMap[buttonIndex].append(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -463,6 +2307,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback in self.releasedEventMap[buttonIndex]:
                 self.releasedEventMap[buttonIndex].remove(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -478,6 +2323,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback not in self.changedEventMap[buttonIndex]:
                 self.changedEventMap[buttonIndex].append(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -492,6 +2338,7 @@ class Gamepad:
                 buttonIndex = int(buttonName)
             if callback in self.changedEventMap[buttonIndex]:
                 self.changedEventMap[buttonIndex].remove(callback)
+                self._buildButtonSlot(buttonIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % buttonIndex)
         except ValueError:
@@ -507,6 +2354,7 @@ class Gamepad:
                 axisIndex = int(axisName)
             if callback not in self.movedEventMap[axisIndex]:
                 self.movedEventMap[axisIndex].append(callback)
+                self._buildAxisSlot(axisIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % axisIndex)
         except ValueError:
@@ -521,6 +2369,7 @@ class Gamepad:
                 axisIndex = int(axisName)
             if callback in self.movedEventMap[axisIndex]:
                 self.movedEventMap[axisIndex].remove(callback)
+                self._buildAxisSlot(axisIndex)
         except KeyError:
             raise ValueError('Button %i was not found' % axisIndex)
         except ValueError:
@@ -532,31 +2381,207 @@ class Gamepad:
             self.pressedEventMap[index] = []
             self.releasedEventMap[index] = []
             self.changedEventMap[index] = []
+        for index in self.movedEventMap.keys():
             self.movedEventMap[index] = []
+        self.frameEventMap = []
+        self._rebuildSlots()
+
+    def _lostDevice(self):
+        """Marks the gamepad as disconnected because the device has gone, e.g. it was unplugged.
+        Anything reading or waiting is woken up, the handlers are kept for reconnect."""
+        self.connected = False
+        for publisher in self.publishers:
+            publisher.publish()
+        self._wake()
+        self._notifyWaiters()
+
+    def reconnect(self):
+        """Opens the device again after the gamepad was disconnected by the device going away,
+        e.g. unplugged and then plugged back in.  Does nothing if the gamepad is still connected.
+
+        Handlers, handles, calibration and other settings are all kept.
+        The state is refreshed from the initial state events the device sends,
+        so isReady returns False until they have been read.
+        Background updates which stopped when the device went are started again.
+
+        Throws an IOError if the device cannot be opened."""
+        if self.connected:
+            return
+        joystickFile = self._openDevice(1)
+        updateThread = self.updateThread
+        if updateThread is not None and updateThread is not threading.current_thread():
+            # Let the background thread see the old device has gone first
+            self._wake()
+            updateThread.join(Gamepad.STOP_TIMEOUT)
+        try:
+            oldFile = self.joystickFile
+        except AttributeError:
+            oldFile = None
+        if oldFile is not None:
+            try:
+                self.poller.unregister(oldFile.fileno())
+            except (KeyError, ValueError):
+                pass
+            oldFile.close()
+        self.joystickFile = joystickFile
+        self.poller.register(joystickFile.fileno(), select.POLLIN)
+        self.deviceName, axisCount, buttonCount = self.backend.query(joystickFile.fileno())
+        if buttonCount > len(self.pressedMap):
+            self._resizeButtons(buttonCount)
+        if axisCount > len(self.axisMap):
+            self._resizeAxes(axisCount)
+        self.pendingEvents.clear()
+        self.decodedEvents.clear()
+        self.heldAxisEvents = {}
+        self.initCount = 0
+        self._updateStateFromEvents(self.backend.initialEvents(joystickFile.fileno()))
+        self.connected = True
+        for publisher in self.publishers:
+            publisher.publish()
+        if updateThread is not None and updateThread.lostDevice:
+            self.wakePipe.drain()
+            self.updateThread = Gamepad.UpdateThread(self)
+            self.updateThread.start()
+        self._notifyWaiters()
 
     def disconnect(self):
         """Cleanly disconnect and remove any threads and event handlers."""
+        self.stopBackgroundUpdates()
         self.connected = False
+        for publisher in self.publishers:
+            publisher.publish()
+        self.stopCallbackDispatcher()
         self.removeAllEventHandlers()
-        self.stopBackgroundUpdates()
+        self._notifyWaiters()
+        self._wake()
+        self.joystickFile.close()
         del self.joystickFile
 
-###########################
-# Import gamepad mappings #
-###########################
-scriptDir = os.path.dirname(os.path.realpath(__file__))
-controllerScript = os.path.join(scriptDir, "Controllers.py")
-exec(open(controllerScript).read())
-
-# Generate a list of available gamepad types
-moduleDict = globals()
-classList = [moduleDict[a] for a in moduleDict.keys() if inspect.isclass(moduleDict[a])]
-controllerDict = {}
-deviceNames = []
-for gamepad in classList:
-    controllerDict[gamepad.__name__.upper()] = gamepad
-    deviceNames.append(gamepad.__name__)
-deviceNames.sort()
+class WakePipe(object):
+    """A pipe for waking up a thread waiting in poll or select from another thread.
+    Wait for fileno to be readable, wake makes it readable and drain empties it again."""
+    def __init__(self):
+        self.readFd, self.writeFd = os.pipe()
+        for fd in (self.readFd, self.writeFd):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def fileno(self):
+        return self.readFd
+
+    def wake(self):
+        try:
+            os.write(self.writeFd, b'\0')
+        except OSError:
+            # Already full, or closed by another thread
+            pass
+
+    def drain(self):
+        try:
+            while os.read(self.readFd, 64):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        """Closes both ends, this may be called more than once."""
+        for fd in (self.readFd, self.writeFd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.readFd = self.writeFd = -1
+
+class JoystickBackend(object):
+    """Reads the joystick interface, /dev/input/jsN, this is the default backend.
+
+    A backend turns the data read from the device into events in the joystick format:
+        timestamp, value, event type code, axis / button number
+    with axis values from -32767 to +32767, so the rest of the library works the same
+    whatever the device.  See GamepadEvdev.py for the evdev backend.
+
+    Backends provide:
+        eventSize      - size in bytes of each record read from the device
+        framed         - True if each list from unpack holds only complete frames
+        timestampWrap  - value the timestamps wrap around at, None if they do not
+        queryDevice(fd) - static, returns the device name, axis count and button count
+        query(fd)      - the same for the opened gamepad, called each time the device is opened
+        initialEvents(fd) - returns initial state events for devices which do not send them
+        unpack(data)   - returns the list of events in the data read from the device"""
+    eventSize = Gamepad.EVENT_STRUCT.size
+    framed = False
+    timestampWrap = 0x100000000
+
+    queryDevice = staticmethod(queryDevice)
+
+    def __init__(self, gamepad):
+        self.gamepad = gamepad
+
+    def query(self, fd):
+        return queryDevice(fd)
+
+    def initialEvents(self, fd):
+        # The joystick driver sends its own initial state events
+        return []
+
+    def unpack(self, data):
+        return unpackRecords(Gamepad.EVENT_STRUCT, data)
+
+def backendForPath(path):
+    """Returns the backend class to use for a device path,
+    evdev for /dev/input/eventN devices and the joystick interface for anything else."""
+    if os.path.basename(path).startswith('event'):
+        import GamepadEvdev
+        return GamepadEvdev.EvdevBackend
+    else:
+        return JoystickBackend
+
+#########################
+# Load gamepad mappings #
+#########################
+def loadControllers():
+    """Loads the gamepad types from Controllers.py, done automatically the first time one is used.
+    Returns the dictionary of gamepad types by upper case name, also available as controllerDict.
+    The names of the types are available sorted as deviceNames."""
+    moduleDict = globals()
+    if 'controllerDict' not in moduleDict:
+        import Controllers
+        gamepadTypes = {'Gamepad': Gamepad}
+        for name, value in vars(Controllers).items():
+            if inspect.isclass(value) and value.__module__ == Controllers.__name__:
+                gamepadTypes[name] = value
+        knownNameIndex = {}
+        for name in sorted(gamepadTypes.keys()):
+            for knownName in gamepadTypes[name].knownNames:
+                knownNameIndex.setdefault(knownName.strip().lower(), gamepadTypes[name])
+        moduleDict.update(gamepadTypes)
+        moduleDict['knownNameIndex'] = knownNameIndex
+        moduleDict['deviceNames'] = sorted(gamepadTypes.keys())
+        moduleDict['controllerDict'] = dict((name.upper(), value) for name, value in gamepadTypes.items())
+    return moduleDict['controllerDict']
+
+def findControllerByName(deviceName):
+    """Returns the gamepad type from Controllers.py for the name reported by a device, see Gamepad.knownNames.
+    Returns None if the name is not known."""
+    if not deviceName:
+        return None
+    loadControllers()
+    return knownNameIndex.get(deviceName.strip().lower())
+
+def __getattr__(name):
+    # Only called for names not found yet, e.g. Gamepad.PS4 or Gamepad.controllerDict
+    if name.startswith('__'):
+        raise AttributeError('module %s has no attribute %s' % (__name__, name))
+    moduleDict = globals()
+    if 'controllerDict' not in moduleDict:
+        loadControllers()
+        if name in moduleDict:
+            return moduleDict[name]
+    raise AttributeError('module %s has no attribute %s' % (__name__, name))
+
+if sys.version_info < (3, 7):
+    # Older versions cannot load the gamepad types when first used
+    loadControllers()
 
 ##################################################################
 # When this script is run it provides testing code for a gamepad #
@@ -581,10 +2606,11 @@ if __name__ == "__main__":
     print('')
     print('Available device names:')
     formatString = '    ' + GREEN + '%s' + RESET + ' - ' + CYAN + '%s' + RESET
+    controllerDict = loadControllers()
     for device in deviceNames:
         print(formatString % (device, controllerDict[device.upper()].fullName))
     print('')
-    print('What device name are you using (leave blank if not in the list)')
+    print('What device name are you using (leave blank to detect it automatically)')
     device = input('? ' + GREEN).strip().upper()
     print(RESET)
 
@@ -600,9 +2626,9 @@ if __name__ == "__main__":
         print(controllerDict[device].fullName)
         gamepad = controllerDict[device]()
     elif device == '':
-        print('Unspecified gamepad')
+        gamepad = openGamepad()
+        print('Detected %s as %s' % (gamepad.deviceName, gamepad.fullName))
         print('')
-        gamepad = Gamepad()
     else:
         print('Unknown gamepad')
         print('')
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Shares one gamepad with any number of other programs over a UNIX domain socket.
+
+A Broker runs alongside the program reading the controller, or on its own
+from the command line, and streams every event to each program connected:
+
+    gamepad = Gamepad.PS4()
+    broker = GamepadBroker.Broker(gamepad, '/tmp/gamepad0.sock')
+    broker.start()
+    gamepad.startBackgroundUpdates()
+
+A RemoteGamepad then works exactly like the controller itself, including the
+event handlers and background updates, using any of the gamepad types from Controllers.py:
+
+    gamepad = GamepadBroker.RemoteGamepad(Gamepad.PS4, '/tmp/gamepad0.sock')
+
+The programs connected only need access to the socket, not to /dev/input,
+so they can run in containers or as other users.
+
+Stream format:
+    js_event records, the same as /dev/input/jsN gives, native byte order.
+    Each connection starts with initial state events for every button and axis.
+
+Events are packed once per batch read from the controller and queued for each
+connection, a background thread writes everything queued for a connection in one go.
+When a connection falls behind the queued axis events are merged, only the latest
+position of each axis is kept, button events are never dropped.  A connection which
+still has more than maxPending bytes queued after merging is closed.
+
+This module needs Python 3.
+"""
+
+import os
+import sys
+import io
+import selectors
+import socket
+import threading
+import time
+import Gamepad
+
+EVENT_STRUCT = Gamepad.Gamepad.EVENT_STRUCT
+EVENT_SIZE = EVENT_STRUCT.size
+EVENT_CODE_BUTTON = Gamepad.Gamepad.EVENT_CODE_BUTTON
+EVENT_CODE_AXIS = Gamepad.Gamepad.EVENT_CODE_AXIS
+EVENT_CODE_INIT_BUTTON = Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON
+EVENT_CODE_INIT_AXIS = Gamepad.Gamepad.EVENT_CODE_INIT_AXIS
+DEFAULT_PATH = '/tmp/gamepad0.sock'
+
+def mergeAxisEvents(data):
+    """Returns packed events with only the last event for each axis kept,
+    button events and the initial state events are all kept."""
+    events = list(EVENT_STRUCT.iter_unpack(data))
+    lastAxisEvent = {}
+    for position, event in enumerate(events):
+        if event[2] == EVENT_CODE_AXIS:
+            lastAxisEvent[event[3]] = position
+    kept = [event for position, event in enumerate(events)
+            if event[2] != EVENT_CODE_AXIS or lastAxisEvent[event[3]] == position]
+    return b''.join(EVENT_STRUCT.pack(*event) for event in kept)
+
+class Subscriber:
+    """A program connected to a Broker, with the events still to be written to it."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = bytearray()
+        self.sentBytes = 0
+        self.events = 0
+        self.merges = 0
+
+    def fileno(self):
+        return self.connection.fileno()
+
+class Broker:
+    """Streams the events from a gamepad to programs connected to a UNIX domain socket.
+
+    The gamepad is read as normal, e.g. with startBackgroundUpdates or a loop calling
+    updateState, the broker is handed each batch of events as it is decoded.
+    A gamepad can have one Broker or GamepadShared.Publisher at a time.
+
+    maxPending is the most bytes queued for a slow connection before it is closed.
+    When the gamepad disconnects every connection is closed, as if the controller
+    was unplugged, and new connections are turned away until it is reconnected."""
+    STOP_TIMEOUT = 1.0
+
+    def __init__(self, gamepad, path = DEFAULT_PATH, maxPending = 65536):
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('Broker was not created with a valid Gamepad object')
+        self.gamepad = gamepad
+        self.path = path
+        self.maxPending = maxPending
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.wakePending = False
+        self.running = False
+        self.brokerThread = None
+        self.resetStats()
+        # Latest raw value of each control, sent to new connections as their initial state
+        self.buttonValues = dict(enumerate(gamepad.pressedMap))
+        self.axisValues = dict((index, int(round(position * Gamepad.Gamepad.MAX_AXIS)))
+                               for index, position in enumerate(gamepad.axisMap))
+        if os.path.exists(path):
+            # Left behind by a broker which did not close cleanly
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.wakePipe = Gamepad.WakePipe()
+        self.selector.register(self.server, selectors.EVENT_READ, None)
+        self.selector.register(self.wakePipe, selectors.EVENT_READ, None)
+        gamepad.addPublisher(self)
+
+    def _wake(self):
+        # Called with the lock held, one wake up covers any number of batches
+        if not self.wakePending:
+            self.wakePending = True
+            self.wakePipe.wake()
+
+    def _queue(self, data):
+        """Queues packed events for every connection, called with the lock held."""
+        for subscriber in self.subscribers:
+            subscriber.pending += data
+        if self.subscribers:
+            self._wake()
+
+    def publish(self, events = ()):
+        """Queues a batch of raw events just decoded by the gamepad for every connection.
+        Called with no events when the gamepad connects or disconnects."""
+        buttonValues = self.buttonValues
+        axisValues = self.axisValues
+        pack = EVENT_STRUCT.pack
+        packed = []
+        for timestamp, value, eventType, index in events:
+            if eventType & 0x7F == EVENT_CODE_AXIS:
+                axisValues[index] = value
+            elif eventType & 0x7F == EVENT_CODE_BUTTON:
+                buttonValues[index] = value
+            else:
+                continue
+            packed.append(pack(timestamp & 0xFFFFFFFF, value, eventType, index))
+        with self.lock:
+            if packed:
+                self._queue(b''.join(packed))
+            elif self.subscribers:
+                # The gamepad connected or disconnected, the broker thread closes the connections if needed
+                self._wake()
+
+    def publishEvent(self, value, eventType, index):
+        """Queues one raw event just decoded by the gamepad, e.g. by updateState."""
+        if eventType & 0x7F == EVENT_CODE_AXIS:
+            self.axisValues[index] = value
+        else:
+            self.buttonValues[index] = value
+        data = EVENT_STRUCT.pack(self.gamepad.lastTimestamp & 0xFFFFFFFF, value, eventType, index)
+        with self.lock:
+            self._queue(data)
+
+    def _initialEvents(self):
+        """Returns packed initial state events for every button and axis, called with the lock held."""
+        timestamp = self.gamepad.lastTimestamp & 0xFFFFFFFF
+        events = [EVENT_STRUCT.pack(timestamp, value, EVENT_CODE_INIT_BUTTON, index)
+                  for index, value in sorted(self.buttonValues.items())]
+        events += [EVENT_STRUCT.pack(timestamp, value, EVENT_CODE_INIT_AXIS, index)
+                   for index, value in sorted(self.axisValues.items())]
+        return b''.join(events)
+
+    def _accept(self):
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if not self.gamepad.connected:
+                connection.close()
+                self.refused += 1
+                continue
+            connection.setblocking(False)
+            subscriber = Subscriber(connection)
+            with self.lock:
+                subscriber.pending += self._initialEvents()
+                self.subscribers.append(subscriber)
+            self.selector.register(connection, selectors.EVENT_READ, subscriber)
+            self.connects += 1
+            self._write(subscriber)
+
+    def _close(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            subscriber.pending = bytearray()
+        try:
+            self.selector.unregister(subscriber.connection)
+        except (KeyError, ValueError):
+            pass
+        subscriber.connection.close()
+        self.disconnects += 1
+
+    def _write(self, subscriber):
+        """Writes as much as possible of what is queued for a connection.
+        Returns False if the connection was closed."""
+        with self.lock:
+            data = bytes(subscriber.pending)
+        if not data:
+            return True
+        try:
+            sent = subscriber.connection.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._close(subscriber)
+            return False
+        self.writes += 1
+        with self.lock:
+            del subscriber.pending[:sent]
+            subscriber.sentBytes += sent
+            subscriber.events += sent // EVENT_SIZE
+            remaining = len(subscriber.pending)
+            if remaining > self.maxPending:
+                # Leave any partly written event alone, the rest can be merged
+                head = (EVENT_SIZE - subscriber.sentBytes % EVENT_SIZE) % EVENT_SIZE
+                subscriber.pending[head:] = mergeAxisEvents(bytes(subscriber.pending[head:]))
+                subscriber.merges += 1
+                self.merges += 1
+                remaining = len(subscriber.pending)
+        if remaining > self.maxPending:
+            self._close(subscriber)
+            self.slowDisconnects += 1
+            return False
+        events = selectors.EVENT_READ
+        if remaining:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(subscriber.connection, events, subscriber)
+        return True
+
+    def _read(self, subscriber):
+        """Anything sent by a connection is ignored, an empty read means it has gone."""
+        try:
+            if not subscriber.connection.recv(4096):
+                self._close(subscriber)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._close(subscriber)
+
+    def update(self, timeout = None):
+        """Accepts new connections and writes the queued events to the connections ready for them.
+        The timeout is in seconds, None waits forever."""
+        for key, mask in self.selector.select(timeout):
+            subscriber = key.data
+            if subscriber is None:
+                if key.fileobj is self.server:
+                    self._accept()
+                continue
+            if mask & selectors.EVENT_READ:
+                self._read(subscriber)
+            if mask & selectors.EVENT_WRITE and subscriber in self.subscribers:
+                self._write(subscriber)
+        self.wakePipe.drain()
+        with self.lock:
+            self.wakePending = False
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            if subscriber.pending and not self._write(subscriber):
+                continue
+            if not subscriber.pending and not self.gamepad.connected:
+                # Everything before the disconnect has been written
+                self._close(subscriber)
+
+    class BrokerThread(threading.Thread):
+        """Thread used to run the update function on a Broker in the background"""
+        def __init__(self, broker):
+            threading.Thread.__init__(self)
+            self.broker = broker
+            self.daemon = True
+
+        def run(self):
+            broker = self.broker
+            while broker.running:
+                broker.update()
+
+    def start(self):
+        """Starts the background thread which serves the connections."""
+        if self.running:
+            raise RuntimeError('Called start when the broker thread is already running')
+        self.running = True
+        self.brokerThread = Broker.BrokerThread(self)
+        self.brokerThread.start()
+
+    def stop(self):
+        """Stops the background thread, this may be called even if it was never started."""
+        self.running = False
+        with self.lock:
+            self.wakePending = False
+            self._wake()
+        if self.brokerThread is not None and self.brokerThread is not threading.current_thread():
+            self.brokerThread.join(Broker.STOP_TIMEOUT)
+
+    def close(self):
+        """Stops the broker, closes every connection and removes the socket.
+        The gamepad itself is left connected."""
+        self.stop()
+        self.gamepad.removePublisher(self)
+        for subscriber in list(self.subscribers):
+            self._close(subscriber)
+        self.selector.close()
+        self.server.close()
+        self.wakePipe.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def resetStats(self):
+        """Resets the counters reported by stats."""
+        self.connects = 0
+        self.disconnects = 0
+        self.slowDisconnects = 0
+        self.refused = 0
+        self.writes = 0
+        self.merges = 0
+
+    def stats(self):
+        """Returns a dictionary of counters for the broker as a whole and for each connection."""
+        with self.lock:
+            perSubscriber = [{'events': subscriber.events, 'pendingBytes': len(subscriber.pending),
+                              'merges': subscriber.merges} for subscriber in self.subscribers]
+        return {
+            'subscribers': len(perSubscriber),
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'slowDisconnects': self.slowDisconnects,
+            'refused': self.refused,
+            'writes': self.writes,
+            'merges': self.merges,
+            'perSubscriber': perSubscriber
+        }
+
+class RemoteGamepad:
+    """Reads a gamepad shared by a Broker through the normal Gamepad calls.
+
+    Create one with the gamepad type being shared, e.g.
+        gamepad = RemoteGamepad(Gamepad.PS4, '/tmp/gamepad0.sock')
+    The object returned is also an instance of the gamepad type given,
+    so handlers, background updates, calibration and so on all work as usual.
+    When the broker closes the connection the gamepad is disconnected, as if unplugged,
+    reconnect opens a new connection."""
+    remoteTypes = {}
+
+    def __new__(cls, gamepadType = Gamepad.Gamepad, path = DEFAULT_PATH):
+        if not (isinstance(gamepadType, type) and issubclass(gamepadType, Gamepad.Gamepad)):
+            raise ValueError('RemoteGamepad was not given a valid gamepad type')
+        remoteType = RemoteGamepad.remoteTypes.get(gamepadType)
+        if remoteType is None:
+            remoteType = type('Remote' + gamepadType.__name__, (RemoteGamepad, gamepadType), {})
+            RemoteGamepad.remoteTypes[gamepadType] = remoteType
+        return object.__new__(remoteType)
+
+    def __init__(self, gamepadType = Gamepad.Gamepad, path = DEFAULT_PATH):
+        gamepadType.__init__(self, os.path.abspath(path), Gamepad.JoystickBackend)
+        self.controllerType = gamepadType
+
+    def _openDevice(self, retryCount = 5):
+        while True:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(self.joystickPath)
+                connection.setblocking(False)
+                return io.open(connection.detach(), 'rb', 0)
+            except (IOError, OSError) as e:
+                connection.close()
+                retryCount -= 1
+                if retryCount > 0:
+                    time.sleep(0.5)
+                else:
+                    raise IOError('Could not connect to gamepad broker %s: %s' % (self.joystickPath, str(e)))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+        print('Usage:')
+        print('    %s [socket path] [device name] [joystick number]' % sys.argv[0])
+        sys.exit(1)
+    path = DEFAULT_PATH
+    gamepadType = Gamepad.Gamepad
+    joystickNumber = 0
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    if len(sys.argv) > 2:
+        gamepadType = Gamepad.controllerDict[sys.argv[2].upper()]
+    if len(sys.argv) > 3:
+        joystickNumber = sys.argv[3]
+    gamepad = gamepadType(joystickNumber)
+    broker = Broker(gamepad, path)
+    broker.start()
+    print('Sharing gamepad %s on %s, press CTRL+C to stop' % (joystickNumber, path))
+    try:
+        while True:
+            gamepad.updateState()
+    except (KeyboardInterrupt, IOError):
+        pass
+    broker.close()
+    gamepad.disconnect()
@@ -0,0 +1,268 @@
+# coding: utf-8
+"""
+Reads gamepads through the evdev interface, /dev/input/eventN, instead of the joystick interface.
+
+Any of the gamepad types from Controllers.py can be used, the backend is
+picked automatically from the device path:
+
+    gamepad = Gamepad.PS4('/dev/input/event5')
+
+or given explicitly, e.g. for a pipe or FIFO carrying evdev events:
+
+    gamepad = Gamepad.PS4('/tmp/evdev-fifo', backend = GamepadEvdev.EvdevBackend)
+
+Compared with the joystick interface evdev gives:
+    microsecond timestamps, so lastTimestamp is in microseconds
+    whole frames, everything the device changed between two SYN_REPORT events
+    is applied together, so snapshot never sees half of a stick movement
+
+The evdev button and axis codes are turned into the same numbers the joystick
+interface uses, taken from the codes the device says it has.  When the device
+cannot be asked, e.g. a pipe, the evdevButtonCodes and evdevAxisCodes listed
+by the gamepad type are used, codes not listed get the next free number.
+
+This module needs Linux.
+"""
+
+import struct
+import time
+import Gamepad
+
+# struct input_event uses the native size of long for the time, 24 bytes on 64 bit systems
+EVENT_STRUCT = struct.Struct('llHHi')
+ABSINFO_STRUCT = struct.Struct('iiiiii')
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+SYN_DROPPED = 3
+BTN_MISC = 0x100
+BTN_JOYSTICK = 0x120
+KEY_MAX = 0x2FF
+ABS_MAX = 0x3F
+
+EVIOCGNAME = 0x80004506
+EVIOCGKEY = 0x80004518
+EVIOCGBIT = 0x80004520
+EVIOCGABS = 0x80184540
+
+MAX_AXIS = int(Gamepad.Gamepad.MAX_AXIS)
+KEY_BYTES = KEY_MAX // 8 + 1
+ABS_BYTES = ABS_MAX // 8 + 1
+
+def _bitsSet(bitmask):
+    """Returns the list of bit numbers set in a bitmask read from the device."""
+    return [code for code in range(len(bitmask) * 8) if bitmask[code >> 3] & (1 << (code & 7))]
+
+def _capabilities(fd, eventType, size):
+    bitmask = Gamepad.ioctlBuffer(size)
+    try:
+        Gamepad.ioctl(fd, (EVIOCGBIT + eventType) | (size << 16), bitmask)
+    except (IOError, OSError):
+        return None
+    return _bitsSet(bitmask)
+
+def joystickCodes(fd):
+    """Returns the button codes and axis codes an open evdev device has, in joystick interface order.
+    Both lists are None if the device cannot tell us, e.g. a FIFO standing in for the device."""
+    keys = _capabilities(fd, EV_KEY, KEY_BYTES)
+    axes = _capabilities(fd, EV_ABS, ABS_BYTES)
+    if keys is None or axes is None:
+        return None, None
+    # The joystick driver numbers the joystick buttons first, then the other buttons
+    buttons = [code for code in keys if code >= BTN_JOYSTICK]
+    buttons += [code for code in keys if BTN_MISC <= code < BTN_JOYSTICK]
+    return buttons, axes
+
+def queryDevice(fd):
+    """Asks an open evdev device for its name and how many axes and buttons it has.
+    Returns name, axis count, button count, the same as Gamepad.queryDevice.
+
+    The name is None and the counts 0 if the device cannot tell us,
+    e.g. a FIFO standing in for the device."""
+    nameBuffer = Gamepad.ioctlBuffer(Gamepad.Gamepad.MAX_NAME_LENGTH)
+    try:
+        Gamepad.ioctl(fd, EVIOCGNAME | (len(nameBuffer) << 16), nameBuffer)
+        name = bytes(bytearray(nameBuffer)).split(b'\0', 1)[0].decode('utf-8', 'replace')
+    except (IOError, OSError):
+        name = None
+    buttons, axes = joystickCodes(fd)
+    if buttons is None:
+        return name, 0, 0
+    return name, len(axes), len(buttons)
+
+class EvdevBackend(object):
+    """Reads input_event records from an evdev device and turns them into joystick events,
+    see Gamepad.JoystickBackend for what a backend provides.
+
+    Events are held back until the SYN_REPORT which ends their frame,
+    so each list returned by unpack only holds complete frames.
+    Timestamps are in microseconds and axis values are scaled to -32767 to +32767
+    using the range the device reports for each axis, values from devices which
+    cannot report a range, e.g. pipes, are used as they are."""
+    eventSize = EVENT_STRUCT.size
+    framed = True
+    timestampWrap = None
+    queryDevice = staticmethod(queryDevice)
+
+    def __init__(self, gamepad):
+        self.gamepad = gamepad
+        self.fd = None
+        self.buttonIndex = {}
+        self.axisIndex = {}
+        self.axisScales = {}
+        self.buttonValues = {}
+        self.axisValues = {}
+        self.frame = []
+        self.dropping = False
+
+    def query(self, fd):
+        """Reads the device details and builds the code mappings, called each time the device is opened."""
+        self.fd = fd
+        self.frame = []
+        self.dropping = False
+        name, axisCount, buttonCount = queryDevice(fd)
+        buttons, axes = joystickCodes(fd)
+        if buttons is None:
+            # Not a real device, use the codes listed by the gamepad type
+            buttons = getattr(self.gamepad, 'evdevButtonCodes', ())
+            axes = getattr(self.gamepad, 'evdevAxisCodes', ())
+        for index, code in enumerate(buttons):
+            self.buttonIndex.setdefault(code, index)
+        for index, code in enumerate(axes):
+            self.axisIndex.setdefault(code, index)
+        self.axisScales = {}
+        for code in self.axisIndex:
+            absInfo = self._absInfo(code)
+            if absInfo is not None:
+                value, minimum, maximum = absInfo[:3]
+                if maximum > minimum:
+                    self.axisScales[code] = (minimum, 2.0 * MAX_AXIS / (maximum - minimum))
+        return name, len(self.axisIndex), len(self.buttonIndex)
+
+    def _absInfo(self, code):
+        """Returns value, minimum, maximum, fuzz, flat, resolution for an axis, None if the device cannot tell us."""
+        absInfo = Gamepad.ioctlBuffer(ABSINFO_STRUCT.size)
+        try:
+            Gamepad.ioctl(self.fd, EVIOCGABS + code, absInfo)
+        except (IOError, OSError):
+            return None
+        return ABSINFO_STRUCT.unpack_from(absInfo)
+
+    def _scaleAxis(self, code, value):
+        if code in self.axisScales:
+            minimum, scale = self.axisScales[code]
+            value = int(round((value - minimum) * scale)) - MAX_AXIS
+        return max(-MAX_AXIS, min(MAX_AXIS, value))
+
+    def _currentState(self):
+        """Returns the current button and axis values by code, read from the device.
+        Both are None if the device cannot tell us."""
+        keyState = Gamepad.ioctlBuffer(KEY_BYTES)
+        try:
+            Gamepad.ioctl(self.fd, EVIOCGKEY | (KEY_BYTES << 16), keyState)
+        except (IOError, OSError):
+            return None, None
+        pressed = set(_bitsSet(keyState))
+        buttons = dict((code, int(code in pressed)) for code in self.buttonIndex)
+        axes = {}
+        for code in self.axisIndex:
+            absInfo = self._absInfo(code)
+            if absInfo is not None:
+                axes[code] = absInfo[0]
+        return buttons, axes
+
+    def initialEvents(self, fd):
+        """Returns initial state events for every known button and axis,
+        the evdev interface does not send them itself."""
+        timestamp = int(time.time() * 1000000)
+        buttons, axes = self._currentState()
+        if buttons is None:
+            buttons = {}
+            axes = {}
+        events = []
+        for code, index in sorted(self.buttonIndex.items(), key = lambda item: item[1]):
+            value = buttons.get(code, 0)
+            self.buttonValues[code] = value
+            events.append((timestamp, value, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, index))
+        for code, index in sorted(self.axisIndex.items(), key = lambda item: item[1]):
+            value = axes.get(code, 0)
+            self.axisValues[code] = value
+            events.append((timestamp, self._scaleAxis(code, value),
+                           Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, index))
+        return events
+
+    def _resync(self, timestamp):
+        """Returns events for everything which changed while events were being dropped by the kernel."""
+        buttons, axes = self._currentState()
+        events = []
+        if buttons is None:
+            return events
+        for code, value in buttons.items():
+            if self.buttonValues.get(code) != value:
+                self.buttonValues[code] = value
+                events.append((timestamp, value, Gamepad.Gamepad.EVENT_CODE_BUTTON, self.buttonIndex[code]))
+        for code, value in axes.items():
+            if self.axisValues.get(code) != value:
+                self.axisValues[code] = value
+                events.append((timestamp, self._scaleAxis(code, value),
+                               Gamepad.Gamepad.EVENT_CODE_AXIS, self.axisIndex[code]))
+        return events
+
+    def _newIndex(self, codeIndex, code, initCode, timestamp, frame):
+        """Gives a code the device did not list the next free number,
+        an initial state event is added first so the gamepad makes room for it."""
+        index = max(codeIndex.values()) + 1 if codeIndex else 0
+        codeIndex[code] = index
+        frame.append((timestamp, 0, initCode, index))
+        return index
+
+    def unpack(self, data):
+        """Returns the joystick events for each complete frame in the data,
+        events after the last SYN_REPORT are kept until the rest of their frame arrives."""
+        buttonCode = Gamepad.Gamepad.EVENT_CODE_BUTTON
+        axisCode = Gamepad.Gamepad.EVENT_CODE_AXIS
+        buttonIndex = self.buttonIndex
+        axisIndex = self.axisIndex
+        buttonValues = self.buttonValues
+        axisValues = self.axisValues
+        frame = self.frame
+        events = []
+        for seconds, microseconds, eventType, code, value in Gamepad.unpackRecords(EVENT_STRUCT, data):
+            timestamp = seconds * 1000000 + microseconds
+            if eventType == EV_SYN:
+                if code == SYN_REPORT:
+                    if self.dropping:
+                        # The frame is incomplete, read the state from the device instead
+                        self.dropping = False
+                        del frame[:]
+                        events.extend(self._resync(timestamp))
+                    elif frame:
+                        events.extend(frame)
+                        del frame[:]
+                elif code == SYN_DROPPED:
+                    self.dropping = True
+            elif self.dropping:
+                continue
+            elif eventType == EV_KEY:
+                if value == 2:
+                    # Auto-repeat
+                    continue
+                index = buttonIndex.get(code)
+                if index is None:
+                    index = self._newIndex(buttonIndex, code, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, timestamp, frame)
+                buttonValues[code] = value
+                frame.append((timestamp, value, buttonCode, index))
+            elif eventType == EV_ABS:
+                index = axisIndex.get(code)
+                if index is None:
+                    index = self._newIndex(axisIndex, code, Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, timestamp, frame)
+                axisValues[code] = value
+                frame.append((timestamp, self._scaleAxis(code, value), axisCode, index))
+        return events
+
+def pack(events):
+    """Packs a list of (seconds, microseconds, event type, code, value) records into evdev bytes,
+    e.g. to feed a gamepad through a pipe."""
+    return b''.join(EVENT_STRUCT.pack(*event) for event in events)
@@ -0,0 +1,224 @@
+# coding: utf-8
+"""
+Recognises button chords, sequences and double-taps on a gamepad.
+
+Rather than polling isPressed in a loop, register a callback for the gesture
+in the same way as addButtonPressedHandler:
+
+    gestures = GamepadGestures.GestureEngine(gamepad)
+    gestures.addChordHandler(['L1', 'R1'], bothShoulders)
+    gestures.addDoubleTapHandler('CROSS', doubleJump)
+    gestures.addSequenceHandler(['UP', 'UP', 'DOWN', 'DOWN'], cheat)
+
+The engine is fed the button changes from the gamepad, so it works with
+background updates, updateState, getNextEvent and GamepadHub alike.
+Only the buttons used by a gesture are watched, axis events never reach it.
+
+Each gesture is compiled into a small state machine when it is added.
+A button change only advances the chords using that button, the sequences
+already in progress and the sequences starting with that button,
+so the cost does not grow with gestures which are not under way.
+"""
+
+import Gamepad
+
+class Chord:
+    """State machine for a set of buttons all held at once."""
+    def __init__(self, indices, pressedMap):
+        self.indices = frozenset(indices)
+        self.allHeld = self._allHeld(pressedMap)
+        self.callbacks = []
+
+    def _allHeld(self, pressedMap):
+        for index in self.indices:
+            if not pressedMap[index]:
+                return False
+        return True
+
+    def changed(self, pressedMap):
+        # Read from the gamepad state so missed changes, e.g. over a reconnect, cannot confuse it
+        allHeld = self._allHeld(pressedMap)
+        if allHeld and not self.allHeld:
+            for callback in self.callbacks:
+                callback()
+        self.allHeld = allHeld
+
+class Sequence:
+    """State machine for buttons pressed one after another, each within timeout seconds of the last.
+
+    Presses of buttons outside the sequence are ignored, a press out of turn
+    falls back to the longest part of the sequence it still completes."""
+    def __init__(self, indices, timeout):
+        self.indices = tuple(indices)
+        self.buttons = frozenset(indices)
+        self.timeout = timeout
+        self.position = 0
+        self.deadline = 0.0
+        self.callbacks = []
+        # Knuth-Morris-Pratt fallback table, fallback[i] is how much of the sequence
+        # is still matched when the press after the first i presses does not match
+        self.fallback = [0] * (len(self.indices) + 1)
+        matched = 0
+        for position in range(1, len(self.indices)):
+            while matched and self.indices[position] != self.indices[matched]:
+                matched = self.fallback[matched]
+            if self.indices[position] == self.indices[matched]:
+                matched += 1
+            self.fallback[position + 1] = matched
+
+    def pressed(self, index, now):
+        """Advances the sequence for a button press, returns True while it is still in progress."""
+        if now > self.deadline:
+            self.position = 0
+        if index not in self.buttons:
+            return self.position > 0
+        position = self.position
+        while position and self.indices[position] != index:
+            position = self.fallback[position]
+        if self.indices[position] == index:
+            position += 1
+        if position == len(self.indices):
+            self.position = 0
+            for callback in self.callbacks:
+                callback()
+            return False
+        self.position = position
+        self.deadline = now + self.timeout
+        return position > 0
+
+class GestureEngine:
+    """Calls handlers when chords, sequences or double-taps are made on a gamepad.
+
+    Gesture callbacks get no parameters passed, and run in whichever thread
+    is updating the gamepad, through its callback dispatcher if it has one."""
+    DEFAULT_SEQUENCE_TIMEOUT = 0.5
+    DEFAULT_DOUBLE_TAP_INTERVAL = 0.3
+
+    def __init__(self, gamepad):
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('GestureEngine was not created with a valid Gamepad object')
+        self.gamepad = gamepad
+        self.gestures = {}
+        self.chordsByButton = {}
+        self.startingSequences = {}
+        self.activeSequences = []
+        self.buttonWatchers = {}
+
+    def _buttonIndex(self, buttonName):
+        if buttonName in self.gamepad.buttonIndex:
+            return self.gamepad.buttonIndex[buttonName]
+        try:
+            return int(buttonName)
+        except ValueError:
+            raise ValueError('Button name %s was not found' % buttonName)
+
+    def _watch(self, index):
+        """Starts passing the changes of a button to the engine, once for each gesture using it."""
+        watcher = self.buttonWatchers.get(index)
+        if watcher is None:
+            watcher = [lambda pressed: self._buttonChanged(index, pressed), 0]
+            self.gamepad.addButtonChangedHandler(index, watcher[0])
+            self.buttonWatchers[index] = watcher
+        watcher[1] += 1
+
+    def _unwatch(self, index):
+        watcher = self.buttonWatchers[index]
+        watcher[1] -= 1
+        if not watcher[1]:
+            self.gamepad.removeButtonChangedHandler(index, watcher[0])
+            del self.buttonWatchers[index]
+
+    def _buttonChanged(self, index, pressed):
+        for chord in self.chordsByButton.get(index, ()):
+            chord.changed(self.gamepad.pressedMap)
+        if not pressed:
+            return
+        now = Gamepad.monotonic()
+        activeSequences = self.activeSequences
+        if activeSequences:
+            self.activeSequences = [sequence for sequence in activeSequences if sequence.pressed(index, now)]
+        for sequence in self.startingSequences.get(index, ()):
+            if sequence.position == 0 and sequence not in activeSequences and sequence.pressed(index, now):
+                self.activeSequences.append(sequence)
+
+    def _addGesture(self, key, gestureType, indices, callback, *parameters):
+        gesture = self.gestures.get(key)
+        if gesture is None:
+            watched = []
+            try:
+                for index in set(indices):
+                    self._watch(index)
+                    watched.append(index)
+            except ValueError:
+                # Leave things as they were if any of the buttons does not exist
+                for index in watched:
+                    self._unwatch(index)
+                raise
+            gesture = gestureType(indices, *parameters)
+            if gestureType is Chord:
+                for index in gesture.indices:
+                    self.chordsByButton.setdefault(index, []).append(gesture)
+            else:
+                self.startingSequences.setdefault(gesture.indices[0], []).append(gesture)
+            self.gestures[key] = gesture
+        if callback not in gesture.callbacks:
+            gesture.callbacks.append(callback)
+
+    def _removeGesture(self, key, callback):
+        gesture = self.gestures.get(key)
+        if gesture is None or callback not in gesture.callbacks:
+            return
+        gesture.callbacks.remove(callback)
+        if gesture.callbacks:
+            return
+        del self.gestures[key]
+        if isinstance(gesture, Chord):
+            for index in gesture.indices:
+                self.chordsByButton[index].remove(gesture)
+        else:
+            self.startingSequences[gesture.indices[0]].remove(gesture)
+            if gesture in self.activeSequences:
+                self.activeSequences = [sequence for sequence in self.activeSequences if sequence is not gesture]
+        for index in set(gesture.indices):
+            self._unwatch(index)
+
+    def addChordHandler(self, buttonNames, callback):
+        """Adds a callback for when all of the buttons specified by name or index are held together.
+        The callback is made when the last of them is pressed, and again only after one is released.
+        This callback gets no parameters passed."""
+        indices = frozenset(self._buttonIndex(buttonName) for buttonName in buttonNames)
+        self._addGesture(('chord', indices), Chord, indices, callback, self.gamepad.pressedMap)
+
+    def removeChordHandler(self, buttonNames, callback):
+        """Removes a callback added by addChordHandler."""
+        indices = frozenset(self._buttonIndex(buttonName) for buttonName in buttonNames)
+        self._removeGesture(('chord', indices), callback)
+
+    def addSequenceHandler(self, buttonNames, callback, timeout = DEFAULT_SEQUENCE_TIMEOUT):
+        """Adds a callback for when the buttons specified by name or index are pressed in order,
+        each within timeout seconds of the one before.
+        This callback gets no parameters passed."""
+        indices = tuple(self._buttonIndex(buttonName) for buttonName in buttonNames)
+        if not indices:
+            raise ValueError('A sequence needs at least one button')
+        self._addGesture(('sequence', indices, timeout), Sequence, indices, callback, timeout)
+
+    def removeSequenceHandler(self, buttonNames, callback, timeout = DEFAULT_SEQUENCE_TIMEOUT):
+        """Removes a callback added by addSequenceHandler, the timeout must match."""
+        indices = tuple(self._buttonIndex(buttonName) for buttonName in buttonNames)
+        self._removeGesture(('sequence', indices, timeout), callback)
+
+    def addDoubleTapHandler(self, buttonName, callback, interval = DEFAULT_DOUBLE_TAP_INTERVAL):
+        """Adds a callback for when a button specified by name or index is pressed twice
+        within interval seconds.  This callback gets no parameters passed."""
+        self.addSequenceHandler([buttonName, buttonName], callback, interval)
+
+    def removeDoubleTapHandler(self, buttonName, callback, interval = DEFAULT_DOUBLE_TAP_INTERVAL):
+        """Removes a callback added by addDoubleTapHandler, the interval must match."""
+        self.removeSequenceHandler([buttonName, buttonName], callback, interval)
+
+    def removeAllHandlers(self):
+        """Removes all of the gesture callbacks, the gamepad is left as it was before the engine."""
+        for key, gesture in list(self.gestures.items()):
+            for callback in list(gesture.callbacks):
+                self._removeGesture(key, callback)
@@ -0,0 +1,304 @@
+# coding: utf-8
+"""
+Watches for gamepads being plugged in and unplugged.
+
+The directory holding the joystick devices is watched using inotify, so the
+callbacks are made as soon as a device appears or goes, without polling:
+
+    hotplug = GamepadHotplug.HotplugManager()
+    hotplug.addConnectedHandler(connected)
+    hotplug.addDisconnectedHandler(disconnected)
+    hotplug.start()
+
+Gamepads opened with hotplug.open, or passed to hotplug.watch, are opened
+again automatically when they are plugged back in.  Their handlers,
+calibration and background updates carry on as before.
+
+Any directory can be watched, e.g. a temporary directory holding FIFOs
+standing in for the joystick devices.
+
+This module needs Linux.
+"""
+
+import os
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+import Gamepad
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_STRUCT = struct.Struct('iIII')
+READ_SIZE = 4096
+
+libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+
+class HotplugManager:
+    """Watches a directory for joystick devices coming and going.
+
+    Devices are the files in directory whose names start with prefix followed by a number.
+    Connected handlers are called with the device path and the watched Gamepad object
+    for that path, or None if nothing is watching it.  Disconnected handlers get the same.
+    All of the callbacks are made from the hotplug thread."""
+    STOP_TIMEOUT = 1.0
+
+    def __init__(self, directory = '/dev/input', prefix = 'js'):
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix
+        self.connectedEventMap = []
+        self.disconnectedEventMap = []
+        self.gamepads = {}
+        self.devices = set()
+        self.condition = threading.Condition()
+        self.updateThread = None
+        self.running = False
+        self.inotifyFd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.inotifyFd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, 'Could not start inotify: %s' % os.strerror(errno))
+        mask = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+        if libc.inotify_add_watch(self.inotifyFd, self.directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.inotifyFd)
+            raise OSError(errno, 'Could not watch %s: %s' % (self.directory, os.strerror(errno)))
+        self.wakePipe = Gamepad.WakePipe()
+        self.poller = select.poll()
+        self.poller.register(self.inotifyFd, select.POLLIN)
+        self.poller.register(self.wakePipe.fileno(), select.POLLIN)
+
+    def __del__(self):
+        try:
+            os.close(self.inotifyFd)
+            self.wakePipe.close()
+        except (AttributeError, OSError):
+            pass
+
+    def _wake(self):
+        self.wakePipe.wake()
+
+    def devicePath(self, joystickNumber = 0):
+        """Returns the path in the watched directory for a joystick number.
+        A full path may be given instead of a number."""
+        joystickNumber = str(joystickNumber)
+        if os.sep in joystickNumber:
+            return os.path.join(os.path.realpath(os.path.dirname(joystickNumber)), os.path.basename(joystickNumber))
+        else:
+            return os.path.join(self.directory, self.prefix + joystickNumber)
+
+    def _isDevice(self, name):
+        return name.startswith(self.prefix) and name[len(self.prefix):].isdigit()
+
+    def addConnectedHandler(self, callback):
+        """Adds a callback for when a device is plugged in.
+        This callback gets the device path and the watched Gamepad object or None passed.
+        Devices already there when start is called are reported as well."""
+        if callback not in self.connectedEventMap:
+            self.connectedEventMap.append(callback)
+
+    def removeConnectedHandler(self, callback):
+        """Removes a callback added by addConnectedHandler."""
+        if callback in self.connectedEventMap:
+            self.connectedEventMap.remove(callback)
+
+    def addDisconnectedHandler(self, callback):
+        """Adds a callback for when a device is unplugged.
+        This callback gets the device path and the watched Gamepad object or None passed."""
+        if callback not in self.disconnectedEventMap:
+            self.disconnectedEventMap.append(callback)
+
+    def removeDisconnectedHandler(self, callback):
+        """Removes a callback added by addDisconnectedHandler."""
+        if callback in self.disconnectedEventMap:
+            self.disconnectedEventMap.remove(callback)
+
+    def watch(self, gamepad):
+        """Reconnects an already opened Gamepad object whenever its device is plugged back in.
+        Throws ValueError if the device is not in the watched directory."""
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('HotplugManager was not given a valid Gamepad object')
+        path = self.devicePath(gamepad.joystickPath)
+        if os.path.dirname(path) != self.directory:
+            raise ValueError('Gamepad %s is not in %s' % (gamepad.joystickNumber, self.directory))
+        with self.condition:
+            self.gamepads[os.path.basename(path)] = gamepad
+        gamepad.hotplug = self
+        return gamepad
+
+    def unwatch(self, gamepad):
+        """Stops reconnecting a Gamepad object added by watch or open."""
+        with self.condition:
+            for name, watched in list(self.gamepads.items()):
+                if watched is gamepad:
+                    del self.gamepads[name]
+        if gamepad.hotplug is self:
+            gamepad.hotplug = None
+
+    def open(self, joystickNumber = 0, gamepadType = None):
+        """Opens a gamepad in the watched directory and reconnects it whenever it is plugged back in.
+        The type is picked from the device name, see Gamepad.openGamepad, unless gamepadType is given.
+
+        Throws an IOError if the device cannot be opened."""
+        path = self.devicePath(joystickNumber)
+        if gamepadType is None:
+            gamepad = Gamepad.openGamepad(path)
+        else:
+            gamepad = gamepadType(path)
+        return self.watch(gamepad)
+
+    def connectedDevices(self):
+        """Returns a sorted list of the paths for the devices currently plugged in."""
+        with self.condition:
+            return sorted(os.path.join(self.directory, name) for name in self.devices)
+
+    def waitForConnection(self, joystickNumber = 0, timeout = None):
+        """Waits until the device is plugged in, the hotplug thread must be running.
+        If timeout is given this waits at most that many seconds.
+
+        Returns False if the timeout passed first, otherwise True."""
+        name = os.path.basename(self.devicePath(joystickNumber))
+        if timeout is not None:
+            endTime = Gamepad.monotonic() + timeout
+        with self.condition:
+            while name not in self.devices:
+                if timeout is None:
+                    self.condition.wait()
+                else:
+                    remaining = endTime - Gamepad.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+            return True
+
+    def _connected(self, name):
+        """Handles a device appearing or changing, e.g. having its permissions set after it was created."""
+        path = os.path.join(self.directory, name)
+        if not os.access(path, os.R_OK):
+            # Not ready to use yet, there will be another event when it is
+            return
+        with self.condition:
+            gamepad = self.gamepads.get(name)
+        if gamepad is not None and not gamepad.connected:
+            try:
+                gamepad.reconnect()
+            except IOError:
+                return
+        with self.condition:
+            if name in self.devices:
+                return
+            self.devices.add(name)
+            self.condition.notify_all()
+        for callback in list(self.connectedEventMap):
+            callback(path, gamepad)
+
+    def _disconnected(self, name):
+        """Handles a device being removed."""
+        path = os.path.join(self.directory, name)
+        with self.condition:
+            gamepad = self.gamepads.get(name)
+            if name not in self.devices:
+                return
+            self.devices.discard(name)
+        if gamepad is not None:
+            gamepad._lostDevice()
+        for callback in list(self.disconnectedEventMap):
+            callback(path, gamepad)
+
+    def _scan(self):
+        """Checks the whole directory, used at the start and if inotify events were lost."""
+        names = set(name for name in os.listdir(self.directory) if self._isDevice(name))
+        for name in sorted(self.devices - names):
+            self._disconnected(name)
+        for name in sorted(names):
+            self._connected(name)
+
+    def _readEvents(self):
+        """Reads and handles the pending inotify events."""
+        while True:
+            try:
+                data = os.read(self.inotifyFd, READ_SIZE)
+            except OSError:
+                return
+            if not data:
+                return
+            offset = 0
+            while offset + EVENT_STRUCT.size <= len(data):
+                watch, mask, cookie, length = EVENT_STRUCT.unpack_from(data, offset)
+                offset += EVENT_STRUCT.size
+                name = data[offset:offset + length].split(b'\0', 1)[0].decode('utf-8', 'replace')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self._scan()
+                elif mask & IN_DELETE_SELF:
+                    for device in sorted(self.devices):
+                        self._disconnected(device)
+                elif not self._isDevice(name):
+                    pass
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._disconnected(name)
+                elif mask & (IN_CREATE | IN_MOVED_TO | IN_ATTRIB):
+                    self._connected(name)
+
+    def updateState(self, timeout = None):
+        """Waits for devices to come or go and makes the callbacks.
+        The timeout is in seconds, None waits forever."""
+        if timeout is None:
+            ready = self.poller.poll()
+        else:
+            ready = self.poller.poll(max(0, int(timeout * 1000 + 0.999)))
+        for fd, pollEvents in ready:
+            if fd == self.wakePipe.readFd:
+                self.wakePipe.drain()
+            else:
+                self._readEvents()
+
+    class UpdateThread(threading.Thread):
+        """Thread used to run the updateState function on a HotplugManager in the background"""
+        def __init__(self, manager):
+            threading.Thread.__init__(self)
+            self.manager = manager
+            self.daemon = True
+
+        def run(self):
+            manager = self.manager
+            while manager.running:
+                manager.updateState()
+
+    def start(self):
+        """Starts the background thread which watches for devices.
+        The connected handlers are called for any devices already plugged in."""
+        if self.running:
+            raise RuntimeError('Called start when the hotplug thread is already running')
+        self._scan()
+        self.running = True
+        self.updateThread = HotplugManager.UpdateThread(self)
+        self.updateThread.start()
+
+    def stop(self):
+        """Stops the background thread, this may be called even if it was never started."""
+        self.running = False
+        self._wake()
+        if self.updateThread is not None and self.updateThread is not threading.current_thread():
+            self.updateThread.join(HotplugManager.STOP_TIMEOUT)
+
+    def disconnect(self):
+        """Stops the background thread and cleanly disconnects all of the watched gamepads."""
+        self.stop()
+        with self.condition:
+            gamepads = list(self.gamepads.values())
+            self.gamepads = {}
+        for gamepad in gamepads:
+            gamepad.hotplug = None
+            try:
+                gamepad.disconnect()
+            except AttributeError:
+                # Already disconnected
+                pass
@@ -0,0 +1,187 @@
+# coding: utf-8
+"""
+Services many gamepads from a single background thread.
+
+Instead of one update thread per gamepad the hub waits on every joystick
+device at once using the selectors module (epoll on Linux), then reads all
+of the pending events from each device which is ready in one go.
+Any of the gamepad types from Controllers.py can be used, for example:
+
+    hub = GamepadHub.GamepadHub()
+    player1 = hub.open(Gamepad.PS4, 0)
+    player2 = hub.open(Gamepad.Xbox360, 1)
+    hub.start()
+
+Each gamepad keeps its own state and callbacks, so the normal calls such as
+axis, isPressed and addButtonPressedHandler work as usual.
+
+This module needs Python 3.4 or newer for selectors.
+"""
+
+import selectors
+import threading
+import Gamepad
+
+class GamepadHub:
+    """Keeps a set of Gamepad objects updated from one shared background thread."""
+    STOP_TIMEOUT = 1.0
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.gamepads = []
+        self.disconnectedEventMap = []
+        self.updateThread = None
+        self.running = False
+        self.wakePipe = Gamepad.WakePipe()
+        self.selector.register(self.wakePipe, selectors.EVENT_READ, None)
+        self.resetStats()
+
+    def __del__(self):
+        try:
+            self.selector.close()
+            self.wakePipe.close()
+        except AttributeError:
+            pass
+
+    def _wake(self):
+        self.wakePipe.wake()
+
+    def add(self, gamepad):
+        """Adds an already opened Gamepad object to the hub."""
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('GamepadHub was not given a valid Gamepad object')
+        if gamepad not in self.gamepads:
+            self.selector.register(gamepad.joystickFile.fileno(), selectors.EVENT_READ, gamepad)
+            self.gamepads.append(gamepad)
+            gamepad.externalReader = self
+            self.gamepadStats[gamepad] = {'reads': 0, 'events': 0}
+            self._wake()
+        return gamepad
+
+    def open(self, gamepadType = Gamepad.Gamepad, joystickNumber = 0):
+        """Opens a gamepad of the given type and adds it to the hub.
+        The joystick number may also be a device path."""
+        return self.add(gamepadType(joystickNumber))
+
+    def remove(self, gamepad):
+        """Removes a gamepad from the hub, the gamepad itself is left connected."""
+        if gamepad in self.gamepads:
+            self.gamepads.remove(gamepad)
+            try:
+                self.selector.unregister(gamepad.joystickFile.fileno())
+            except (KeyError, ValueError, AttributeError):
+                pass
+            if gamepad.externalReader is self:
+                gamepad.externalReader = None
+                gamepad._notifyWaiters()
+            self._wake()
+
+    def addDisconnectedHandler(self, callback):
+        """Adds a callback for when any gamepad in the hub is disconnected.
+        This callback gets the disconnected Gamepad object passed."""
+        if callback not in self.disconnectedEventMap:
+            self.disconnectedEventMap.append(callback)
+
+    def removeDisconnectedHandler(self, callback):
+        """Removes a callback added by addDisconnectedHandler."""
+        if callback in self.disconnectedEventMap:
+            self.disconnectedEventMap.remove(callback)
+
+    def updateState(self, timeout = None):
+        """Waits for any of the gamepads to have events, then updates all of the ready gamepads.
+        The timeout is in seconds, None waits forever.
+
+        Returns the number of events processed."""
+        for gamepad in self.gamepads:
+            if gamepad.heldAxisEvents:
+                # Wake up in time to pass on axis positions held back by coalescing
+                delay = gamepad._heldEventsDelay()
+                if timeout is None or delay < timeout:
+                    timeout = delay
+        ready = self.selector.select(timeout)
+        self.wakeups += 1
+        processed = 0
+        for key, mask in ready:
+            gamepad = key.data
+            if gamepad is None:
+                self.wakePipe.drain()
+                continue
+            try:
+                events = gamepad._readReadyEvents(gamepad.batchSize)
+            except IOError:
+                self.remove(gamepad)
+                self.disconnects += 1
+                for callback in self.disconnectedEventMap:
+                    callback(gamepad)
+                continue
+            gamepad._updateStateFromEvents(events)
+            gamepadStats = self.gamepadStats[gamepad]
+            gamepadStats['reads'] += 1
+            gamepadStats['events'] += len(events)
+            self.reads += 1
+            processed += len(events)
+        for gamepad in self.gamepads:
+            if gamepad.heldAxisEvents:
+                events = gamepad._coalesceEvents([])
+                gamepad._updateStateFromEvents(events)
+                processed += len(events)
+        self.events += processed
+        return processed
+
+    class UpdateThread(threading.Thread):
+        """Thread used to run the updateState function on a GamepadHub in the background"""
+        def __init__(self, hub):
+            threading.Thread.__init__(self)
+            self.hub = hub
+            self.daemon = True
+
+        def run(self):
+            hub = self.hub
+            while hub.running:
+                hub.updateState()
+
+    def start(self):
+        """Starts the background thread which keeps all of the gamepads updated."""
+        if self.running:
+            raise RuntimeError('Called start when the hub thread is already running')
+        self.running = True
+        self.updateThread = GamepadHub.UpdateThread(self)
+        self.updateThread.start()
+
+    def stop(self):
+        """Stops the background thread, this may be called even if it was never started."""
+        self.running = False
+        self._wake()
+        if self.updateThread is not None and self.updateThread is not threading.current_thread():
+            self.updateThread.join(GamepadHub.STOP_TIMEOUT)
+
+    def disconnect(self):
+        """Stops the background thread and cleanly disconnects all of the gamepads."""
+        self.stop()
+        for gamepad in list(self.gamepads):
+            self.remove(gamepad)
+            gamepad.disconnect()
+
+    def resetStats(self):
+        """Resets the counters reported by stats."""
+        self.wakeups = 0
+        self.reads = 0
+        self.events = 0
+        self.disconnects = 0
+        self.gamepadStats = dict((gamepad, {'reads': 0, 'events': 0}) for gamepad in self.gamepads)
+
+    def stats(self):
+        """Returns a dictionary of counters for the hub as a whole and for each gamepad."""
+        if self.reads:
+            eventsPerRead = self.events / float(self.reads)
+        else:
+            eventsPerRead = 0.0
+        return {
+            'gamepads': len(self.gamepads),
+            'wakeups': self.wakeups,
+            'reads': self.reads,
+            'events': self.events,
+            'eventsPerRead': eventsPerRead,
+            'disconnects': self.disconnects,
+            'perGamepad': dict((gamepad.joystickNumber, dict(counts)) for gamepad, counts in self.gamepadStats.items())
+        }
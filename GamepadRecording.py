@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Records gamepad sessions to a file and plays them back later.
+
+A Recorder saves the raw joystick events exactly as they are read from the
+device, along with the time each read happened:
+
+    gamepad = Gamepad.PS4()
+    recorder = GamepadRecording.Recorder(gamepad, 'session.gprec')
+    gamepad.startBackgroundUpdates()
+    ...
+    recorder.stop()
+
+A ReplayGamepad then behaves just like the controller did, using any of the
+gamepad types from Controllers.py:
+
+    gamepad = GamepadRecording.ReplayGamepad(Gamepad.PS4, 'session.gprec')
+
+Recordings can be played back in real time or as fast as possible,
+and can be read from a file, a pipe or a FIFO.
+
+File format, all little endian:
+    header - 8 byte magic 'GPREC001', start time (double, seconds since the epoch),
+             controller name length (uint16), controller name (UTF-8)
+    chunks - receive time (uint64, microseconds after the start time),
+             data length (uint32), raw records from one read of the device,
+             js_event records unless the gamepad used another backend, e.g. evdev
+
+This module needs Python 3.
+"""
+
+import os
+import sys
+import stat
+import mmap
+import struct
+import threading
+import time
+import Gamepad
+
+MAGIC = b'GPREC001'
+HEADER_STRUCT = struct.Struct('<8sdH')
+CHUNK_STRUCT = struct.Struct('<QI')
+MAX_WRITE = 65536
+
+class Recorder:
+    """Tees the raw events read from a gamepad into an append-only recording file.
+
+    Recording starts straight away and continues until stop is called.
+    With the joystick backend the recording starts with initial state events
+    for the current state, so it can be replayed even if the device sent its
+    own initial state events before the recorder was added.
+
+    An existing recording is added to rather than replaced."""
+
+    def __init__(self, gamepad, path):
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('Recorder was not created with a valid Gamepad object')
+        self.gamepad = gamepad
+        self.path = path
+        self.lock = threading.Lock()
+        self.recordFile = open(path, 'ab')
+        if self.recordFile.tell() == 0:
+            self.startTime = time.time()
+            name = gamepad.controllerType.__name__.encode('utf-8')
+            self.recordFile.write(HEADER_STRUCT.pack(MAGIC, self.startTime, len(name)) + name)
+        else:
+            with open(path, 'rb') as existing:
+                self.startTime = readHeader(existing)[0]
+        # Receive times follow the monotonic clock from here on
+        self.startOffset = time.time() - self.startTime
+        self.startMonotonic = Gamepad.monotonic()
+        self.chunks = 0
+        self.events = 0
+        with self.lock:
+            if isinstance(gamepad.backend, Gamepad.JoystickBackend):
+                self._recordLocked(self._initialEvents())
+            gamepad.recorder = self
+
+    def _initialEvents(self):
+        """Returns packed initial state events for every button and axis from the current state."""
+        timestamp, axes, buttons = self.gamepad.snapshot()
+        timestamp &= 0xFFFFFFFF
+        eventStruct = Gamepad.Gamepad.EVENT_STRUCT
+        events = [eventStruct.pack(timestamp, value, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, index)
+                  for index, value in enumerate(buttons)]
+        events += [eventStruct.pack(timestamp, int(round(position * Gamepad.Gamepad.MAX_AXIS)), Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, index)
+                   for index, position in enumerate(axes)]
+        return b''.join(events)
+
+    def record(self, data):
+        """Adds the raw event data from one read of the device to the recording.
+        Called by the gamepad, normally from the thread reading it."""
+        with self.lock:
+            if self.recordFile is not None:
+                self._recordLocked(data)
+
+    def _recordLocked(self, data):
+        receiveTime = int((Gamepad.monotonic() - self.startMonotonic + self.startOffset) * 1000000)
+        self.recordFile.write(CHUNK_STRUCT.pack(receiveTime, len(data)))
+        self.recordFile.write(data)
+        self.chunks += 1
+        self.events += len(data) // self.gamepad.eventSize
+
+    def stop(self):
+        """Stops recording and closes the file, this may be called more than once."""
+        if self.gamepad.recorder is self:
+            self.gamepad.recorder = None
+        with self.lock:
+            if self.recordFile is not None:
+                self.recordFile.close()
+                self.recordFile = None
+
+def readHeader(sourceFile):
+    """Reads the header from the start of a recording.
+    Returns the start time and the controller name.
+
+    Throws ValueError if this is not a recording."""
+    header = _readExactly(sourceFile, HEADER_STRUCT.size)
+    if len(header) < HEADER_STRUCT.size:
+        raise ValueError('Recording is empty or incomplete')
+    magic, startTime, nameLength = HEADER_STRUCT.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('Not a gamepad recording')
+    return startTime, _readExactly(sourceFile, nameLength).decode('utf-8')
+
+def _readExactly(sourceFile, size):
+    """Reads size bytes from a file or pipe, fewer are returned at the end of the data."""
+    data = b''
+    while len(data) < size:
+        more = sourceFile.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+def readChunks(source):
+    """Yields each chunk in a recording as:
+        receive time (microseconds after the start), raw event data
+
+    The source can be a path or an open binary file object.
+    Regular files are read through mmap, so large recordings are not loaded into memory,
+    pipes and FIFOs are read as the data arrives."""
+    if isinstance(source, (str, bytes)):
+        sourceFile = open(source, 'rb')
+    else:
+        sourceFile = source
+    try:
+        readHeader(sourceFile)
+        if stat.S_ISREG(os.fstat(sourceFile.fileno()).st_mode):
+            offset = sourceFile.tell()
+            size = os.fstat(sourceFile.fileno()).st_size
+            if size <= offset:
+                return
+            mapped = mmap.mmap(sourceFile.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                while offset + CHUNK_STRUCT.size <= size:
+                    receiveTime, length = CHUNK_STRUCT.unpack_from(mapped, offset)
+                    offset += CHUNK_STRUCT.size
+                    if offset + length > size:
+                        # Recording was cut off part way through a chunk
+                        break
+                    yield receiveTime, mapped[offset:offset + length]
+                    offset += length
+            finally:
+                mapped.close()
+        else:
+            while True:
+                chunkHeader = _readExactly(sourceFile, CHUNK_STRUCT.size)
+                if len(chunkHeader) < CHUNK_STRUCT.size:
+                    break
+                receiveTime, length = CHUNK_STRUCT.unpack(chunkHeader)
+                data = _readExactly(sourceFile, length)
+                if len(data) < length:
+                    break
+                yield receiveTime, data
+    finally:
+        if sourceFile is not source:
+            sourceFile.close()
+
+class ReplayGamepad:
+    """Plays a recording back through the normal Gamepad calls.
+
+    Create one with the gamepad type the recording was made with, e.g.
+        gamepad = ReplayGamepad(Gamepad.PS4, 'session.gprec')
+    The object returned is also an instance of the gamepad type given.
+
+    The source can be a path to a recording file or FIFO, or an open binary file such as a pipe.
+    Recordings of gamepads using another backend, e.g. GamepadEvdev.EvdevBackend,
+    need the same backend given to play back.
+    With realTime set the events arrive with the same timing as they were recorded,
+    speed changes how fast that is, e.g. 2.0 plays at double speed.
+    Otherwise the events are delivered as fast as they can be read.
+
+    The events are fed through a pipe by a background thread, so the gamepad
+    reads them exactly as it would from the device.
+    At the end of the recording the gamepad is disconnected, as if unplugged."""
+    replayTypes = {}
+
+    def __new__(cls, gamepadType, source, realTime = True, speed = 1.0, backend = None):
+        if not (isinstance(gamepadType, type) and issubclass(gamepadType, Gamepad.Gamepad)):
+            raise ValueError('ReplayGamepad was not given a valid gamepad type')
+        replayType = ReplayGamepad.replayTypes.get(gamepadType)
+        if replayType is None:
+            replayType = type('Replay' + gamepadType.__name__, (ReplayGamepad, gamepadType), {})
+            ReplayGamepad.replayTypes[gamepadType] = replayType
+        return object.__new__(replayType)
+
+    def __init__(self, gamepadType, source, realTime = True, speed = 1.0, backend = None):
+        self.replaySource = source
+        self.realTime = realTime
+        self.speed = float(speed)
+        self.replayStopped = threading.Event()
+        self.feedThread = None
+        if isinstance(source, (str, bytes)):
+            name = source
+        else:
+            name = getattr(source, 'name', 'replay')
+        gamepadType.__init__(self, name, backend or Gamepad.JoystickBackend)
+        self.controllerType = gamepadType
+
+    def _openDevice(self, retryCount = 5):
+        readFd, self.feedFd = os.pipe()
+        self.feedThread = threading.Thread(target = self._feed)
+        self.feedThread.daemon = True
+        self.feedThread.start()
+        return open(readFd, 'rb', 0)
+
+    def _feed(self):
+        try:
+            if self.realTime:
+                self._feedRealTime()
+            else:
+                self._feedFast()
+        except OSError:
+            # The gamepad has stopped reading
+            pass
+        finally:
+            os.close(self.feedFd)
+
+    def _feedRealTime(self):
+        firstTime = None
+        for receiveTime, data in readChunks(self.replaySource):
+            if firstTime is None:
+                firstTime = receiveTime
+                startTime = Gamepad.monotonic()
+            delay = startTime + (receiveTime - firstTime) / (self.speed * 1000000.0) - Gamepad.monotonic()
+            if delay > 0 and self.replayStopped.wait(delay):
+                return
+            elif self.replayStopped.is_set():
+                return
+            os.write(self.feedFd, data)
+
+    def _feedFast(self):
+        pending = bytearray()
+        for receiveTime, data in readChunks(self.replaySource):
+            pending += data
+            if len(pending) >= MAX_WRITE:
+                if self.replayStopped.is_set():
+                    return
+                self._writeAll(pending)
+                pending = bytearray()
+        self._writeAll(pending)
+
+    def _writeAll(self, data):
+        view = memoryview(data)
+        while len(view):
+            written = os.write(self.feedFd, view)
+            view = view[written:]
+
+    def disconnect(self):
+        """Stops the replay and cleanly disconnects the gamepad."""
+        self.replayStopped.set()
+        Gamepad.Gamepad.disconnect(self)
+        if self.feedThread is not None and self.feedThread is not threading.current_thread():
+            self.feedThread.join(Gamepad.Gamepad.STOP_TIMEOUT)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('record', 'play'):
+        print('Usage:')
+        print('    %s record <file> [device name] [joystick number]' % sys.argv[0])
+        print('    %s play <file> [device name]' % sys.argv[0])
+        sys.exit(1)
+    command, path = sys.argv[1], sys.argv[2]
+    gamepadType = Gamepad.Gamepad
+    if len(sys.argv) > 3:
+        gamepadType = Gamepad.controllerDict[sys.argv[3].upper()]
+    if command == 'record':
+        if len(sys.argv) > 4:
+            joystickNumber = sys.argv[4]
+        else:
+            joystickNumber = 0
+        gamepad = gamepadType(joystickNumber)
+        recorder = Recorder(gamepad, path)
+        print('Recording to %s, press CTRL+C to stop' % path)
+        try:
+            while True:
+                gamepad.updateState()
+        except (KeyboardInterrupt, IOError):
+            pass
+        recorder.stop()
+        print('Recorded %d events' % recorder.events)
+    else:
+        gamepad = ReplayGamepad(gamepadType, path)
+        try:
+            while True:
+                eventType, control, value = gamepad.getNextEvent()
+                print('%s, %s, %s' % (eventType, control, value))
+        except (KeyboardInterrupt, IOError):
+            pass
@@ -0,0 +1,355 @@
+# coding: utf-8
+"""
+Shares the state of a gamepad with other processes through shared memory.
+
+One process reads the controller as normal and publishes its state:
+
+    gamepad = Gamepad.PS4()
+    publisher = GamepadShared.Publisher(gamepad, 'gamepad0')
+    gamepad.startBackgroundUpdates()
+
+Any number of other processes can then read the state without opening the
+device or decoding any events themselves:
+
+    gamepad = GamepadShared.SharedGamepadView('gamepad0')
+    if gamepad.isPressed('CROSS'):
+        ...
+
+The state is copied into the shared memory after each batch of events is read.
+A sequence number guards the copy, readers simply try again if they catch
+the publisher part way through, so the publisher is never held up by them.
+Reads are plain memory reads, there are no system calls or pickling.
+
+Shared memory block layout, native byte order:
+    header  - 4 byte magic 'GPSM', version (uint16), axis count (uint16),
+              button count (uint16), padding (uint16), gamepad type name (32 bytes UTF-8),
+              padding to 48 bytes
+    state   - sequence (uint64, odd while being written), lastTimestamp (int64),
+              connected (uint8), padding to 24 bytes
+    axes    - position of each axis (double)
+    buttons - 1 for each held button (uint8), padding to a multiple of 4 bytes
+    presses - count of presses for each button (uint32)
+    releases - count of releases for each button (uint32)
+
+This module needs Python 3.8 or newer.
+"""
+
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+import Gamepad
+
+MAGIC = b'GPSM'
+VERSION = 1
+HEADER_STRUCT = struct.Struct('=4sHHHH32s4x')
+STATE_OFFSET = HEADER_STRUCT.size
+STATE_STRUCT = struct.Struct('=QqB7x')
+AXES_OFFSET = STATE_OFFSET + STATE_STRUCT.size
+
+EVENT_CODE_BUTTON = Gamepad.Gamepad.EVENT_CODE_BUTTON
+EVENT_CODE_AXIS = Gamepad.Gamepad.EVENT_CODE_AXIS
+EVENT_CODE_INIT_AXIS = Gamepad.Gamepad.EVENT_CODE_INIT_AXIS
+
+# Names published by this process
+publishedNames = set()
+
+def _layout(axisCount, buttonCount):
+    """Returns the offsets of the pressed, presses and releases arrays and the total size."""
+    pressedOffset = AXES_OFFSET + 8 * axisCount
+    pressesOffset = pressedOffset + ((buttonCount + 3) & ~3)
+    releasesOffset = pressesOffset + 4 * buttonCount
+    return pressedOffset, pressesOffset, releasesOffset, releasesOffset + 4 * buttonCount
+
+class SharedState(object):
+    """Views onto the arrays in a shared memory block, used by both sides."""
+    def __init__(self, memory, axisCount, buttonCount):
+        self.memory = memory
+        self.axisCount = axisCount
+        self.buttonCount = buttonCount
+        pressedOffset, pressesOffset, releasesOffset, size = _layout(axisCount, buttonCount)
+        view = memory.buf
+        self.sequence = view[STATE_OFFSET:STATE_OFFSET + 8].cast('Q')
+        self.timestamp = view[STATE_OFFSET + 8:STATE_OFFSET + 16].cast('q')
+        self.connected = view[STATE_OFFSET + 16:STATE_OFFSET + 17]
+        self.axes = view[AXES_OFFSET:pressedOffset].cast('d')
+        self.pressed = view[pressedOffset:pressedOffset + buttonCount]
+        self.presses = view[pressesOffset:releasesOffset].cast('I')
+        self.releases = view[releasesOffset:size].cast('I')
+
+    def release(self):
+        # The memory cannot be closed while any views onto it are left
+        for view in (self.sequence, self.timestamp, self.connected, self.axes,
+                     self.pressed, self.presses, self.releases):
+            view.release()
+
+class Publisher(object):
+    """Publishes the state of a gamepad into a named shared memory block.
+
+    The block is created here and removed again by close.
+    Room is made for the number of axes and buttons the gamepad has now,
+    or the highest named index if that is larger, axes or buttons beyond that are not shared.
+
+    After a batch of events the whole state is copied once, when events are
+    handled one at a time, e.g. by updateState, only the control which changed is copied.
+    Press and release counts are only kept from when the publisher is created."""
+    def __init__(self, gamepad, name = 'gamepad0'):
+        if not isinstance(gamepad, Gamepad.Gamepad):
+            raise ValueError('Publisher was not created with a valid Gamepad object')
+        self.gamepad = gamepad
+        self.name = name
+        self.lock = threading.Lock()
+        axisCount = max([len(gamepad.axisMap)] + [index + 1 for index in gamepad.axisNames])
+        buttonCount = max([len(gamepad.pressedMap)] + [index + 1 for index in gamepad.buttonNames])
+        size = _layout(axisCount, buttonCount)[3]
+        try:
+            self.memory = shared_memory.SharedMemory(name, create = True, size = size)
+        except FileExistsError:
+            # Left behind by a publisher which did not close cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(name, create = True, size = size)
+        typeName = gamepad.controllerType.__name__.encode('utf-8')[:32]
+        publishedNames.add(name)
+        HEADER_STRUCT.pack_into(self.memory.buf, 0, MAGIC, VERSION, axisCount, buttonCount, 0, typeName)
+        self.state = SharedState(self.memory, axisCount, buttonCount)
+        self.sequence = 0
+        self.publish()
+        gamepad.addPublisher(self)
+
+    def publish(self, events = ()):
+        """Copies the current state into the shared memory,
+        counting the button presses and releases in events, the raw events just decoded.
+        Called by the gamepad after each batch of events, normally from the thread reading it."""
+        gamepad = self.gamepad
+        buttonCode = EVENT_CODE_BUTTON
+        with self.lock:
+            state = self.state
+            if state is None:
+                return
+            axisCount = min(state.axisCount, len(gamepad.axisMap))
+            buttonCount = min(state.buttonCount, len(gamepad.pressedMap))
+            # Counted here as well, writing is cheaper than reading back and adding
+            self.sequence += 1
+            state.sequence[0] = self.sequence
+            presses = state.presses
+            releases = state.releases
+            for timestamp, value, eventType, index in events:
+                if eventType == buttonCode and index < buttonCount:
+                    if value:
+                        presses[index] = (presses[index] + 1) & 0xFFFFFFFF
+                    else:
+                        releases[index] = (releases[index] + 1) & 0xFFFFFFFF
+            state.timestamp[0] = gamepad.lastTimestamp
+            state.connected[0] = 1 if gamepad.connected else 0
+            state.axes[:axisCount] = memoryview(gamepad.axisMap)[:axisCount]
+            state.pressed[:buttonCount] = memoryview(gamepad.pressedMap)[:buttonCount]
+            self.sequence += 1
+            state.sequence[0] = self.sequence
+
+    def publishEvent(self, value, eventType, index):
+        """Copies just the control changed by one raw event into the shared memory.
+        Called by the gamepad after each event it handles on its own, e.g. in updateState.
+
+        This runs for every event so it does not take the lock, like the gamepad state
+        it should only be called from the one thread reading the gamepad."""
+        state = self.state
+        if state is None:
+            return
+        try:
+            self.sequence += 1
+            state.sequence[0] = self.sequence
+            state.timestamp[0] = self.gamepad.lastTimestamp
+            if eventType == EVENT_CODE_AXIS or eventType == EVENT_CODE_INIT_AXIS:
+                if index < state.axisCount:
+                    state.axes[index] = self.gamepad.axisMap[index]
+            elif index < state.buttonCount:
+                state.pressed[index] = self.gamepad.pressedMap[index]
+                # Initial state events are not presses or releases
+                if eventType == EVENT_CODE_BUTTON:
+                    if value:
+                        state.presses[index] = (state.presses[index] + 1) & 0xFFFFFFFF
+                    else:
+                        state.releases[index] = (state.releases[index] + 1) & 0xFFFFFFFF
+            self.sequence += 1
+            state.sequence[0] = self.sequence
+        except ValueError:
+            # Closed by another thread part way through
+            pass
+
+    def close(self):
+        """Stops publishing and removes the shared memory block, this may be called more than once.
+        Views already attached keep the last state published."""
+        self.gamepad.removePublisher(self)
+        with self.lock:
+            if self.state is not None:
+                self.state.release()
+                self.state = None
+                self.memory.close()
+                self.memory.unlink()
+                publishedNames.discard(self.name)
+
+class SharedGamepadView(object):
+    """Reads the state published by a Publisher in another process.
+
+    The read calls work the same as on a Gamepad object, e.g.
+        axis, isPressed, beenPressed, beenReleased, snapshot
+    with names taken from the gamepad type the publisher was using.
+    A gamepad type can be given if it is not one from Controllers.py.
+
+    Each view keeps its own beenPressed / beenReleased history, starting when the view is made,
+    so separate processes do not steal presses from each other.
+
+    Throws an IOError if the shared memory block does not exist or is not valid."""
+    def __init__(self, name = 'gamepad0', gamepadType = None):
+        try:
+            try:
+                self.memory = shared_memory.SharedMemory(name, track = False)
+            except TypeError:
+                # Before Python 3.13 attaching registers the block to be removed when this process ends
+                self.memory = shared_memory.SharedMemory(name)
+                if name not in publishedNames:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.memory._name, 'shared_memory')
+        except (OSError, ValueError) as e:
+            raise IOError('Could not open shared gamepad %s: %s' % (name, str(e)))
+        magic, version, axisCount, buttonCount, unused, typeName = HEADER_STRUCT.unpack_from(self.memory.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.memory.close()
+            raise IOError('Shared gamepad %s is not a supported format' % name)
+        self.name = name
+        self.typeName = typeName.split(b'\0', 1)[0].decode('utf-8', 'replace')
+        if gamepadType is None:
+            if self.typeName == 'Gamepad':
+                gamepadType = Gamepad.Gamepad
+            else:
+                gamepadType = Gamepad.controllerDict.get(self.typeName.upper(), Gamepad.Gamepad)
+        self.gamepadType = gamepadType
+        self.buttonNames, self.buttonIndex, self.axisNames, self.axisIndex = gamepadType._nameTables()
+        self.state = SharedState(self.memory, axisCount, buttonCount)
+        # Counts seen by the last beenPressed / beenReleased calls
+        self.seenPresses = self.state.presses.tolist()
+        self.seenReleases = self.state.releases.tolist()
+
+    def close(self):
+        """Detaches from the shared memory, the publisher keeps running."""
+        if self.state is not None:
+            self.state.release()
+            self.state = None
+            self.memory.close()
+
+    def _read(self, array, index):
+        """Reads one value from a shared array, trying again if the publisher was part way through a change."""
+        sequence = self.state.sequence
+        while True:
+            before = sequence[0]
+            if not (before & 1):
+                value = array[index]
+                if sequence[0] == before:
+                    return value
+            time.sleep(0)
+
+    def _buttonIndex(self, buttonName):
+        try:
+            buttonIndex = self.buttonIndex.get(buttonName)
+            if buttonIndex is None:
+                buttonIndex = int(buttonName)
+            if not (0 <= buttonIndex < self.state.buttonCount):
+                raise IndexError
+            return buttonIndex
+        except IndexError:
+            raise ValueError('Button %i was not found' % buttonIndex)
+        except ValueError:
+            raise ValueError('Button name %s was not found' % buttonName)
+
+    def _axisIndex(self, axisName):
+        try:
+            axisIndex = self.axisIndex.get(axisName)
+            if axisIndex is None:
+                axisIndex = int(axisName)
+            if not (0 <= axisIndex < self.state.axisCount):
+                raise IndexError
+            return axisIndex
+        except IndexError:
+            raise ValueError('Axis %i was not found' % axisIndex)
+        except ValueError:
+            raise ValueError('Axis name %s was not found' % axisName)
+
+    def isPressed(self, buttonName):
+        """Returns the last observed state of a gamepad button specified by name or index.
+        True if pressed, False if not pressed.
+
+        Throws ValueError if the button name or index cannot be found."""
+        return self._read(self.state.pressed, self._buttonIndex(buttonName)) != 0
+
+    def beenPressed(self, buttonName):
+        """Returns True if the button specified by name or index has been pressed since the last beenPressed call.
+
+        Throws ValueError if the button name or index cannot be found."""
+        buttonIndex = self._buttonIndex(buttonName)
+        presses = self._read(self.state.presses, buttonIndex)
+        if presses != self.seenPresses[buttonIndex]:
+            self.seenPresses[buttonIndex] = presses
+            return True
+        return False
+
+    def beenReleased(self, buttonName):
+        """Returns True if the button specified by name or index has been released since the last beenReleased call.
+
+        Throws ValueError if the button name or index cannot be found."""
+        buttonIndex = self._buttonIndex(buttonName)
+        releases = self._read(self.state.releases, buttonIndex)
+        if releases != self.seenReleases[buttonIndex]:
+            self.seenReleases[buttonIndex] = releases
+            return True
+        return False
+
+    def axis(self, axisName):
+        """Returns the last observed state of a gamepad axis specified by name or index.
+        Returns a float between -1.0 and +1.0.
+
+        Throws ValueError if the axis name or index cannot be found."""
+        return self._read(self.state.axes, self._axisIndex(axisName))
+
+    def pressCount(self, buttonName):
+        """Returns the number of times the button specified by name or index has been pressed,
+        counted from when the publisher started, wraps after 2**32."""
+        return self._read(self.state.presses, self._buttonIndex(buttonName))
+
+    def releaseCount(self, buttonName):
+        """Returns the number of times the button specified by name or index has been released,
+        counted from when the publisher started, wraps after 2**32."""
+        return self._read(self.state.releases, self._buttonIndex(buttonName))
+
+    @property
+    def lastTimestamp(self):
+        """Timestamp of the latest event published, see Gamepad.lastTimestamp."""
+        return self._read(self.state.timestamp, 0)
+
+    def isConnected(self):
+        """Returns True until the publishing gamepad is disconnected."""
+        return self._read(self.state.connected, 0) != 0
+
+    def snapshot(self):
+        """Returns a copy of the whole gamepad state taken at one moment, see Gamepad.snapshot.
+
+        The return format is:
+            timestamp, axis positions, button states"""
+        state = self.state
+        sequence = state.sequence
+        while True:
+            before = sequence[0]
+            if not (before & 1):
+                snapshot = (state.timestamp[0], tuple(state.axes), tuple(state.pressed))
+                if sequence[0] == before:
+                    return snapshot
+            time.sleep(0)
+
+    def availableButtonNames(self):
+        """Returns a list of available button names for this gamepad type."""
+        return list(self.buttonNames.values())
+
+    def availableAxisNames(self):
+        """Returns a list of available axis names for this gamepad type."""
+        return list(self.axisNames.values())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for the Gamepad class, a pipe stands in for the joystick device.
+
+Run with either Python 2 or 3:
+    python -m unittest test_Gamepad
+
+The Python 2 check runs the same tests under the interpreter named by the
+PYTHON2 environment variable, python2 by default, and is skipped if there is none.
+"""
+
+import os
+import sys
+import subprocess
+import threading
+import time
+import unittest
+import Gamepad
+
+EVENT_STRUCT = Gamepad.Gamepad.EVENT_STRUCT
+
+class PipeGamepadTest(unittest.TestCase):
+    def setUp(self):
+        readFd, self.writeFd = os.pipe()
+        self.gamepad = Gamepad.PS4('/dev/fd/%d' % readFd)
+        os.close(readFd)
+
+    def tearDown(self):
+        self.gamepad.disconnect()
+        os.close(self.writeFd)
+
+    def write(self, *events):
+        os.write(self.writeFd, b''.join(EVENT_STRUCT.pack(*event) for event in events))
+
+    def writeInitialState(self):
+        self.write(*[(0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, index) for index in range(13)] +
+                   [(0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, index) for index in range(8)])
+        while self.gamepad.updateState(0.1):
+            pass
+
+    def testConstruction(self):
+        # A pipe cannot answer the joystick ioctl calls
+        self.assertEqual(self.gamepad.deviceName, None)
+        self.assertFalse(self.gamepad.isReady())
+
+    def testInitialState(self):
+        self.writeInitialState()
+        self.assertTrue(self.gamepad.isReady())
+        self.assertFalse(self.gamepad.isPressed('CROSS'))
+        self.assertEqual(self.gamepad.axis('LEFT-X'), 0.0)
+
+    def testEvents(self):
+        self.writeInitialState()
+        self.write((10, 1, Gamepad.Gamepad.EVENT_CODE_BUTTON, 0), (11, 32767, Gamepad.Gamepad.EVENT_CODE_AXIS, 1))
+        self.assertEqual(self.gamepad.getNextEvent(timeout = 1.0), ('BUTTON', 'CROSS', True))
+        self.assertEqual(self.gamepad.getNextEvent(timeout = 1.0), ('AXIS', 'LEFT-Y', 1.0))
+        self.assertTrue(self.gamepad.beenPressed('CROSS'))
+        self.assertEqual(self.gamepad.lastTimestamp, 11)
+
+    def testLeftoverWakeUp(self):
+        self.writeInitialState()
+        # Nothing is stopping, so the wake up must not end the read early
+        self.gamepad._wake()
+        writer = threading.Timer(0.1, self.write, [(12, 1, Gamepad.Gamepad.EVENT_CODE_BUTTON, 1)])
+        writer.start()
+        events = self.gamepad.readEvents(timeout = 5.0)
+        writer.join()
+        self.assertEqual(events, [(12, 1, Gamepad.Gamepad.EVENT_CODE_BUTTON, 1)])
+
+    def testRestartBackgroundUpdates(self):
+        self.writeInitialState()
+        self.gamepad.startBackgroundUpdates()
+        self.gamepad.stopBackgroundUpdates()
+        self.gamepad._wake()
+        self.gamepad.startBackgroundUpdates()
+        self.assertTrue(self.gamepad.isConnected())
+        self.write((13, 1, Gamepad.Gamepad.EVENT_CODE_BUTTON, 0))
+        for attempt in range(500):
+            if self.gamepad.isPressed('CROSS'):
+                break
+            time.sleep(0.01)
+        self.assertTrue(self.gamepad.isPressed('CROSS'))
+
+class PythonTwoTest(unittest.TestCase):
+    @unittest.skipIf(sys.version_info[0] < 3, 'already running on Python 2')
+    def testPythonTwo(self):
+        python2 = os.environ.get('PYTHON2', 'python2')
+        try:
+            found = subprocess.call([python2, '-c', 'import sys; sys.exit(sys.version_info[0] != 2)'],
+                                    stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL) == 0
+        except OSError:
+            found = False
+        if not found:
+            self.skipTest('no Python 2 interpreter, set PYTHON2 to run this check')
+        directory = os.path.dirname(os.path.abspath(__file__))
+        process = subprocess.Popen([python2, '-m', 'unittest', 'test_Gamepad.PipeGamepadTest'], cwd = directory,
+                                   stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+        output = process.communicate()[0]
+        self.assertEqual(process.returncode, 0, output.decode('utf-8', 'replace'))
+
+if __name__ == '__main__':
+    unittest.main()
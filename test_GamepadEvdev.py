@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Tests for reading evdev events, recorded evdev bytes are fed through a pipe.
+
+Run with:
+    python3 -m unittest test_GamepadEvdev
+"""
+
+import os
+import threading
+import unittest
+import Gamepad
+import GamepadEvdev
+
+EV_SYN = GamepadEvdev.EV_SYN
+EV_KEY = GamepadEvdev.EV_KEY
+EV_ABS = GamepadEvdev.EV_ABS
+SYN_REPORT = GamepadEvdev.SYN_REPORT
+ABS_X = 0x00
+ABS_Y = 0x01
+BTN_SOUTH = 0x130
+
+class EvdevPipeTest(unittest.TestCase):
+    def setUp(self):
+        readFd, self.writeFd = os.pipe()
+        self.gamepad = Gamepad.PS4('/dev/fd/%d' % readFd, backend = GamepadEvdev.EvdevBackend)
+        os.close(readFd)
+
+    def tearDown(self):
+        self.gamepad.disconnect()
+        os.close(self.writeFd)
+
+    def write(self, *events):
+        os.write(self.writeFd, GamepadEvdev.pack(events))
+
+    def writeStickFrame(self, x, y):
+        self.write((1, 500, EV_ABS, ABS_X, x), (1, 500, EV_ABS, ABS_Y, y), (1, 500, EV_SYN, SYN_REPORT, 0))
+
+    def testInitialState(self):
+        self.assertTrue(self.gamepad.isReady())
+        self.assertEqual(self.gamepad.axis('LEFT-X'), 0.0)
+        self.assertFalse(self.gamepad.isPressed('CROSS'))
+
+    def testUpdateStateAppliesWholeFrame(self):
+        self.writeStickFrame(16384, -32767)
+        self.assertTrue(self.gamepad.updateState(1.0))
+        self.assertAlmostEqual(self.gamepad.axis('LEFT-X'), 16384 / 32767.0)
+        self.assertEqual(self.gamepad.axis('LEFT-Y'), -1.0)
+        self.assertEqual(self.gamepad.lastTimestamp, 1000500)
+
+    def testGetNextEventAppliesWholeFrame(self):
+        self.writeStickFrame(32767, 32767)
+        self.assertEqual(self.gamepad.getNextEvent(timeout = 1.0), ('AXIS', 'LEFT-X', 1.0))
+        # The rest of the frame is already applied before it is returned
+        self.assertEqual(self.gamepad.axis('LEFT-Y'), 1.0)
+        self.assertEqual(self.gamepad.getNextEvent(timeout = 1.0), ('AXIS', 'LEFT-Y', 1.0))
+        self.assertIsNone(self.gamepad.getNextEvent(timeout = 0.05))
+
+    def testHalfFrameWaitsForReport(self):
+        self.write((1, 0, EV_ABS, ABS_X, 32767))
+        self.assertFalse(self.gamepad.updateState(0.05))
+        self.assertEqual(self.gamepad.axis('LEFT-X'), 0.0)
+        self.write((1, 0, EV_ABS, ABS_Y, 32767), (1, 0, EV_SYN, SYN_REPORT, 0))
+        self.assertTrue(self.gamepad.updateState(1.0))
+        self.assertEqual(self.gamepad.axis('LEFT-X'), 1.0)
+        self.assertEqual(self.gamepad.axis('LEFT-Y'), 1.0)
+
+    def testSnapshotSeesWholeFrames(self):
+        self.writeStickFrame(32767, 32767)
+        self.writeStickFrame(-32767, -32767)
+        self.assertTrue(self.gamepad.updateState(1.0))
+        timestamp, axes, buttons = self.gamepad.snapshot()
+        self.assertEqual(axes[0], axes[1])
+
+    def testHandlerCanTakeSnapshot(self):
+        seen = []
+        self.gamepad.addAxisMovedHandler('LEFT-X', lambda position: seen.append(self.gamepad.snapshot()))
+        self.writeStickFrame(32767, -32767)
+        # A hang here would leave the thread running, so check it finishes
+        thread = threading.Thread(target = self.gamepad.updateState, args = (1.0,))
+        thread.daemon = True
+        thread.start()
+        thread.join(5.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(seen), 1)
+        timestamp, axes, buttons = seen[0]
+        self.assertEqual((axes[0], axes[1]), (1.0, -1.0))
+
+    def testButtonsAndAutoRepeat(self):
+        self.write((2, 0, EV_KEY, BTN_SOUTH, 1), (2, 0, EV_SYN, SYN_REPORT, 0),
+                   (2, 100, EV_KEY, BTN_SOUTH, 2), (2, 100, EV_SYN, SYN_REPORT, 0))
+        self.assertEqual(self.gamepad.getNextEvent(timeout = 1.0), ('BUTTON', 'CROSS', True))
+        self.assertIsNone(self.gamepad.getNextEvent(timeout = 0.05))
+        self.assertTrue(self.gamepad.beenPressed('CROSS'))
+        self.write((3, 0, EV_KEY, BTN_SOUTH, 0), (3, 0, EV_SYN, SYN_REPORT, 0))
+        self.assertTrue(self.gamepad.updateState(1.0))
+        self.assertFalse(self.gamepad.isPressed('CROSS'))
+
+if __name__ == '__main__':
+    unittest.main()
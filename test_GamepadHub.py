@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Tests for GamepadHub, pipes stand in for the joystick devices.
+
+Run with:
+    python3 -m unittest test_GamepadHub
+"""
+
+import os
+import threading
+import unittest
+import Gamepad
+import GamepadHub
+
+EVENT_STRUCT = Gamepad.Gamepad.EVENT_STRUCT
+
+class PipeHubTest(unittest.TestCase):
+    def setUp(self):
+        self.hub = GamepadHub.GamepadHub()
+        self.writeFds = []
+
+    def tearDown(self):
+        self.hub.disconnect()
+        for writeFd in self.writeFds:
+            os.close(writeFd)
+
+    def openPipe(self):
+        readFd, writeFd = os.pipe()
+        gamepad = self.hub.open(Gamepad.PS4, '/dev/fd/%d' % readFd)
+        os.close(readFd)
+        self.writeFds.append(writeFd)
+        # The initial state the joystick driver sends when a device is opened
+        os.write(writeFd, b''.join([EVENT_STRUCT.pack(0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_BUTTON, index) for index in range(13)] +
+                                   [EVENT_STRUCT.pack(0, 0, Gamepad.Gamepad.EVENT_CODE_INIT_AXIS, index) for index in range(8)]))
+        return gamepad, writeFd
+
+    def testEventsFromEachGamepad(self):
+        player1, writeFd1 = self.openPipe()
+        player2, writeFd2 = self.openPipe()
+        os.write(writeFd1, EVENT_STRUCT.pack(1, 1, Gamepad.Gamepad.EVENT_CODE_BUTTON, 0))
+        os.write(writeFd2, EVENT_STRUCT.pack(2, 32767, Gamepad.Gamepad.EVENT_CODE_AXIS, 1))
+        processed = 0
+        while processed < 2 * 21 + 2:
+            processed += self.hub.updateState(1.0)
+        self.assertTrue(player1.isPressed('CROSS'))
+        self.assertEqual(player2.axis('LEFT-Y'), 1.0)
+        self.assertEqual(self.hub.stats()['gamepads'], 2)
+
+    def testDisconnectWhileWaiting(self):
+        gamepad, writeFd = self.openPipe()
+        lost = threading.Event()
+        self.hub.addDisconnectedHandler(lambda disconnected: lost.set())
+        self.hub.start()
+        # Closing the write end is the pipe version of unplugging the device
+        self.writeFds.remove(writeFd)
+        os.close(writeFd)
+        self.assertTrue(lost.wait(5.0))
+        self.assertNotIn(gamepad, self.hub.gamepads)
+        self.assertEqual(self.hub.stats()['disconnects'], 1)
+        self.assertFalse(gamepad.isConnected())
+        gamepad.disconnect()
+
+if __name__ == '__main__':
+    unittest.main()